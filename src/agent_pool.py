@@ -0,0 +1,49 @@
+"""
+Process-wide agent registry with bounded LRU eviction
+Agents are reused across messages and connections instead of rebuilt per turn
+"""
+
+from collections import OrderedDict
+
+
+class AgentPool:
+    """LRU cache of agents keyed by (model, system_prompt, tools)"""
+
+    def __init__(self, factory, max_size: int = 32):
+        self.factory = factory
+        self.max_size = max_size
+        self._agents = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model: str, system_prompt: str = None, tools: bool = True):
+        """Return a cached agent, building it with the factory on a miss (tools=False: no tools attached)"""
+        key = (model, system_prompt, tools)
+        agent = self._agents.get(key)
+        if agent is not None:
+            self.hits += 1
+            self._agents.move_to_end(key)
+            return agent
+
+        self.misses += 1
+        agent = self.factory(model=model, system_prompt=system_prompt, tools=tools)
+        self._agents[key] = agent
+        if len(self._agents) > self.max_size:
+            self._agents.popitem(last=False)
+            self.evictions += 1
+        return agent
+
+    def clear(self):
+        """Drop all cached agents (counters are kept)"""
+        self._agents.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of pool size and hit/miss/eviction counters"""
+        return {
+            "size": len(self._agents),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Headless batch jobs
+Prompts and debates read from JSONL (one WebSocket-style message per line, plus an optional "id")
+run through streaming.run_request, the same agent pool, scheduler, routing and cache path as /ws,
+with bounded concurrency. Results are appended to a JSONL file as they finish; that file is also
+the checkpoint, so running the same job again skips ids that already succeeded.
+
+Usage:
+  python batch.py prompts.jsonl [--output results.jsonl] [--concurrency 8] [--no-retry-errors] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from pydantic import ValidationError
+from memory import ConversationMemory
+from schemas import INGRESS, PromptMessage, describe_error
+from streaming import make_summarizer, run_request
+
+JOB_ID = re.compile(r"[0-9a-f]{1,32}")
+
+
+@dataclass
+class BatchStats:
+    total: int = None      # lines in the input, when known up front
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0       # already succeeded in an earlier run of the job
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latencies: list = field(default_factory=list)
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float = None
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        done = self.completed + self.failed
+        latencies = sorted(self.latencies)
+
+        def percentile(pct):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] * 1000, 1) if latencies else 0.0
+
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "items_per_sec": round(done / elapsed, 2) if elapsed else 0.0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "output_tokens_per_sec": round(self.output_tokens / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {p: percentile(p) for p in (50, 95, 99)},
+        }
+
+    def summary(self) -> str:
+        s = self.as_dict()
+        return (
+            f"{s['completed']} ok, {s['failed']} failed, {s['skipped']} skipped in {s['elapsed_s']}s "
+            f"({s['items_per_sec']} items/s, {s['input_tokens']} in / {s['output_tokens']} out tokens, "
+            f"p50 {s['latency_ms'][50]}ms p95 {s['latency_ms'][95]}ms)"
+        )
+
+
+def finished_ids(output_path: Path, retry_errors: bool = True) -> set:
+    """Ids already in the output (only successful ones when retry_errors); later lines win"""
+    status = {}
+    if not output_path.exists():
+        return set()
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line of an interrupted run
+            status[record.get("id")] = record.get("status")
+    return {item_id for item_id, s in status.items() if s == "ok" or not retry_errors}
+
+
+def open_output(output_path: Path):
+    """Append handle that starts on a fresh line even after a torn write"""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    out = open(output_path, "a+", encoding="utf-8")
+    if out.tell():
+        out.seek(out.tell() - 1)
+        if out.read(1) != "\n":
+            out.write("\n")
+    return out
+
+
+async def run_batch(lines, output_path, create_agent_func, concurrency: int = 4, response_cache=None,
+                    scheduler=None, router=None, context_cache=None, client: str = None,
+                    retry_errors: bool = True, stats: BatchStats = None) -> BatchStats:
+    """Run every JSONL line of `lines` (an iterable of str) and append one result line per item"""
+    output_path = Path(output_path)
+    concurrency = max(concurrency, 1)
+    stats = stats or BatchStats()
+    done = finished_ids(output_path, retry_errors)
+    summarize = make_summarizer(create_agent_func)
+    history_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+    # Its own fairness unit in the provider scheduler, so interactive users aren't starved by a job
+    client = client or f"batch-{uuid.uuid4().hex[:8]}"
+    queue = asyncio.Queue(maxsize=concurrency * 2)  # don't read thousands of lines ahead
+
+    async def run_item(item_id: str, message: PromptMessage) -> dict:
+        turns, speaking, errors = [], {}, []  # speaking: agent -> its current turn (panel turns interleave)
+        usage = {"input_tokens": 0, "output_tokens": 0}
+
+        async def collect(frame: dict):
+            kind = frame["type"]
+            if kind == "agent_start":
+                # An agent may speak more than once (a classic debate's opener also closes it)
+                speaking[frame["agent"]] = {"agent": frame["agent"], "chunks": []}
+                turns.append(speaking[frame["agent"]])
+            elif kind == "token":
+                speaking[frame["agent"]]["chunks"].append(frame["content"])
+            elif kind == "timing":
+                usage["input_tokens"] += frame["input_tokens"]
+                usage["output_tokens"] += frame["tokens_out"]
+            elif kind == "error":
+                errors.append(frame["content"])
+
+        started = time.monotonic()
+        # Timing frames carry per-turn token usage
+        message = message.model_copy(update={"config": message.config.model_copy(update={"timing": True})})
+        try:
+            await run_request(
+                message, started, collect, ConversationMemory(summarize, token_budget=history_budget),
+                create_agent_func, response_cache, scheduler, router, context_cache, client
+            )
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+        latency = time.monotonic() - started
+        outputs = [{"agent": turn["agent"], "text": "".join(turn["chunks"])} for turn in turns]
+
+        stats.input_tokens += usage["input_tokens"]
+        stats.output_tokens += usage["output_tokens"]
+        if errors:
+            stats.failed += 1
+        else:
+            stats.completed += 1
+            stats.latencies.append(latency)
+        return {
+            "id": item_id,
+            "type": message.type,
+            "status": "error" if errors else "ok",
+            # A prompt's answer as text; a debate's turns in the order they started
+            "output": "".join(turn["text"] for turn in outputs) if message.type == "prompt" else outputs,
+            "error": "; ".join(errors) or None,
+            "model": message.config.model,
+            "latency_ms": round(latency * 1000, 1),
+            **usage,
+        }
+
+    def invalid(item_id: str, error: str) -> dict:
+        stats.failed += 1
+        return {"id": item_id, "status": "error", "error": error}
+
+    with open_output(output_path) as out:
+        def write(record: dict):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()  # every finished item is checkpointed
+
+        async def worker():
+            while (item := await queue.get()) is not None:
+                write(await run_item(*item))
+
+        async def produce():
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    raw = json.loads(line)
+                    item_id = str(raw.get("id", number)) if isinstance(raw, dict) else str(number)
+                except ValueError as e:
+                    write(invalid(str(number), f"Invalid JSON: {e}"))
+                    continue
+                if item_id in done:
+                    stats.skipped += 1
+                    continue
+                try:
+                    message = INGRESS.validate_python(raw)
+                except ValidationError as e:
+                    write(invalid(item_id, f"Invalid message: {describe_error(e)}"))
+                    continue
+                if not isinstance(message, PromptMessage):
+                    write(invalid(item_id, "Batch items must be prompt or debate messages"))
+                    continue
+                await queue.put((item_id, message))
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(concurrency):
+                    tg.create_task(worker())
+                tg.create_task(produce())
+        finally:
+            stats.finished_at = time.monotonic()
+    return stats
+
+
+class BatchJobs:
+    """Jobs started over HTTP; input and results live under BATCH_DIR so a job can resume after a restart"""
+
+    def __init__(self, create_agent_func, response_cache=None, scheduler=None, router=None, context_cache=None,
+                 directory: str = "batch_jobs", max_concurrency: int = 16):
+        self.create_agent_func = create_agent_func
+        self.deps = {"response_cache": response_cache, "scheduler": scheduler, "router": router,
+                     "context_cache": context_cache}
+        self.directory = Path(directory)
+        self.max_concurrency = max_concurrency
+        self._jobs = {}  # job_id -> {"task", "stats", "state", "error"}
+
+    def _paths(self, job_id: str):
+        return self.directory / f"{job_id}.input.jsonl", self.directory / f"{job_id}.results.jsonl"
+
+    def exists(self, job_id: str) -> bool:
+        return bool(JOB_ID.fullmatch(job_id)) and self._paths(job_id)[0].exists()
+
+    async def start(self, body: bytes, concurrency: int = 4) -> dict:
+        """Save the JSONL body as a new job and start running it"""
+        job_id = uuid.uuid4().hex[:12]
+        input_path, _ = self._paths(job_id)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(input_path.write_bytes, body)
+        return await self.resume(job_id, concurrency)
+
+    @staticmethod
+    def _count_items(input_path: Path) -> int:
+        with open(input_path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+
+    async def resume(self, job_id: str, concurrency: int = 4) -> dict:
+        """(Re)run a job; items already in its results are skipped"""
+        job = self._jobs.get(job_id)
+        if job and job["state"] == "running":
+            return self.status(job_id)
+        input_path, output_path = self._paths(job_id)
+        stats = BatchStats(total=await asyncio.to_thread(self._count_items, input_path))
+        job = self._jobs.get(job_id)
+        if job and job["state"] == "running":
+            return self.status(job_id)  # resumed by another request while we were counting
+        job = self._jobs[job_id] = {"stats": stats, "state": "running", "error": None}
+
+        async def run():
+            try:
+                with open(input_path, encoding="utf-8") as lines:
+                    await run_batch(
+                        lines, output_path, self.create_agent_func,
+                        concurrency=min(concurrency, self.max_concurrency),
+                        client=f"batch-{job_id}", stats=stats, **self.deps
+                    )
+                job["state"] = "done"
+            except asyncio.CancelledError:
+                job["state"] = "cancelled"
+                raise
+            except Exception as e:
+                job["state"], job["error"] = "failed", str(e)
+                print(f"Batch job {job_id} failed: {str(e)}")
+
+        job["task"] = asyncio.create_task(run())
+        return self.status(job_id)
+
+    def cancel(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job and job["state"] == "running":
+            job["task"].cancel()
+            job["state"] = "cancelled"
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Known on disk but not run by this process (e.g. before a restart)
+            return {"job_id": job_id, "state": "stopped"}
+        return {"job_id": job_id, "state": job["state"], "error": job["error"], **job["stats"].as_dict()}
+
+    def results_path(self, job_id: str) -> Path:
+        return self._paths(job_id)[1]
+
+    def list(self) -> list:
+        return [self.status(job_id) for job_id in self._jobs]
+
+
+def create_batch_jobs(create_agent_func, response_cache=None, scheduler=None, router=None, context_cache=None):
+    """Job registry for the /batch API, configured from BATCH_* env vars"""
+    return BatchJobs(
+        create_agent_func, response_cache, scheduler, router, context_cache,
+        directory=os.getenv("BATCH_DIR", "batch_jobs"),
+        max_concurrency=int(os.getenv("BATCH_MAX_CONCURRENCY", "16")),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run prompts/debates from JSONL headlessly')
+    parser.add_argument('input', help="JSONL with one prompt/debate message per line ('-' for stdin)")
+    parser.add_argument('--output', '-o', help='Results JSONL, also the resume checkpoint (default: <input>.results.jsonl)')
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help='Items in flight at once')
+    parser.add_argument('--no-retry-errors', action='store_true', help='On resume, skip items that failed before too')
+    parser.add_argument('--json', action='store_true', help='Print stats as JSON')
+    args = parser.parse_args()
+
+    if args.input == '-' and not args.output:
+        parser.error("--output is required when reading stdin")
+    output = Path(args.output or Path(args.input).with_suffix(".results.jsonl"))
+
+    # Same agents, scheduler, routing and caches as the server, configured from .env
+    import hello_world
+
+    async def run():
+        lines = sys.stdin if args.input == '-' else open(args.input, encoding="utf-8")
+        try:
+            return await run_batch(
+                lines, output, hello_world.agent_pool.get, concurrency=args.concurrency,
+                response_cache=hello_world.response_cache, scheduler=hello_world.scheduler,
+                router=hello_world.router, context_cache=hello_world.context_cache,
+                retry_errors=not args.no_retry_errors
+            )
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+            if hello_world.context_cache:
+                await hello_world.context_cache.close()
+
+    stats = asyncio.run(run())
+    if args.json:
+        print(json.dumps(stats.as_dict(), indent=2))
+    else:
+        print(f"{stats.summary()} -> {output}", file=sys.stderr)
+    sys.exit(1 if stats.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Token coalescing for the WebSocket stream
+Buffers deltas and flushes them as one token frame per batch
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class FlushPolicy:
+    """When to flush buffered tokens (0 disables a limit, both 0 = every delta)"""
+    max_bytes: int = 0
+    max_latency_ms: float = 0
+
+    @classmethod
+    def from_config(cls, config) -> "FlushPolicy":
+        """Read flush_bytes / flush_ms from the (validated) client config block"""
+        return cls(max_bytes=config.flush_bytes, max_latency_ms=config.flush_ms)
+
+    @property
+    def immediate(self) -> bool:
+        return not self.max_bytes and not self.max_latency_ms
+
+
+class TokenBatcher:
+    """Coalesces deltas and hands each batch to an async send callable"""
+
+    def __init__(self, send, policy: FlushPolicy = None):
+        self.send = send
+        self.policy = policy or FlushPolicy()
+        self.frames = 0
+        self._buffer = []
+        self._size = 0
+        self._first_at = 0.0
+        self._timer = None
+        self._timer_tasks = set()  # timed flushes in flight (one may still be waiting on a slow send)
+        self._lock = asyncio.Lock()
+
+    async def add(self, chunk: str):
+        """Buffer a delta, flushing when the byte or latency limit is reached"""
+        if not chunk:
+            return
+        if self.policy.immediate:
+            self.frames += 1
+            await self.send(chunk)
+            return
+
+        if not self._buffer:
+            self._first_at = time.monotonic()
+            self._schedule_timer()
+        self._buffer.append(chunk)
+        self._size += len(chunk.encode("utf-8"))
+
+        if self.policy.max_bytes and self._size >= self.policy.max_bytes:
+            await self.flush()
+        elif self.policy.max_latency_ms and (time.monotonic() - self._first_at) * 1000 >= self.policy.max_latency_ms:
+            await self.flush()
+
+    async def flush(self):
+        """Send everything buffered so far as a single frame"""
+        async with self._lock:
+            self._cancel_timer()
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer = []
+            self._size = 0
+            self.frames += 1
+            await self.send(text)
+
+    async def close(self):
+        """Flush the tail of the stream and stop the latency timer"""
+        await self.flush()
+        if self._timer_tasks:
+            await asyncio.gather(*self._timer_tasks)
+
+    def cancel(self):
+        """Drop the buffer and any pending timed flush (the stream was cancelled)"""
+        self._cancel_timer()
+        for task in self._timer_tasks:
+            task.cancel()
+        self._buffer = []
+        self._size = 0
+
+    def _schedule_timer(self):
+        if self.policy.max_latency_ms and self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.policy.max_latency_ms / 1000, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._timer_tasks.add(task)
+        task.add_done_callback(self._timer_tasks.discard)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
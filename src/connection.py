@@ -0,0 +1,74 @@
+"""
+Per-connection WebSocket transport
+Concurrent reader/writer split with a bounded outbound queue for backpressure
+"""
+
+import asyncio
+from fastapi import WebSocket, WebSocketDisconnect
+from protocol import JsonCodec
+
+
+class Connection:
+    """Reads client messages while a writer task drains a bounded frame queue"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int = 256, codec=None):
+        self.websocket = websocket
+        self.codec = codec or JsonCodec()  # negotiated wire protocol, see protocol.py
+        # Data frames need a credit (returned once written); terminal frames skip the limit
+        self._outbound = asyncio.Queue()
+        self._credits = asyncio.Semaphore(max_queue)
+        self._writer = None
+
+    async def send(self, frame: dict):
+        """Queue a frame; blocks when the client is slow so producers slow down too"""
+        await self._credits.acquire()
+        # Encoded here, in producer order: compact codecs intern ids on first use
+        self._outbound.put_nowait((self.codec.encode(frame), True))
+
+    def send_terminal(self, frame: dict):
+        """Queue a frame that ends a stream (e.g. cancelled) without waiting; never dropped, even when
+        the queue is full, since the client only leaves its streaming state on such a frame"""
+        self._outbound.put_nowait((self.codec.encode(frame), False))
+
+    async def send_direct(self, frame: dict):
+        """Write a frame immediately, bypassing the queue (for errors after the writer stopped)"""
+        await self._write(self.codec.encode(frame))
+
+    async def _write(self, messages: list):
+        for message in messages:
+            if isinstance(message, bytes):
+                await self.websocket.send_bytes(message)
+            else:
+                await self.websocket.send_text(message)
+
+    async def _write_loop(self):
+        while True:
+            messages, credited = await self._outbound.get()
+            await self._write(messages)
+            if credited:
+                self._credits.release()
+
+    async def _receive(self):
+        """Next text or binary message"""
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        return message["text"] if message.get("text") is not None else message.get("bytes")
+
+    async def run(self, on_message):
+        """Feed every received message (str or bytes) to on_message until the client disconnects"""
+        self._writer = asyncio.create_task(self._write_loop())
+        receive = asyncio.ensure_future(self._receive())
+        try:
+            while True:
+                # A dead writer means the socket is gone even if no close frame arrived
+                done, _ = await asyncio.wait({receive, self._writer}, return_when=asyncio.FIRST_COMPLETED)
+                if self._writer in done:
+                    self._writer.result()  # re-raise the send failure
+                    return
+                await on_message(receive.result())
+                receive = asyncio.ensure_future(self._receive())
+        finally:
+            receive.cancel()
+            self._writer.cancel()
+
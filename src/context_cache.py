@@ -0,0 +1,220 @@
+"""
+Gemini explicit context caching for large stable prompt prefixes
+The system prompt, tool declarations and earlier conversation turns (including retrieved docs)
+are uploaded once as cached content; later turns reference the handle and send only new messages.
+See docs/gemini_core/geminiAPICachingMechanisms.txt
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass
+from pydantic_ai.messages import (
+    ModelResponse, SystemPromptPart, TextPart, ToolCallPart, ToolReturnPart, UserPromptPart
+)
+from memory import estimate_tokens
+
+# Explicit caching minimums from the Gemini docs
+MIN_TOKENS = {"pro": 2048, "default": 1024}
+
+# pydantic-ai warns on every cached request that the cache now owns system prompt and tools; that is the point
+warnings.filterwarnings("ignore", message=r"`google_cached_content` is set")
+
+
+@dataclass
+class CacheHandle:
+    name: str
+    model: str
+    tokens: int
+    expires_at: float      # time.monotonic()
+    messages: int          # how many history messages the cached prefix covers
+
+
+def to_contents(messages) -> list:
+    """pydantic-ai messages -> Gemini content dicts (system prompt parts are skipped)"""
+    contents = []
+    for message in messages:
+        role = "model" if isinstance(message, ModelResponse) else "user"
+        parts = []
+        for part in message.parts:
+            if isinstance(part, SystemPromptPart):
+                continue
+            if isinstance(part, (UserPromptPart, TextPart)) and isinstance(part.content, str):
+                parts.append({"text": part.content})
+            elif isinstance(part, ToolCallPart):
+                parts.append({"function_call": {"name": part.tool_name, "args": part.args_as_dict()}})
+            elif isinstance(part, ToolReturnPart):
+                parts.append({"function_response": {
+                    "name": part.tool_name, "response": {"return_value": part.model_response_str()}
+                }})
+        if parts:
+            contents.append({"role": role, "parts": parts})
+    return contents
+
+
+def system_instruction(system_prompt: str, messages) -> str:
+    """Everything the run would send as system prompt: the history's system prompt parts (memory puts the
+    agent's prompt and the summary of compacted turns there), or the agent's prompt for a fresh conversation"""
+    parts = [
+        part.content for message in messages for part in message.parts if isinstance(part, SystemPromptPart)
+    ]
+    return "\n\n".join(parts) if parts else system_prompt
+
+
+def _prefix_hashes(system_prompt: str, messages) -> list:
+    """hashes[i] identifies system instruction + messages[:i]"""
+    digest = hashlib.sha256(system_prompt.encode("utf-8"))
+    hashes = [digest.hexdigest()]
+    for message in messages:
+        digest.update(json.dumps(to_contents([message]), sort_keys=True, default=str).encode("utf-8"))
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+class ContextCache:
+    """Creates, reuses and retires provider-side cached content, keyed by prefix hash"""
+
+    def __init__(self, tools=(), ttl: int = 600, max_entries: int = 64, client=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tool_declarations = [
+            {"name": d.name, "description": d.description, "parameters_json_schema": d.parameters_json_schema}
+            for d in (self._tool_def(tool) for tool in tools)
+        ]
+        self._client = client
+        self._handles = OrderedDict()   # (model, prefix hash) -> CacheHandle, least recently used first
+        self._creating = {}             # single-flight creation tasks
+        self.hits = self.misses = self.created = self.errors = 0
+
+    @staticmethod
+    def _tool_def(tool):
+        from pydantic_ai.tools import Tool
+        return (tool if isinstance(tool, Tool) else Tool(tool)).tool_def
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai  # only needed once caching is actually used
+            self._client = genai.Client(api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+        return self._client
+
+    @staticmethod
+    def min_tokens(model: str) -> int:
+        return MIN_TOKENS["pro"] if "pro" in model else MIN_TOKENS["default"]
+
+    def prepare(self, model: str, system_prompt: str, history: list):
+        """(extra model settings, message_history to send) for one turn
+
+        Reuses the longest live cached prefix of system prompt + history, and starts caching the
+        full prefix in the background once the uncached part is big enough to be worth it. Cached
+        content replaces the request's system prompt, so the summary has to live in the cache too.
+        """
+        if not model.startswith("gemini"):
+            return {}, history
+        system_prompt = system_instruction(system_prompt, history)
+        # Cache boundaries sit after complete turns so the remaining tail starts with a request
+        boundaries = [i for i, m in enumerate(history, 1) if isinstance(m, ModelResponse)]
+        hashes = _prefix_hashes(system_prompt, history)
+        now = time.monotonic()
+
+        best = None
+        for i in [0] + boundaries:
+            handle = self._handles.get((model, hashes[i]))
+            if handle and handle.expires_at > now:
+                best = handle
+        if best:
+            self.hits += 1
+            self._handles.move_to_end((model, hashes[best.messages]))
+            if best.expires_at - now < self.ttl / 2:
+                asyncio.create_task(self._extend(best))
+        else:
+            self.misses += 1
+
+        covered = best.messages if best else 0
+        end = boundaries[-1] if boundaries else 0
+        uncached = estimate_tokens(system_prompt) if not best else 0
+        uncached += sum(estimate_tokens(json.dumps(c, default=str)) for c in to_contents(history[covered:end]))
+        if uncached >= self.min_tokens(model):
+            key = (model, hashes[end])
+            if key not in self._handles and key not in self._creating:
+                task = asyncio.create_task(self._create(key, model, system_prompt, history[:end], end))
+                self._creating[key] = task
+                task.add_done_callback(lambda _: self._creating.pop(key, None))
+
+        if not best:
+            return {}, history
+        return {"google_cached_content": best.name}, history[best.messages:]
+
+    async def _create(self, key, model: str, system_prompt: str, messages: list, covered: int):
+        contents = to_contents(messages)
+        try:
+            from google.genai import types
+            cached = await self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_prompt,
+                    contents=contents or None,
+                    tools=[{"function_declarations": self.tool_declarations}] if self.tool_declarations else None,
+                    ttl=f"{self.ttl}s",
+                    display_name=f"maf-{key[1][:16]}",
+                ),
+            )
+        except Exception as e:
+            # Too small for this model, quota, etc.: the turn simply runs uncached
+            self.errors += 1
+            print(f"Context cache create failed: {e}")
+            return
+        tokens = getattr(cached.usage_metadata, "total_token_count", 0) if cached.usage_metadata else 0
+        self._handles[key] = CacheHandle(cached.name, model, tokens or 0, time.monotonic() + self.ttl - 30, covered)
+        self.created += 1
+        while len(self._handles) > self.max_entries:
+            _, evicted = self._handles.popitem(last=False)
+            asyncio.create_task(self._delete(evicted))  # storage is billed per hour, don't leave it around
+
+    async def _extend(self, handle: CacheHandle):
+        try:
+            from google.genai import types
+            await self.client.aio.caches.update(
+                name=handle.name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s")
+            )
+            handle.expires_at = time.monotonic() + self.ttl - 30
+        except Exception as e:
+            print(f"Context cache refresh failed: {e}")
+
+    async def _delete(self, handle: CacheHandle):
+        try:
+            await self.client.aio.caches.delete(name=handle.name)
+        except Exception as e:
+            print(f"Context cache delete failed: {e}")
+
+    async def close(self):
+        """Delete every cache this process created"""
+        await asyncio.gather(*(self._delete(h) for h in self._handles.values()))
+        self._handles.clear()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "entries": len(self._handles),
+            "live": sum(1 for h in self._handles.values() if h.expires_at > now),
+            "cached_tokens": sum(h.tokens for h in self._handles.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "errors": self.errors,
+        }
+
+
+def create_context_cache(tools=()):
+    """ContextCache when CONTEXT_CACHE=1 (off by default: cached storage is billed)"""
+    if os.getenv("CONTEXT_CACHE", "0") != "1":
+        return None
+    return ContextCache(
+        tools=tools,
+        ttl=int(os.getenv("CONTEXT_CACHE_TTL", "600")),
+        max_entries=int(os.getenv("CONTEXT_CACHE_SIZE", "64")),
+    )
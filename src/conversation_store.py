@@ -0,0 +1,232 @@
+"""
+Persistent conversation sessions
+Hot tier of live ConversationMemory objects in front of SQLite; writes are queued and
+flushed in batches by a background task so the streaming loop never waits on disk.
+With several workers, a per-session version in the shared state backend tells a worker
+when its hot copy is stale because the session continued elsewhere.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+from memory import ConversationMemory, render_messages
+
+
+class ConversationStore:
+    """Sessions keyed by (session_id, stream_id); path=None keeps only the in-memory hot tier"""
+
+    def __init__(self, path: str = "conversations.db", hot_size: int = 256, flush_ms: float = 200,
+                 batch_size: int = 256, max_pending: int = 10000, shared=None):
+        self.hot_size = hot_size
+        self.shared = shared               # cross-worker state (see shared_state.py), None for one process
+        self._versions = {}                # hot key -> shared version this worker last saw
+        self.flush_s = flush_ms / 1000
+        self.batch_size = batch_size
+        self._hot = OrderedDict()          # (session_id, stream_id) -> ConversationMemory
+        self._pending = deque(maxlen=max_pending)  # oldest writes are dropped if the disk stalls
+        self._wakeup = None
+        self._flusher = None
+        self._flush_lock = None
+        self.writes = self.batches = self.dropped = self.reloads = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS turns (
+                    session_id TEXT, stream_id TEXT, seq INTEGER, created_at REAL,
+                    text TEXT, messages BLOB,
+                    PRIMARY KEY (session_id, stream_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS summaries (
+                    session_id TEXT, stream_id TEXT, summary TEXT, compacted INTEGER, updated_at REAL,
+                    PRIMARY KEY (session_id, stream_id)
+                );
+                CREATE INDEX IF NOT EXISTS turns_created ON turns (created_at);
+            """)
+
+    # -- write side: enqueue only, never awaited by the streaming path --
+
+    def _enqueue(self, op: tuple):
+        if self._db is None:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(op)
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+        self._wakeup.set()
+
+    def _hooks(self, key):
+        session_id, stream_id = key
+        return {
+            "on_turn": lambda seq, messages: self._enqueue(
+                ("turn", session_id, stream_id, seq, time.time(), messages)
+            ),
+            "on_summary": lambda summary, compacted: self._enqueue(
+                ("summary", session_id, stream_id, summary, compacted, time.time())
+            ),
+        }
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_s)  # let a batch accumulate
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        # One writer at a time keeps batches (and summary upserts) in order
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    await asyncio.to_thread(self._write, batch)
+                    if self.shared is not None:
+                        # Bump versions only once the rows are durable, so other workers reload complete data
+                        for key in {(op[1], op[2]) for op in batch}:
+                            self._versions[key] = await self.shared.incrby(self._version_key(key))
+                except Exception as e:
+                    print(f"Conversation store write failed: {str(e)}")
+
+    def _write(self, batch: list):
+        # Serialization happens here, on the writer thread, not in the event loop
+        turns = [
+            (session_id, stream_id, seq, created_at, render_messages(messages),
+             ModelMessagesTypeAdapter.dump_json(messages))
+            for kind, session_id, stream_id, seq, created_at, messages in batch if kind == "turn"
+        ]
+        summaries = [op[1:] for op in batch if op[0] == "summary"]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?, ?)", turns)
+            self._db.executemany("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)", summaries)
+        self.writes += len(batch)
+        self.batches += 1
+
+    # -- hot tier --
+
+    @staticmethod
+    def _version_key(key) -> str:
+        return f"session:{key[0]}:{key[1]}:version"
+
+    async def _stale(self, key) -> bool:
+        """Another worker wrote this session since we cached it (our own queued writes aren't out yet)"""
+        if self.shared is None or any(op[1:3] == key for op in self._pending):
+            return False
+        version = await self.shared.get(self._version_key(key))
+        return version is not None and int(version) != self._versions.get(key, 0)
+
+    async def memory(self, session_id: str, stream_id: str, summarize, token_budget: int) -> ConversationMemory:
+        """The session's memory, from the hot tier or rehydrated from disk"""
+        key = (session_id, stream_id)
+        if key in self._hot:
+            if not await self._stale(key):
+                self._hot.move_to_end(key)
+                return self._hot[key]
+            del self._hot[key]
+            self.reloads += 1
+        memory = ConversationMemory(summarize, token_budget=token_budget, **self._hooks(key))
+        if self._db is not None:
+            await self.flush()  # the session may still have queued writes from before it left the hot tier
+            if self.shared is not None:
+                # Read the version first: a write landing during the load only causes one extra reload later
+                self._versions[key] = int(await self.shared.get(self._version_key(key)) or 0)
+            turns, summary, turn_count, compacted = await asyncio.to_thread(self._load, session_id, stream_id)
+            memory.restore(turns, summary, turn_count, compacted)
+        # A concurrent load for the same key may have finished first; keep one instance
+        memory = self._hot.setdefault(key, memory)
+        while len(self._hot) > self.hot_size:
+            evicted, _ = self._hot.popitem(last=False)
+            self._versions.pop(evicted, None)
+        return memory
+
+    def _load(self, session_id: str, stream_id: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, compacted FROM summaries WHERE session_id = ? AND stream_id = ?",
+                (session_id, stream_id)
+            ).fetchone()
+            summary, compacted = row if row else ("", 0)
+            rows = self._db.execute(
+                "SELECT seq, messages FROM turns WHERE session_id = ? AND stream_id = ? AND seq >= ? "
+                "ORDER BY seq", (session_id, stream_id, compacted)
+            ).fetchall()
+            last = self._db.execute(
+                "SELECT MAX(seq) FROM turns WHERE session_id = ? AND stream_id = ?", (session_id, stream_id)
+            ).fetchone()[0]
+        turns = [ModelMessagesTypeAdapter.validate_json(blob) for _, blob in rows]
+        turn_count = max(compacted, last + 1 if last is not None else 0)
+        return turns, summary, turn_count, compacted
+
+    # -- read side --
+
+    async def turn_count(self, session_id: str) -> int:
+        hot = sum(m.turn_count for (sid, _), m in self._hot.items() if sid == session_id)
+        if self._db is None or hot:
+            return hot
+        return await asyncio.to_thread(self._query_one, "SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,))
+
+    def _query_one(self, sql: str, params: tuple):
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()[0]
+
+    def _query(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    async def transcript(self, session_id: str, stream_id: str = None, limit: int = 500) -> list:
+        """Plain-text turns of one session, oldest first (callers must have proven they hold session_id)"""
+        if self._db is None:
+            return []
+        await self.flush()  # turns still queued behind the stream belong in the transcript
+        sql = "SELECT stream_id, seq, created_at, text FROM turns WHERE session_id = ?"
+        params = (session_id,)
+        if stream_id is not None:
+            sql += " AND stream_id = ?"
+            params += (stream_id,)
+        rows = await asyncio.to_thread(self._query, sql + " ORDER BY created_at, seq LIMIT ?", params + (limit,))
+        return [dict(zip(("stream_id", "seq", "created_at", "text"), row)) for row in rows]
+
+    async def close(self):
+        """Flush queued writes; call on shutdown"""
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._db is not None:
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "persistent": self._db is not None,
+            "hot_sessions": len(self._hot),
+            "pending_writes": len(self._pending),
+            "writes": self.writes,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "reloads": self.reloads,
+        }
+
+
+def create_conversation_store(shared=None):
+    """Build the store from CONVERSATION_STORE* env vars (None keeps memory per connection only)"""
+    kind = os.getenv("CONVERSATION_STORE", "").lower()
+    if not kind:
+        return None
+    hot_size = int(os.getenv("CONVERSATION_HOT_SESSIONS", "256"))
+    if kind == "sqlite":
+        return ConversationStore(
+            os.getenv("CONVERSATION_STORE_PATH", "conversations.db"), hot_size,
+            flush_ms=float(os.getenv("CONVERSATION_FLUSH_MS", "200")),
+            shared=shared if shared is not None and shared.cross_process else None,
+        )
+    if kind == "memory":
+        return ConversationStore(None, hot_size)
+    raise ValueError(f"Unknown CONVERSATION_STORE backend: {kind!r} (use 'memory' or 'sqlite')")
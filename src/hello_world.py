@@ -5,28 +5,66 @@ Minimal FastAPI app with streaming agents (under 200 LOC per Elon's algorithm)
 """
 
 import os
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from startup import create_readiness  # first, so its clock covers the imports below
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from pydantic_ai import Agent
 from pydantic_ai.settings import ModelSettings
 from dotenv import load_dotenv
-from streaming import handle_websocket_stream
+from streaming import Deps, handle_websocket_stream
 from ui import get_html_interface
+from agent_pool import AgentPool
+from response_cache import create_response_cache
+from metrics import REGISTRY
+from retrieval import search_docs
+from static_page import PrecompressedPage
+from scheduler import create_scheduler
+from routing import create_router
+from context_cache import create_context_cache
+from conversation_store import create_conversation_store
+from shared_state import create_shared_state
+from batch import create_batch_jobs
+from routes import create_batch_router, create_session_router, create_stats_router
 
 # Load environment
 load_dotenv()
 
-app = FastAPI(title="MultiAgent Framework")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pre-warm configured models in the background (see /ready); flush state on shutdown"""
+    readiness.mark("init")
+    # Pings go through a tool-less agent on the pooled agent's model, so they warm its connection
+    warming = asyncio.create_task(readiness.warm(
+        agent_pool.get, Deps(system_prompt=""), ping_agent=lambda agent: create_agent(agent.model, tools=False)
+    ))
+    yield
+    warming.cancel()
+    # Write out anything still queued before the process exits
+    if conversation_store:
+        await conversation_store.close()
+    await shared_state.close()
+    # Cached content is billed per hour until it expires; delete what this worker created
+    if context_cache:
+        await context_cache.close()
 
-def create_agent(model: str, system_prompt: str = None) -> Agent:
-    """Create a dynamically configured agent (ModelSettings applied per-request)"""
-    from streaming import Deps
-    
+app = FastAPI(title="MultiAgent Framework", lifespan=lifespan)
+
+# Ground agents in the local docs corpus (see retrieval.py)
+agent_tools = [search_docs] if os.getenv("DOCS_RETRIEVAL", "1") == "1" else []
+
+def create_agent(model, system_prompt: str = None, tools: bool = True) -> Agent:
+    """Create a dynamically configured agent (ModelSettings applied per-request)
+
+    model: a model name, or a Model instance to share its provider client; tools=False for
+    internal runs (summaries, pre-warm pings) that must never call search_docs
+    """
     if system_prompt:
-        return Agent(model, system_prompt=system_prompt)
+        return Agent(model, system_prompt=system_prompt, tools=agent_tools if tools else [])
     else:
         # Create agent with dynamic system prompt support
-        agent = Agent(model, deps_type=Deps)
+        agent = Agent(model, deps_type=Deps, tools=agent_tools if tools else [])
         
         @agent.system_prompt
         def dynamic_system_prompt(ctx) -> str:
@@ -34,16 +72,74 @@ def create_agent(model: str, system_prompt: str = None) -> Agent:
         
         return agent
 
+# Reuse agents (and their provider clients) across messages and connections
+agent_pool = AgentPool(create_agent, max_size=int(os.getenv("AGENT_POOL_SIZE", "32")))
+
+# State every worker process must agree on (local to this process by default), see SHARED_STATE in .env.example
+shared_state = create_shared_state()
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+if workers > 1 and not shared_state.cross_process:
+    print(f"Warning: {workers} workers with SHARED_STATE=local - rate limits and cache are per worker")
+
+# Optional cache for deterministic (temperature=0) answers, see RESPONSE_CACHE in .env.example
+response_cache = create_response_cache(shared_state)
+
+# Per-model concurrency/token budgets shared by every connection, see MODEL_CONCURRENCY in .env.example
+scheduler = create_scheduler(shared_state)
+
+# Live model health, `auto` model selection and fallback chain, see MODEL_FALLBACKS in .env.example
+router = create_router()
+
+# Gemini cached content for long system prompts and conversation prefixes, see CONTEXT_CACHE in .env.example
+context_cache = create_context_cache(agent_tools)
+
+# Session memory that survives reconnects, written behind to SQLite, see CONVERSATION_STORE in .env.example
+conversation_store = create_conversation_store(shared_state)
+
+# Headless JSONL jobs over the same agents, scheduler and caches, see BATCH_DIR in .env.example
+batch_jobs = create_batch_jobs(agent_pool.get, response_cache, scheduler, router, context_cache)
+
+# Startup timing and model pre-warm behind /ready, see PREWARM_MODELS in .env.example
+readiness = create_readiness()
+
+# The interface never changes at runtime: assemble and compress it once
+interface_page = PrecompressedPage(get_html_interface())
+
 @app.get("/", response_class=HTMLResponse)
-async def root():
+async def root(request: Request):
     """Main interface - dark mode only"""
-    return get_html_interface()
+    return interface_page.response(request)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for streaming"""
-    await handle_websocket_stream(websocket, create_agent)
+    await handle_websocket_stream(
+        websocket, agent_pool.get, response_cache, scheduler, router, context_cache, conversation_store
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus-format per-turn latency and token metrics"""
+    return REGISTRY.render()
+
+# Component stats, the caller's session transcript and the /batch job API (routes.py)
+app.include_router(create_stats_router(
+    agent_pool, response_cache, scheduler, router, context_cache, conversation_store, shared_state
+))
+app.include_router(create_session_router(conversation_store))
+app.include_router(create_batch_router(batch_jobs))
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until startup and model pre-warm have finished"""
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Several workers need an import string so each process builds its own app (see docs/DEPLOYMENT.md)
+    uvicorn.run(
+        "hello_world:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers,
+        # permessage-deflate, negotiated per connection; trades server CPU for bytes on the wire
+        ws_per_message_deflate=os.getenv("WS_DEFLATE", "1") == "1",
+    )
@@ -0,0 +1,152 @@
+"""
+Token-budgeted conversation memory backed by pydantic-ai message history
+Older turns are folded into a rolling summary once the budget is exceeded
+"""
+
+import asyncio
+from dataclasses import replace
+from typing import List
+from pydantic_ai.messages import (
+    ModelMessage, ModelRequest, SystemPromptPart, TextPart, ToolCallPart, ToolReturnPart, UserPromptPart
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Keep every fact, decision and open question needed to continue the conversation. Be concise."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap offline token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def part_text(part) -> str:
+    """What a message part puts in front of the model, tool calls and results included"""
+    if isinstance(part, ToolCallPart):
+        return f"{part.tool_name}({part.args_as_json_str()})"
+    if isinstance(part, ToolReturnPart):
+        return part.model_response_str()
+    content = getattr(part, "content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+def estimate_message_tokens(messages: List[ModelMessage]) -> int:
+    """Token estimate of a message history as sent; tool results (e.g. search_docs excerpts) can dominate it"""
+    return sum(estimate_tokens(part_text(part)) for message in messages for part in message.parts)
+
+
+def render_messages(messages: List[ModelMessage]) -> str:
+    """Plain-text transcript of user prompts and text responses"""
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                lines.append(f"User: {part.content}")
+            elif isinstance(part, TextPart):
+                lines.append(f"Assistant: {part.content}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """Per-session multi-turn history kept under a token budget"""
+
+    def __init__(self, summarize, token_budget: int = 6000, on_turn=None, on_summary=None):
+        self.summarize = summarize  # async (prompt: str) -> str
+        self.token_budget = token_budget
+        self.summary = ""
+        self._turns = []  # [(messages, tokens)]
+        self._compaction = None
+        self._generation = 0  # bumped by clear(), so a summary started before a reset is discarded
+        # Persistence hooks: on_turn(seq, messages) and on_summary(summary, compacted_turns)
+        self.on_turn = on_turn
+        self.on_summary = on_summary
+        self.turn_count = 0   # turns ever added
+        self.compacted = 0    # leading turns folded into the summary (or cleared)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(tokens for _, tokens in self._turns)
+
+    async def history(self, system_prompt: str) -> List[ModelMessage]:
+        """Message history for the next run, with system prompt and summary up front"""
+        if self._compaction:
+            compaction = self._compaction
+            await asyncio.wait([compaction])  # a reset may cancel it meanwhile; that must not fail this turn
+            if self._compaction is compaction:
+                self._compaction = None
+            if not compaction.cancelled():
+                compaction.result()
+        if not self._turns:
+            return []
+
+        messages = [message for turn, _ in self._turns for message in turn]
+        header = [SystemPromptPart(system_prompt)]
+        if self.summary:
+            header.append(SystemPromptPart(f"Summary of the earlier conversation:\n{self.summary}"))
+        messages[0] = replace(messages[0], parts=header + list(messages[0].parts))
+        return messages
+
+    def clear(self):
+        """Forget all turns and the summary"""
+        self.summary = ""
+        self._turns = []
+        self._generation += 1
+        if self._compaction:
+            self._compaction.cancel()
+            self._compaction = None
+        self.compacted = self.turn_count
+        if self.on_summary:
+            self.on_summary(self.summary, self.compacted)
+
+    def restore(self, turns: List[List[ModelMessage]], summary: str, turn_count: int, compacted: int):
+        """Rehydrate from a store: the live (uncompacted) turns plus the summary of the rest"""
+        self.summary = summary
+        self._turns = [(messages, estimate_message_tokens(messages)) for messages in turns]
+        self.turn_count = turn_count
+        self.compacted = compacted
+
+    def add_turn(self, messages: List[ModelMessage]):
+        """Store a finished run and start compaction in the background if over budget"""
+        # System prompts are re-supplied by history() so they can change between turns
+        messages = [
+            replace(message, parts=[p for p in message.parts if not isinstance(p, SystemPromptPart)])
+            if isinstance(message, ModelRequest) else message
+            for message in messages
+        ]
+        self._turns.append((messages, estimate_message_tokens(messages)))
+        if self.on_turn:
+            self.on_turn(self.turn_count, messages)
+        self.turn_count += 1
+        if self.tokens > self.token_budget and self._compaction is None:
+            self._compaction = asyncio.ensure_future(self.compact())
+
+    async def compact(self):
+        """Fold the oldest turns into the summary until we are at half the budget"""
+        evicted = []
+        folded = 0
+        while len(self._turns) > 1 and self.tokens > self.token_budget // 2:
+            evicted.extend(self._turns.pop(0)[0])
+            folded += 1
+        if not evicted:
+            return
+        self.compacted += folded
+        generation = self._generation
+
+        prompt = (
+            f"Current summary:\n{self.summary or '(empty)'}\n\n"
+            f"New conversation turns to merge into the summary:\n{render_messages(evicted)}\n\n"
+            "Return the updated summary only."
+        )
+        try:
+            summary = (await self.summarize(prompt)).strip()
+        except Exception as e:
+            # Keep the old summary; the evicted turns are dropped rather than blocking the session
+            print(f"History summarization failed: {str(e)}")
+            summary = self.summary
+        if generation != self._generation:
+            return  # the session was reset while summarizing
+        self.summary = summary
+        if self.on_summary:
+            self.on_summary(self.summary, self.compacted)
+
@@ -0,0 +1,171 @@
+"""
+Per-turn latency instrumentation with a Prometheus text exposition
+Dependency-free counters/histograms so /metrics works offline
+"""
+
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import List
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+GAP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(k)} {v}" for k, v in self._values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.buckets = name, help, tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        self._metrics.append(Counter(name, help))
+        return self._metrics[-1]
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        self._metrics.append(Histogram(name, help, buckets))
+        return self._metrics[-1]
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+TURNS = REGISTRY.counter("agent_turns_total", "Agent turns by model, agent and outcome")
+QUEUE_WAIT = REGISTRY.histogram("agent_queue_wait_seconds", "Time from message receipt to turn start")
+CONSTRUCT = REGISTRY.histogram("agent_construct_seconds", "Time spent obtaining the agent", GAP_BUCKETS)
+TTFT = REGISTRY.histogram("agent_ttft_seconds", "Time to first token")
+TOKEN_GAP = REGISTRY.histogram("agent_token_gap_seconds", "Gap between consecutive deltas", GAP_BUCKETS)
+STREAM_TIME = REGISTRY.histogram("agent_stream_seconds", "Total stream time per turn")
+TOKENS_OUT = REGISTRY.histogram("agent_output_tokens", "Output tokens per turn", TOKEN_BUCKETS)
+USAGE_TOKENS = REGISTRY.counter("agent_usage_tokens_total", "Provider-reported token usage")
+SCHEDULER_WAIT = REGISTRY.histogram("scheduler_wait_seconds", "Time waiting for a provider slot")
+RATE_LIMIT_RETRIES = REGISTRY.counter("provider_rate_limit_retries_total", "Turns retried after a 429")
+HEDGES = REGISTRY.counter("agent_hedges_total", "Hedged requests launched after a slow first token")
+HEDGE_WINS = REGISTRY.counter("agent_hedge_wins_total", "Hedged requests whose first token beat the original")
+FALLBACKS = REGISTRY.counter("model_fallbacks_total", "Turns moved to a fallback model before the first token")
+
+
+@dataclass
+class TurnTiming:
+    """Timestamps for one agent turn (time.monotonic seconds)"""
+    model: str
+    agent: str
+    received_at: float
+    construct_s: float = 0.0
+    source: str = "live"
+    started_at: float = 0.0
+    first_token_at: float = 0.0
+    last_token_at: float = 0.0
+    ended_at: float = 0.0
+    chunks: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    gaps: List[float] = field(default_factory=list)
+
+    def start(self):
+        self.started_at = time.monotonic()
+
+    def token(self):
+        now = time.monotonic()
+        if self.chunks:
+            self.gaps.append(now - self.last_token_at)
+        else:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.chunks += 1
+
+    def finish(self, usage=None):
+        self.ended_at = time.monotonic()
+        if callable(usage):  # a method in older pydantic-ai releases, a property in newer ones
+            usage = usage()
+        if usage is not None:
+            self.input_tokens = usage.input_tokens or 0
+            self.output_tokens = usage.output_tokens or 0
+
+    @property
+    def ttft(self) -> float:
+        return self.first_token_at - self.started_at if self.chunks else 0.0
+
+    def record(self, outcome: str = "ok"):
+        """Publish this turn to the process-wide registry"""
+        labels = {"model": self.model, "agent": self.agent}
+        TURNS.inc(outcome=outcome, source=self.source, **labels)
+        if outcome != "ok":
+            return
+        QUEUE_WAIT.observe(self.started_at - self.received_at, **labels)
+        CONSTRUCT.observe(self.construct_s, **labels)
+        STREAM_TIME.observe(self.ended_at - self.started_at, source=self.source, **labels)
+        if self.source == "live":
+            if self.chunks:
+                TTFT.observe(self.ttft, **labels)
+            for gap in self.gaps:
+                TOKEN_GAP.observe(gap, model=self.model)
+            TOKENS_OUT.observe(self.output_tokens or self.chunks, **labels)
+            USAGE_TOKENS.inc(self.input_tokens, kind="input", model=self.model)
+            USAGE_TOKENS.inc(self.output_tokens, kind="output", model=self.model)
+
+    def as_frame(self) -> dict:
+        """Client-facing timing summary (milliseconds)"""
+        gaps = sorted(self.gaps)
+        stream_s = self.ended_at - self.started_at
+        tokens = self.output_tokens or self.chunks
+        return {
+            "type": "timing",
+            "agent": self.agent,
+            "model": self.model,
+            "source": self.source,
+            "queue_wait_ms": round((self.started_at - self.received_at) * 1000, 1),
+            "construct_ms": round(self.construct_s * 1000, 3),
+            "ttft_ms": round(self.ttft * 1000, 1),
+            "stream_ms": round(stream_s * 1000, 1),
+            "gap_p50_ms": round(gaps[len(gaps) // 2] * 1000, 1) if gaps else 0.0,
+            "gap_p95_ms": round(gaps[int(len(gaps) * 0.95)] * 1000, 1) if gaps else 0.0,
+            "gap_max_ms": round(gaps[-1] * 1000, 1) if gaps else 0.0,
+            "tokens_out": tokens,
+            "input_tokens": self.input_tokens,
+            "tokens_per_sec": round(tokens / stream_s, 1) if stream_s > 0 else 0.0,
+        }
@@ -0,0 +1,112 @@
+"""
+Declarative multi-agent orchestration
+A plan is a graph of turns; independent turns run concurrently in a TaskGroup
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class Turn:
+    """One agent turn; prompt is a format string over {content} and prior turn ids"""
+    id: str
+    agent: str
+    prompt: str
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Plan:
+    """Agents (name -> system prompt) plus the turns they take"""
+    agents: Dict[str, str]
+    turns: List[Turn]
+
+    def validate(self):
+        """Reject unknown agents/dependencies and cycles (which would deadlock)"""
+        ids = {turn.id for turn in self.turns}
+        if len(ids) != len(self.turns) or "content" in ids:
+            raise ValueError("Turn ids must be unique and must not be 'content'")
+        for turn in self.turns:
+            if turn.agent not in self.agents:
+                raise ValueError(f"Turn {turn.id!r} uses unknown agent {turn.agent!r}")
+            missing = set(turn.depends_on) - ids
+            if missing:
+                raise ValueError(f"Turn {turn.id!r} depends on unknown turns {sorted(missing)}")
+
+        resolved = set()
+        pending = list(self.turns)
+        while pending:
+            ready = [turn for turn in pending if set(turn.depends_on) <= resolved]
+            if not ready:
+                raise ValueError(f"Cyclic dependencies between turns {[t.id for t in pending]}")
+            resolved.update(turn.id for turn in ready)
+            pending = [turn for turn in pending if turn.id not in resolved]
+
+
+async def run_plan(plan: Plan, content: str, run_turn) -> Dict[str, str]:
+    """Run every turn as soon as its dependencies finish; run_turn(turn, prompt) -> text"""
+    plan.validate()
+    outputs = {}
+    finished = {turn.id: asyncio.Event() for turn in plan.turns}
+
+    async def run(turn: Turn):
+        for dep in turn.depends_on:
+            await finished[dep].wait()
+        prompt = turn.prompt.format(content=content, **{dep: outputs[dep] for dep in turn.depends_on})
+        outputs[turn.id] = await run_turn(turn, prompt)
+        finished[turn.id].set()
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for turn in plan.turns:
+                tg.create_task(run(turn))
+    except ExceptionGroup as group:
+        # One failed turn cancels its siblings; surface the original error to the caller
+        raise group.exceptions[0]
+    return outputs
+
+
+def classic_debate() -> Plan:
+    """Opening -> counter-argument -> final reply (strictly serial)"""
+    return Plan(
+        agents={
+            "first": "You start discussions thoughtfully and present initial viewpoints.",
+            "second": "You provide thoughtful counter-arguments and alternative perspectives.",
+        },
+        turns=[
+            Turn("opening", "first", "Start a discussion about: {content}"),
+            Turn("rebuttal", "second", "Respond to: {opening}", ["opening"]),
+            Turn("final", "first", "Final reply to: {rebuttal}", ["rebuttal"]),
+        ],
+    )
+
+
+def panel_debate(num_agents: int = 3, rounds: int = 2) -> Plan:
+    """Panelists open independently (concurrently), then each round answers the previous one"""
+    names = [f"panelist_{i}" for i in range(1, num_agents + 1)]
+    agents = {
+        name: f"You are {name.replace('_', ' ')} on an expert panel. Give an independent, well-reasoned perspective."
+        for name in names
+    }
+    turns = [Turn(f"{name}_r1", name, "Give your opening statement on: {content}") for name in names]
+    for round_no in range(2, rounds + 1):
+        previous = [f"{name}_r{round_no - 1}" for name in names]
+        transcript = "\n\n".join(f"{dep.rsplit('_r', 1)[0]}: {{{dep}}}" for dep in previous)
+        for name in names:
+            turns.append(Turn(
+                f"{name}_r{round_no}", name,
+                "Topic: {content}\n\nThe panel said:\n\n" + transcript + "\n\nRespond to the other panelists.",
+                previous,
+            ))
+    return Plan(agents=agents, turns=turns)
+
+
+def build_debate_plan(config) -> Plan:
+    """Pick the debate plan from the (validated) client config block"""
+    if config.debate_style == "panel":
+        num_agents = min(max(config.debate_agents, 2), 6)
+        rounds = min(max(config.debate_rounds, 1), 4)
+        return panel_debate(num_agents, rounds)
+    return classic_debate()
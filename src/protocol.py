@@ -0,0 +1,161 @@
+"""
+Wire protocols for the streaming WebSocket
+Picked per connection from the client's Sec-WebSocket-Protocol offer; clients that offer
+nothing get the original one-JSON-object-per-frame protocol.
+
+maf.json              {"type": "token", "content": "...", "agent": "...", "stream_id": "..."}
+maf.compact           [type, stream, agent, body] JSON arrays: integer frame types, stream ids and
+                      per-stream agent names sent once as definition frames, then referenced by index
+maf.compact.msgpack   the same arrays as MessagePack binary frames (needs `pip install msgpack`)
+
+Client -> server messages keep the same object shape under every protocol (JSON text, or a
+MessagePack map under maf.compact.msgpack).
+"""
+
+import json
+from typing import Any
+from pydantic import TypeAdapter
+from schemas import dump_frame
+
+try:
+    import msgpack  # optional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "maf.json"
+COMPACT = "maf.compact"
+COMPACT_MSGPACK = "maf.compact.msgpack"
+
+# Compact frame type codes: the index is the wire value, so only ever append
+FRAME_TYPES = (
+    "token", "agent_start", "agent_end", "complete", "error", "cancelled", "timing",
+    "queued", "retrying", "fallback", "session", "stream", "agent",
+)
+CODES = {name: code for code, name in enumerate(FRAME_TYPES)}
+TOKEN, STREAM, AGENT = CODES["token"], CODES["stream"], CODES["agent"]
+_ARRAY = TypeAdapter(list[Any])
+
+
+class JsonCodec:
+    """One JSON object per text frame (the default)"""
+    name = JSON
+
+    def encode(self, frame: dict) -> list:
+        """Frame -> wire messages to send in order"""
+        return [dump_frame(frame)]
+
+    def parse(self, data, adapter: TypeAdapter):
+        """Validate a client message straight from the received text/bytes"""
+        return adapter.validate_json(data)
+
+    def decode(self, data):
+        """Plain decode, for error reporting when parse() rejected the message"""
+        return json.loads(data)
+
+
+class CompactCodec:
+    """Positional arrays with interned stream ids and agent names, one instance per connection"""
+    name = COMPACT
+
+    def __init__(self):
+        self._streams = {}  # stream_id -> index
+        self._agents = {}   # stream index -> {agent name -> index}
+
+    def _dump(self, message: list):
+        return _ARRAY.dump_json(message).decode("utf-8")
+
+    def _intern(self, out: list, stream_id, agent):
+        s = a = None
+        if stream_id is not None:
+            s = self._streams.get(stream_id)
+            if s is None:
+                s = self._streams[stream_id] = len(self._streams)
+                out.append(self._dump([STREAM, s, None, stream_id]))
+        if agent is not None:
+            agents = self._agents.setdefault(s, {})
+            a = agents.get(agent)
+            if a is None:
+                a = agents[agent] = len(agents)
+                out.append(self._dump([AGENT, s, a, agent]))
+        return s, a
+
+    def encode(self, frame: dict) -> list:
+        out = []
+        s, a = self._intern(out, frame.get("stream_id"), frame.get("agent"))
+        frame_type = frame["type"]
+        if frame_type == "token":
+            # Hot path: [0, stream, agent, "text"]
+            out.append(self._dump([TOKEN, s, a, frame["content"]]))
+            return out
+        rest = {k: v for k, v in frame.items() if k not in ("type", "stream_id", "agent")}
+        body = rest["content"] if list(rest) == ["content"] else (rest or None)
+        message = [CODES.get(frame_type, frame_type), s, a, body]  # unknown types travel by name
+        while message[-1] is None:
+            message.pop()
+        out.append(self._dump(message))
+        return out
+
+    parse = JsonCodec.parse
+    decode = JsonCodec.decode
+
+
+class MsgpackCodec(CompactCodec):
+    """Compact arrays as MessagePack binary frames"""
+    name = COMPACT_MSGPACK
+
+    def _dump(self, message: list):
+        return msgpack.packb(message)
+
+    def parse(self, data, adapter: TypeAdapter):
+        if isinstance(data, bytes):
+            return adapter.validate_python(msgpack.unpackb(data))
+        return adapter.validate_json(data)
+
+    def decode(self, data):
+        return msgpack.unpackb(data) if isinstance(data, bytes) else json.loads(data)
+
+
+CODECS = {JSON: JsonCodec, COMPACT: CompactCodec, COMPACT_MSGPACK: MsgpackCodec}
+
+
+def negotiate(offered) -> tuple:
+    """(subprotocol to accept or None, codec) for the client's offered subprotocols, first match wins"""
+    for name in offered:
+        if name == COMPACT_MSGPACK and msgpack is None:
+            continue
+        if name in CODECS:
+            return name, CODECS[name]()
+    return None, JsonCodec()
+
+
+class FrameDecoder:
+    """Client side of the compact protocols: wire message -> the frame dict the server sent, or None
+    for definition frames (ui.py carries the same logic in JavaScript)"""
+
+    def __init__(self, protocol: str = JSON):
+        self.protocol = protocol
+        self._streams = {}
+        self._agents = {}
+
+    def decode(self, data):
+        if self.protocol == JSON:
+            return json.loads(data)
+        message = msgpack.unpackb(data) if isinstance(data, bytes) else json.loads(data)
+        code, s, a, body = (list(message) + [None] * 3)[:4]
+        frame_type = FRAME_TYPES[code] if isinstance(code, int) else code
+        if frame_type == "stream":
+            self._streams[s] = body
+            return None
+        if frame_type == "agent":
+            self._agents.setdefault(s, {})[a] = body
+            return None
+        frame = {"type": frame_type}
+        if s is not None:
+            frame["stream_id"] = self._streams[s]
+        if a is not None:
+            frame["agent"] = self._agents[s][a]
+        if isinstance(body, str):
+            frame["content"] = body
+        elif body:
+            frame.update(body)
+        return frame
@@ -0,0 +1,184 @@
+"""
+Response cache for deterministic (temperature=0) agent turns
+Exact or normalized ("semantic") keys, TTL + LRU eviction, memory, SQLite or shared-state backend
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt: str, mode: str = "exact") -> str:
+    """exact: collapse whitespace; semantic: also casefold and drop punctuation"""
+    text = " ".join(prompt.split())
+    if mode == "semantic":
+        text = " ".join(re.sub(r"[^\w\s]", " ", text.casefold()).split())
+    return text
+
+
+class MemoryBackend:
+    """In-process LRU dict with per-entry expiry"""
+    blocking = False
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk cache table; LRU by last access time, shared across restarts"""
+    blocking = True
+
+    def __init__(self, path: str = "response_cache.db", max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, now + ttl, now)
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class SharedBackend:
+    """Entries in the shared state backend (see shared_state.py), so every worker sees every answer"""
+    blocking = False
+
+    def __init__(self, shared, prefix: str = "cache:"):
+        self.shared = shared
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        return await self.shared.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        # Size is bounded by expiry here (and maxmemory/LRU policy on Redis)
+        await self.shared.set(self.prefix + key, value, ex=ttl)
+
+
+class ResponseCache:
+    """Keys, TTL and hit/miss/bytes-saved accounting over a pluggable backend"""
+
+    def __init__(self, backend, ttl: float = 3600, key_mode: str = "exact"):
+        self.backend = backend
+        self.ttl = ttl
+        self.key_mode = key_mode
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def key(self, prompt: str, **settings) -> str:
+        """Hash of the normalized prompt plus everything that affects the answer"""
+        payload = json.dumps(
+            {"prompt": normalize_prompt(prompt, self.key_mode), **settings},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str):
+        value = await self._call(self.backend.get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.bytes_saved += len(value.encode("utf-8"))
+        return value
+
+    async def set(self, key: str, value: str):
+        await self._call(self.backend.set, key, value, self.ttl)
+
+    async def _call(self, func, *args):
+        # Keep disk I/O off the event loop so token streaming never waits on SQLite
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args)
+        return func(*args)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+def create_response_cache(shared=None):
+    """Build the cache from RESPONSE_CACHE* env vars (None when disabled)"""
+    kind = os.getenv("RESPONSE_CACHE", "").lower()
+    if not kind:
+        return None
+    size = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+    if kind == "sqlite":
+        backend = SQLiteBackend(os.getenv("RESPONSE_CACHE_PATH", "response_cache.db"), size)
+    elif kind == "memory":
+        backend = MemoryBackend(size)
+    elif kind == "shared" and shared is not None:
+        backend = SharedBackend(shared)
+    else:
+        raise ValueError(f"Unknown RESPONSE_CACHE backend: {kind!r} (use 'memory', 'sqlite' or 'shared')")
+    return ResponseCache(
+        backend,
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        key_mode=os.getenv("RESPONSE_CACHE_KEY", "exact"),
+    )
@@ -0,0 +1,326 @@
+"""
+Local retrieval index over the docs corpus for agent grounding
+BM25 inverted index persisted memory-mapped on disk, optional NumPy embedding similarity
+
+Usage:
+  python retrieval.py --build            # incremental (re)build
+  python retrieval.py "context caching"  # query from the command line
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+INDEX_DIR = ROOT_DIR / ".docs_index"
+CORPUS_DIRS = [ROOT_DIR / "docs" / name for name in ("gemini_core", "pydantic_core", "fastapi_core")]
+CORPUS_DIRS.append(ROOT_DIR / "docs_scraped")  # scrape_docs.py output, picked up when present
+SITEMAP_DIR = ROOT_DIR / "docs" / "sitemaps"
+CORPUS_SUFFIXES = (".txt", ".md")
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can for from how if in into is it its of on or that the their then "
+    "there these this to was we were what when which will with you your".split()
+)
+CHUNK_CHARS = 1200
+STREAM_PREFIX = "stream:"
+BM25_K1, BM25_B = 1.2, 0.75
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list:
+    """Split on blank lines into ~max_chars chunks, tracking the nearest markdown heading"""
+    chunks, buffer, heading = [], [], ""
+    size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if paragraph.startswith("#"):
+            if buffer:
+                chunks.append((heading, "\n\n".join(buffer)))
+                buffer, size = [], 0
+            heading = paragraph.splitlines()[0].lstrip("#").strip(" ¶")
+        if buffer and size + len(paragraph) > max_chars:
+            chunks.append((heading, "\n\n".join(buffer)))
+            buffer, size = [], 0
+        buffer.append(paragraph)
+        size += len(paragraph)
+    if buffer:
+        chunks.append((heading, "\n\n".join(buffer)))
+    return chunks
+
+
+def load_sitemap_metadata() -> dict:
+    """filename -> sitemap entry (url, description, keywords, topics)"""
+    entries = {}
+    for path in SITEMAP_DIR.glob("*.json"):
+        for entry in json.loads(path.read_text(encoding="utf-8")).get("entries", []):
+            entries[entry["filename"]] = entry
+    return entries
+
+
+def corpus_files(corpus_dirs=CORPUS_DIRS) -> list:
+    return sorted(p for d in corpus_dirs if d.is_dir() for p in d.iterdir() if p.suffix in CORPUS_SUFFIXES)
+
+
+def _signature(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class HashingEmbedder:
+    """Offline feature-hashing embedder; swap in any object with embed(texts) -> 2D array"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                vectors[row, int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "little") % self.dim] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+def _write(path: Path, data: bytes):
+    """Write via a temp file so readers never see a half-written index"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def index_is_stale(index_dir: Path = INDEX_DIR, corpus_dirs=CORPUS_DIRS) -> bool:
+    """Cheap stat-only check against the signatures recorded at build time"""
+    build_path = index_dir / "build.json"
+    if not (build_path.exists() and (index_dir / "meta.json").exists()):
+        return True
+    recorded = {
+        f: info["sig"] for f, info in json.loads(build_path.read_text()).items()
+        if not f.startswith(STREAM_PREFIX)
+    }
+    current = {str(p.relative_to(ROOT_DIR)): _signature(p) for p in corpus_files(corpus_dirs)}
+    return recorded != current
+
+
+def build_index(index_dir: Path = INDEX_DIR, corpus_dirs=CORPUS_DIRS, embedder=None) -> dict:
+    """Incrementally (re)build: only files whose content hash changed are re-chunked"""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    build_path = index_dir / "build.json"
+    previous = json.loads(build_path.read_text()) if build_path.exists() else {}
+    sitemap = load_sitemap_metadata()
+
+    files, rebuilt = {}, 0
+    for path in corpus_files(corpus_dirs):
+        name = str(path.relative_to(ROOT_DIR))
+        sig = _signature(path)
+        old = previous.get(name)
+        if old and old["sig"] == sig:
+            files[name] = old
+            continue
+        text = path.read_text(encoding="utf-8", errors="replace")
+        sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if old and old["sha"] == sha:
+            files[name] = {**old, "sig": sig}
+            continue
+
+        rebuilt += 1
+        meta = sitemap.get(path.name, {})
+        # Sitemap keywords/topics are indexed with every chunk of the file to boost recall
+        boost = " ".join([meta.get("description", "")] + meta.get("keywords", []) + meta.get("topics", []))
+        chunks = make_chunks(chunk_text(text), path.stem, boost)
+        files[name] = {"sig": sig, "sha": sha, "url": meta.get("url", ""), "chunks": chunks}
+
+    # Entries streamed in by tools/pipeline.py have no backing file and are kept as-is
+    files.update({name: info for name, info in previous.items() if name.startswith(STREAM_PREFIX)})
+    return write_index(files, index_dir, embedder, rebuilt)
+
+
+def make_chunks(chunks, default_title: str, boost: str = "") -> list:
+    """Index records (title, text, term frequencies, length) for (heading, body) chunks"""
+    records = []
+    for heading, body in chunks:
+        tokens = tokenize(f"{heading} {body} {boost}")
+        tf = {}
+        for token in tokens:
+            tf[token] = tf.get(token, 0) + 1
+        records.append({"title": heading or default_title, "text": body, "tf": tf, "len": len(tokens)})
+    return records
+
+
+def add_streamed_pages(pages, index_dir: Path = INDEX_DIR, embedder=None) -> dict:
+    """Merge {url: (sha, chunk records)} produced without intermediate files, then rewrite the index"""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    build_path = index_dir / "build.json"
+    files = json.loads(build_path.read_text()) if build_path.exists() else {}
+    for url, (sha, chunks) in pages.items():
+        files[STREAM_PREFIX + url] = {"sig": "", "sha": sha, "url": url, "chunks": chunks}
+    return write_index(files, index_dir, embedder, len(pages))
+
+
+def write_index(files: dict, index_dir: Path = INDEX_DIR, embedder=None, rebuilt: int = 0) -> dict:
+    """Write postings, texts, optional vectors and metadata from per-file chunk records"""
+    build_path = index_dir / "build.json"
+    # Postings are rebuilt from cached term frequencies, which is cheap even for the full corpus
+    texts, chunk_meta, doc_lens, postings = bytearray(), [], [], {}
+    for name, info in files.items():
+        for chunk in info["chunks"]:
+            chunk_id = len(chunk_meta)
+            encoded = chunk["text"].encode("utf-8")
+            chunk_meta.append([name, chunk["title"], info["url"], len(texts), len(encoded)])
+            texts += encoded
+            doc_lens.append(chunk["len"])
+            for term, count in chunk["tf"].items():
+                postings.setdefault(term, []).append((chunk_id, count))
+
+    flat, terms = array("I"), {}
+    for term, plist in postings.items():
+        terms[term] = [len(flat) // 2, len(plist)]
+        for chunk_id, count in plist:
+            flat.extend((chunk_id, count))
+
+    _write(index_dir / "postings.bin", flat.tobytes())
+    _write(index_dir / "texts.bin", bytes(texts))
+    if embedder is not None:
+        import numpy as np
+        vectors = embedder.embed([f"{m[1]} {texts[m[3]:m[3] + m[4]].decode('utf-8')}" for m in chunk_meta])
+        with open(index_dir / "vectors.npy.tmp", "wb") as f:
+            np.save(f, vectors.astype(np.float32))
+        os.replace(index_dir / "vectors.npy.tmp", index_dir / "vectors.npy")
+    _write(index_dir / "meta.json", json.dumps({
+        "chunks": chunk_meta, "doc_lens": doc_lens, "terms": terms
+    }).encode("utf-8"))
+    _write(build_path, json.dumps(files).encode("utf-8"))
+    return {"files": len(files), "rebuilt": rebuilt, "chunks": len(chunk_meta), "terms": len(terms)}
+
+
+class DocsIndex:
+    """Read side: postings and chunk texts are memory-mapped, scoring is BM25 (+ optional cosine)"""
+
+    def __init__(self, index_dir: Path = INDEX_DIR, embedder=None, vector_weight: float = 0.3):
+        meta = json.loads((index_dir / "meta.json").read_text())
+        self.chunks, self.terms = meta["chunks"], meta["terms"]
+        doc_lens = meta["doc_lens"]
+        avgdl = sum(doc_lens) / len(doc_lens) if doc_lens else 1
+        # Per-chunk BM25 length normalisation, precomputed once
+        self._norms = [BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl) for dl in doc_lens]
+        self._postings = self._map(index_dir / "postings.bin", "I")
+        self._texts = self._map(index_dir / "texts.bin", None)
+
+        self.embedder, self.vector_weight, self.vectors = embedder, vector_weight, None
+        if embedder is not None and (index_dir / "vectors.npy").exists():
+            import numpy as np
+            self.vectors = np.load(index_dir / "vectors.npy", mmap_mode="r")
+
+    @staticmethod
+    def _map(path: Path, fmt):
+        if path.stat().st_size == 0:
+            return memoryview(b"").cast(fmt) if fmt else memoryview(b"")
+        with open(path, "rb") as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return view.cast(fmt) if fmt else view
+
+    def _bm25(self, query: str) -> dict:
+        scores, total = {}, len(self.chunks)
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            view = self._postings[start * 2:(start + df) * 2]
+            for i in range(0, len(view), 2):
+                chunk_id, tf = view[i], view[i + 1]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + self._norms[chunk_id])
+        return scores
+
+    def search(self, query: str, k: int = 5) -> list:
+        scores = self._bm25(query)
+        if self.vectors is not None:
+            import numpy as np
+            dense = np.zeros(len(self.chunks), dtype=np.float32)
+            if scores:
+                ids = np.fromiter(scores.keys(), dtype=np.int64)
+                dense[ids] = np.fromiter(scores.values(), dtype=np.float32)
+                dense /= dense.max()
+            combined = (1 - self.vector_weight) * dense + self.vector_weight * (self.vectors @ self.embedder.embed([query])[0])
+            top = np.argpartition(-combined, min(k, len(combined) - 1))[:k]
+            ranked = sorted(((int(i), float(combined[i])) for i in top), key=lambda item: -item[1])
+        else:
+            ranked = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        results = []
+        for chunk_id, score in ranked:
+            name, title, url, offset, length = self.chunks[chunk_id]
+            results.append({
+                "score": round(score, 4), "file": name, "title": title, "url": url,
+                "text": bytes(self._texts[offset:offset + length]).decode("utf-8"),
+            })
+        return results
+
+
+_index = None
+_index_sig = None   # meta.json signature of the loaded index
+_checked_at = 0.0
+_index_lock = threading.Lock()  # tool calls run in worker threads
+
+
+def get_index():
+    """Process-wide index (None if empty); at most every DOCS_INDEX_CHECK_S seconds it is rebuilt
+    incrementally if the corpus changed, and reloaded if another process rewrote it on disk"""
+    global _index, _index_sig, _checked_at
+    with _index_lock:
+        now = time.monotonic()
+        if _index is None or now - _checked_at >= float(os.getenv("DOCS_INDEX_CHECK_S", "30")):
+            _checked_at = now
+            embedder = HashingEmbedder() if os.getenv("DOCS_INDEX_VECTORS") == "1" else None
+            if index_is_stale():
+                print(f"Docs index: {build_index(embedder=embedder)}")
+            sig = _signature(INDEX_DIR / "meta.json")
+            if _index is None or sig != _index_sig:
+                _index, _index_sig = DocsIndex(embedder=embedder), sig
+        index = _index
+    return index if index.chunks else None
+
+
+def search_docs(query: str) -> str:
+    """Search the local Gemini, Pydantic and FastAPI documentation. Returns the most relevant excerpts with their sources."""
+    index = get_index()
+    if index is None:
+        return "No documentation index available."
+    results = index.search(query, k=4)
+    if not results:
+        return "No matching documentation found."
+    return "\n\n---\n\n".join(
+        f"[{r['title']}] ({r['url'] or r['file']})\n{r['text']}" for r in results
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--build":
+        embedder = HashingEmbedder() if os.getenv("DOCS_INDEX_VECTORS") == "1" else None
+        print(build_index(embedder=embedder))
+    elif len(sys.argv) > 1:
+        index = get_index()
+        started = time.perf_counter()
+        results = index.search(" ".join(sys.argv[1:]))
+        elapsed = (time.perf_counter() - started) * 1000
+        for r in results:
+            print(f"{r['score']:8.3f}  {r['file']} :: {r['title']}")
+        print(f"\n{len(results)} results in {elapsed:.3f} ms")
+    else:
+        print(__doc__)
@@ -0,0 +1,125 @@
+"""
+Operational HTTP routes: component stats, session transcripts and the batch job API
+Kept out of hello_world.py, which only wires the components together
+"""
+
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+
+def create_stats_router(agent_pool, response_cache=None, scheduler=None, router=None, context_cache=None,
+                        conversation_store=None, shared_state=None) -> APIRouter:
+    """GET /*/stats for each component; disabled (None) components answer {"enabled": false}"""
+    api = APIRouter()
+
+    @api.get("/agents/stats")
+    async def agent_pool_stats():
+        """Agent pool hit/miss/eviction counters"""
+        return agent_pool.stats()
+
+    @api.get("/cache/stats")
+    async def response_cache_stats():
+        """Response cache hit rate and bytes saved"""
+        return response_cache.stats() if response_cache else {"enabled": False}
+
+    @api.get("/scheduler/stats")
+    async def scheduler_stats():
+        """Per-model active/queued provider calls and remaining token budget"""
+        return scheduler.stats() if scheduler else {"enabled": False}
+
+    @api.get("/models/stats")
+    async def model_stats():
+        """Rolling error rate, median TTFT and health per routed model"""
+        return router.stats() if router else {"enabled": False}
+
+    @api.get("/context-cache/stats")
+    async def context_cache_stats():
+        """Provider-side cached content handles, hits and cached token count"""
+        return context_cache.stats() if context_cache else {"enabled": False}
+
+    @api.get("/store/stats")
+    async def conversation_store_stats():
+        """Hot sessions and write-behind queue counters"""
+        return conversation_store.stats() if conversation_store else {"enabled": False}
+
+    @api.get("/shared/stats")
+    async def shared_state_stats():
+        """Which shared state backend this worker uses"""
+        return {
+            "backend": type(shared_state).__name__,
+            "cross_process": shared_state.cross_process,
+            "worker_pid": os.getpid(),
+        }
+
+    return api
+
+
+def create_session_router(conversation_store=None) -> APIRouter:
+    """GET /session/transcript for the caller's own session; there is deliberately no listing of sessions
+
+    The session id is a bearer secret (see handle_websocket_stream): it goes in an
+    `Authorization: Bearer <session_id>` header, not the URL, so access logs don't capture it.
+    """
+    api = APIRouter()
+    bearer = HTTPBearer(auto_error=False)
+
+    @api.get("/session/transcript")
+    async def session_transcript(stream_id: str = None, limit: int = Query(500, ge=1, le=5000),
+                                 credentials: HTTPAuthorizationCredentials = Depends(bearer)):
+        """Stored transcript of the session the bearer id names, oldest turn first"""
+        if credentials is None:
+            raise HTTPException(status_code=401, detail="Session id required as a bearer token",
+                                headers={"WWW-Authenticate": "Bearer"})
+        session_id = credentials.credentials
+        if conversation_store is None or not await conversation_store.turn_count(session_id):
+            raise HTTPException(status_code=404, detail="Unknown session")
+        return await conversation_store.transcript(session_id, stream_id, limit)
+
+    return api
+
+
+def create_batch_router(batch_jobs) -> APIRouter:
+    """/batch job API over a BatchJobs registry (see batch.py)"""
+    api = APIRouter(prefix="/batch")
+
+    def known(job_id: str) -> str:
+        if not batch_jobs.exists(job_id):
+            raise HTTPException(status_code=404, detail="Unknown batch job")
+        return job_id
+
+    @api.post("", status_code=202)
+    async def start_batch(request: Request, concurrency: int = 4):
+        """Start a batch job from a JSONL body, one prompt/debate message (plus optional "id") per line"""
+        return await batch_jobs.start(await request.body(), concurrency)
+
+    @api.get("")
+    async def list_batches():
+        """Batch jobs run by this process"""
+        return batch_jobs.list()
+
+    @api.get("/{job_id}")
+    async def batch_status(job_id: str):
+        """Progress, throughput and token usage of a batch job"""
+        return batch_jobs.status(known(job_id))
+
+    @api.get("/{job_id}/results")
+    async def batch_results(job_id: str):
+        """Results JSONL so far (one line per finished item)"""
+        path = batch_jobs.results_path(known(job_id))
+        if not path.exists():
+            return PlainTextResponse("", media_type="application/x-ndjson")
+        return FileResponse(path, media_type="application/x-ndjson")
+
+    @api.post("/{job_id}/resume", status_code=202)
+    async def resume_batch(job_id: str, concurrency: int = 4):
+        """Run a stopped, cancelled or failed job again, skipping items that already succeeded"""
+        return await batch_jobs.resume(known(job_id), concurrency)
+
+    @api.delete("/{job_id}")
+    async def cancel_batch(job_id: str):
+        """Stop a running job; finished items stay in its results"""
+        return batch_jobs.cancel(known(job_id))
+
+    return api
@@ -0,0 +1,169 @@
+"""
+Model routing with live health tracking
+Rolling TTFT/error stats per model, an `auto` model that picks the fastest healthy model of a
+quality tier, ordered fallbacks tried when a model fails before its first token, and the
+first-token race behind hedged requests
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+AUTO_MODEL = "auto"
+DEFAULT_CHAIN = "gemini-2.5-pro,gemini-2.5-flash,gemini-2.5-flash-lite"
+QUALITY_TIERS = {"high": 3, "standard": 2, "fast": 1}
+
+
+@dataclass
+class ModelHealth:
+    """Last `window` outcomes of one model"""
+    window: int = 20
+    ttfts: deque = None
+    outcomes: deque = None
+    consecutive_failures: int = 0
+    last_failure_at: float = 0.0
+
+    def __post_init__(self):
+        self.ttfts = deque(maxlen=self.window)
+        self.outcomes = deque(maxlen=self.window)
+
+    def record(self, ok: bool, ttft: float = None):
+        self.outcomes.append(ok)
+        if ok:
+            self.consecutive_failures = 0
+            if ttft is not None:
+                self.ttfts.append(ttft)
+        else:
+            self.consecutive_failures += 1
+            self.last_failure_at = time.monotonic()
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def p50_ttft(self) -> float:
+        """Median TTFT; 0 for unmeasured models so they get explored first"""
+        return sorted(self.ttfts)[len(self.ttfts) // 2] if self.ttfts else 0.0
+
+    def ttft_percentile(self, pct: float) -> float:
+        values = sorted(self.ttfts)
+        return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+    def healthy(self, cooldown: float) -> bool:
+        # Tripped models get retried once the cooldown passes (half-open)
+        if self.consecutive_failures >= 3 and time.monotonic() - self.last_failure_at < cooldown:
+            return False
+        return len(self.outcomes) < 4 or self.error_rate < 0.5
+
+
+@dataclass
+class ModelRouter:
+    """Orders candidate models for a request; stream_agent reports back how each one did"""
+    chain: list                                    # best quality first, also the fallback order
+    first_token_timeout: float = None              # seconds, while a fallback remains; None waits forever
+    cooldown: float = 30.0
+    health: dict = field(default_factory=dict)
+
+    def tier(self, model: str) -> int:
+        """Quality tier from chain position: the last model is tier 1"""
+        return len(self.chain) - self.chain.index(model) if model in self.chain else 0
+
+    def _health(self, model: str) -> ModelHealth:
+        return self.health.setdefault(model, ModelHealth())
+
+    def route(self, model: str, quality: str = "standard") -> list:
+        """Models to try in order: the requested one (or the auto pick), then its fallbacks"""
+        if model == AUTO_MODEL:
+            min_tier = QUALITY_TIERS.get(quality, QUALITY_TIERS["standard"])
+            candidates = sorted(
+                (m for m in self.chain if self.tier(m) >= min_tier),
+                # Coarse error-rate buckets first, so a flaky model loses to a slower reliable one
+                key=lambda m: (round(self._health(m).error_rate, 1), self._health(m).p50_ttft)
+            )
+            candidates += [m for m in self.chain if self.tier(m) < min_tier]  # degrade rather than fail
+        elif model in self.chain:
+            index = self.chain.index(model)
+            candidates = self.chain[index:]
+        else:
+            return [model]
+        # Skip past unhealthy models, but keep them as a last resort
+        healthy = [m for m in candidates if self._health(m).healthy(self.cooldown)]
+        return healthy + [m for m in candidates if m not in healthy]
+
+    def hedge_delay(self, model: str, pct: float, default: float) -> float:
+        """When to hedge: the model's recent TTFT percentile, or default until enough samples exist"""
+        health = self._health(model)
+        return health.ttft_percentile(pct) if len(health.ttfts) >= 5 else default
+
+    def record(self, model: str, ok: bool, ttft: float = None):
+        self._health(model).record(ok, ttft)
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "tier": self.tier(model),
+                "healthy": health.healthy(self.cooldown),
+                "error_rate": round(health.error_rate, 3),
+                "p50_ttft_ms": round(health.p50_ttft * 1000, 1),
+                "samples": len(health.outcomes),
+            }
+            for model, health in self.health.items()
+        }
+
+
+async def race_first_token(primary, hedge, delay: float, on_win=None) -> str:
+    """Run primary(claim), and hedge(claim) as well if nobody has claimed within `delay` seconds
+
+    A contestant calls its claim() on its first token: it wins, the other one is cancelled and
+    on_win(role) is called. Returns the role ("primary"/"hedge") that finished; raises the winner's
+    error, or the last error once every contestant has failed.
+    """
+    contestants = {}  # task -> role
+    winner = None
+
+    def claimer(role: str):
+        def claim():
+            nonlocal winner
+            winner = role
+            for task, other in contestants.items():
+                if other != role:
+                    task.cancel()  # stop paying for the other request
+            if on_win:
+                on_win(role)
+        return claim
+
+    contestants[asyncio.create_task(primary(claimer("primary")))] = "primary"
+    try:
+        done, _ = await asyncio.wait(contestants, timeout=delay)
+        if not done and winner is None:
+            contestants[asyncio.create_task(hedge(claimer("hedge")))] = "hedge"
+        error = None
+        while contestants:
+            done, _ = await asyncio.wait(contestants, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                role = contestants.pop(task)
+                if task.cancelled():
+                    continue  # lost the race
+                if task.exception() is None:
+                    return role
+                error = task.exception()
+                if winner:
+                    raise error  # the winner failed mid-stream
+        raise error
+    finally:
+        for task in contestants:
+            task.cancel()
+        await asyncio.gather(*contestants, return_exceptions=True)
+
+
+def create_router():
+    """ModelRouter from MODEL_FALLBACKS / FIRST_TOKEN_TIMEOUT (None when MODEL_ROUTING=0)"""
+    if os.getenv("MODEL_ROUTING", "1") != "1":
+        return None
+    chain = [m.strip() for m in os.getenv("MODEL_FALLBACKS", DEFAULT_CHAIN).split(",") if m.strip()]
+    timeout = float(os.getenv("FIRST_TOKEN_TIMEOUT", "20"))
+    return ModelRouter(chain, first_token_timeout=timeout or None,
+                       cooldown=float(os.getenv("MODEL_COOLDOWN", "30")))
@@ -0,0 +1,258 @@
+"""
+Process-wide provider scheduler
+Per-model concurrency limits and token-per-minute budgets, weighted-fair queuing across
+connections, and jittered retries when the provider still answers 429. With a cross-process
+shared state backend the TPM budget and 429 backoffs also hold across workers.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from pydantic_ai.exceptions import ModelHTTPError
+from memory import estimate_message_tokens, estimate_tokens
+from metrics import RATE_LIMIT_RETRIES, SCHEDULER_WAIT
+
+
+def parse_limits(spec: str, default: int) -> dict:
+    """'8,gemini-2.5-pro=2' -> {'*': 8, 'gemini-2.5-pro': 2}"""
+    limits = {"*": default}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        model, sep, value = part.rpartition("=")
+        limits[model if sep else "*"] = int(value)
+    return limits
+
+
+def estimate_turn_tokens(prompt: str, message_history=None, model_settings=None) -> int:
+    """Budget reservation for one turn: prompt + history + the max_tokens ceiling"""
+    history = estimate_message_tokens(message_history) if message_history else 0
+    max_tokens = (model_settings or {}).get("max_tokens") or 1024
+    return estimate_tokens(prompt) + history + max_tokens
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    if isinstance(error, ModelHTTPError):
+        return error.status_code == 429
+    return "RESOURCE_EXHAUSTED" in str(error)
+
+
+@dataclass
+class Slot:
+    """A granted provider slot; the holder reports actual usage before releasing"""
+    model: str
+    cost: int
+    streaming: bool = False  # set on first token: past this point a retry would duplicate output
+    used_tokens: int = 0
+    window: str = None       # shared TPM window key the cost was reserved in
+
+
+@dataclass(order=True)
+class _Waiter:
+    tag: float
+    seq: int
+    cost: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    position: int = field(default=0, compare=False)
+    changed: asyncio.Event = field(default_factory=asyncio.Event, compare=False)
+
+
+class _ModelState:
+    def __init__(self, limit: int, tpm: int):
+        self.limit, self.tpm = limit, tpm
+        self.active = 0
+        self.tokens = float(tpm)
+        self.refilled_at = time.monotonic()
+        self.queue = []            # heap of _Waiter by virtual finish tag
+        self.virtual_time = 0.0
+        self.finish_tags = {}      # client -> last virtual finish tag
+        self.timer = None
+
+    def refill(self):
+        now = time.monotonic()
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + (now - self.refilled_at) * self.tpm / 60)
+        self.refilled_at = now
+
+
+class ProviderScheduler:
+    """Grants provider slots per model in weighted-fair order across clients
+
+    Each waiter gets a virtual finish tag max(virtual_time, client's last tag) + cost / weight,
+    so a connection that floods the queue only pushes its own requests back.
+    """
+
+    def __init__(self, concurrency: dict = None, tpm: dict = None, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 20.0, shared=None):
+        self.concurrency = concurrency or {"*": 8}
+        self.tpm = tpm or {"*": 0}
+        self.max_retries = max_retries
+        self.backoff_base, self.backoff_cap = backoff_base, backoff_cap
+        self.shared = shared  # cross-worker state (see shared_state.py); None keeps limits per process
+        self._models = {}
+        self._seq = itertools.count()
+        self._settling = set()
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            self._models[model] = _ModelState(
+                self.concurrency.get(model, self.concurrency.get("*", 8)),
+                self.tpm.get(model, self.tpm.get("*", 0)),
+            )
+        return self._models[model]
+
+    async def acquire(self, model: str, client: str = "default", cost: int = 1, weight: float = 1.0,
+                      on_queued=None) -> Slot:
+        """Wait for a slot; on_queued(position) is awaited whenever the queue position changes"""
+        state = self._state(model)
+        cost = min(cost, state.tpm) if state.tpm else cost  # an oversized turn must still fit eventually
+        tag = max(state.virtual_time, state.finish_tags.get(client, 0.0)) + cost / max(weight, 1e-6)
+        state.finish_tags[client] = tag
+        waiter = _Waiter(tag, next(self._seq), cost, asyncio.get_running_loop().create_future())
+        heapq.heappush(state.queue, waiter)
+        queued_at = time.monotonic()
+        self._dispatch(state)
+
+        reported = 0
+        try:
+            while not waiter.future.done():
+                if on_queued and waiter.position != reported:
+                    reported = waiter.position
+                    await on_queued(reported)
+                    continue
+                waiter.changed.clear()
+                changed = asyncio.ensure_future(waiter.changed.wait())
+                try:
+                    await asyncio.wait({waiter.future, changed}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(Slot(model, cost))  # granted just as we were cancelled
+            else:
+                waiter.future.cancel()
+                self._dispatch(state)
+            raise
+        slot = Slot(model, cost)
+        if self.shared is not None:
+            try:
+                await self._reserve_shared(slot, state)
+            except BaseException:
+                self.release(slot)
+                raise
+        SCHEDULER_WAIT.observe(time.monotonic() - queued_at, model=model)
+        return slot
+
+    async def _reserve_shared(self, slot: Slot, state: _ModelState):
+        """Cluster-wide gate: wait out a 429 backoff any worker announced, then fit the shared minute window"""
+        while True:
+            until = await self.shared.get(f"scheduler:backoff:{slot.model}")
+            if until and float(until) > time.time():
+                await asyncio.sleep(float(until) - time.time())
+                continue
+            if not state.tpm:
+                return
+            window = f"scheduler:tpm:{slot.model}:{int(time.time() // 60)}"
+            used = await self.shared.incrby(window, slot.cost)
+            if used == slot.cost:
+                await self.shared.expire(window, 120)
+            if used <= state.tpm:
+                slot.window = window
+                return
+            await self.shared.incrby(window, -slot.cost)  # doesn't fit: give it back, try the next minute
+            await asyncio.sleep(60 - time.time() % 60)
+
+    def release(self, slot: Slot):
+        state = self._state(slot.model)
+        state.active -= 1
+        if state.tpm and slot.used_tokens:
+            state.refill()
+            state.tokens = min(state.tpm, state.tokens + slot.cost - slot.used_tokens)  # settle the estimate
+            if slot.window:
+                task = asyncio.create_task(self.shared.incrby(slot.window, slot.used_tokens - slot.cost))
+                self._settling.add(task)
+                task.add_done_callback(self._settling.discard)
+        self._dispatch(state)
+
+    def _dispatch(self, state: _ModelState):
+        state.refill()
+        while state.queue and state.active < state.limit:
+            waiter = state.queue[0]
+            if waiter.future.done():
+                heapq.heappop(state.queue)  # cancelled while waiting
+                continue
+            if state.tpm and state.tokens < waiter.cost:
+                if state.timer is None:
+                    delay = (waiter.cost - state.tokens) * 60 / state.tpm
+                    state.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, state)
+                break
+            heapq.heappop(state.queue)
+            state.active += 1
+            state.tokens -= waiter.cost
+            state.virtual_time = waiter.tag
+            waiter.future.set_result(None)
+
+        for position, waiter in enumerate(sorted(w for w in state.queue if not w.future.done()), 1):
+            if waiter.position != position:
+                waiter.position = position
+                waiter.changed.set()
+        if len(state.finish_tags) > 1024:
+            state.finish_tags = {c: t for c, t in state.finish_tags.items() if t > state.virtual_time}
+
+    def _on_timer(self, state: _ModelState):
+        state.timer = None
+        self._dispatch(state)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def run(self, model: str, attempt, client: str = "default", cost: int = 1, weight: float = 1.0,
+                  on_queued=None, on_retry=None):
+        """await attempt(slot) inside a slot, retrying rate-limit errors raised before the first token"""
+        for retry in itertools.count():
+            slot = await self.acquire(model, client, cost, weight, on_queued)
+            try:
+                return await attempt(slot)
+            except Exception as e:
+                if slot.streaming or retry >= self.max_retries or not is_rate_limited(e):
+                    raise
+                state = self._state(model)
+                if state.tpm:
+                    state.tokens = min(state.tokens, 0)  # the provider says we're over budget: everyone waits
+                delay = self.backoff(retry)
+                RATE_LIMIT_RETRIES.inc(model=model)
+                if self.shared is not None:
+                    # ...including the other workers
+                    await self.shared.set(f"scheduler:backoff:{model}", time.time() + delay, ex=delay + 1)
+            finally:
+                self.release(slot)
+            if on_retry:
+                await on_retry(retry + 1, delay)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "active": state.active,
+                "limit": state.limit,
+                "queued": sum(1 for w in state.queue if not w.future.done()),
+                "tpm": state.tpm,
+                "tokens_available": int(state.tokens) if state.tpm else None,
+            }
+            for model, state in self._models.items()
+        }
+
+
+def create_scheduler(shared=None):
+    """ProviderScheduler from MODEL_CONCURRENCY / MODEL_TPM / RATE_LIMIT_RETRIES (None when disabled)"""
+    if os.getenv("PROVIDER_SCHEDULER", "1") != "1":
+        return None
+    return ProviderScheduler(
+        concurrency=parse_limits(os.getenv("MODEL_CONCURRENCY", ""), 8),
+        tpm=parse_limits(os.getenv("MODEL_TPM", ""), 0),
+        max_retries=int(os.getenv("RATE_LIMIT_RETRIES", "3")),
+        shared=shared if shared is not None and shared.cross_process else None,
+    )
@@ -0,0 +1,113 @@
+"""
+Typed WebSocket messages
+Ingress messages are validated straight from the received bytes by one prebuilt TypeAdapter,
+so bad configs are rejected before any agent or provider call; outbound frames are serialized
+by pydantic-core instead of json.dumps.
+"""
+
+from typing import Annotated, Literal, Optional, Union
+from typing_extensions import TypedDict
+from pydantic import BaseModel, ConfigDict, Discriminator, Field, Tag, TypeAdapter, ValidationError
+
+
+class RequestConfig(BaseModel):
+    """The `config` block of prompt/debate messages"""
+    model_config = ConfigDict(extra="ignore")  # unknown UI settings are harmless
+
+    model: str = Field("gemini-2.5-flash", min_length=1, max_length=200)
+    temperature: float = Field(0.7, ge=0, le=2)
+    top_p: float = Field(0.9, ge=0, le=1)
+    top_k: int = Field(40, ge=1)
+    max_tokens: int = Field(1024, ge=1, le=65536)
+    system_prompt: str = ""
+    quality: Literal["high", "standard", "fast"] = "standard"
+    timing: bool = False
+    hedge: Optional[bool] = None         # None: HEDGE_PROMPTS decides
+    hedge_model: Optional[str] = None
+    flush_ms: float = Field(0, ge=0)
+    flush_bytes: int = Field(0, ge=0)
+    debate_style: Literal["classic", "panel"] = "classic"
+    debate_agents: int = 3               # clamped by build_debate_plan
+    debate_rounds: int = 2
+
+
+class _Message(BaseModel):
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+
+class PromptMessage(_Message):
+    type: Literal["prompt"] = "prompt"
+    content: str = ""
+    stream_id: str = "default"
+    config: RequestConfig = Field(default_factory=RequestConfig)
+
+
+class DebateMessage(PromptMessage):
+    type: Literal["debate"] = "debate"
+
+
+class ControlMessage(_Message):
+    """cancel/reset; without a stream_id they apply to every stream on the connection"""
+    type: Literal["cancel", "reset"]
+    stream_id: Optional[str] = None
+
+
+def _message_type(value) -> str:
+    if isinstance(value, dict):
+        message_type = value.get("type", "prompt")
+    else:
+        message_type = getattr(value, "type", "prompt")
+    return "control" if message_type in ("cancel", "reset") else message_type
+
+
+IngressMessage = Annotated[
+    Union[
+        Annotated[PromptMessage, Tag("prompt")],
+        Annotated[DebateMessage, Tag("debate")],
+        Annotated[ControlMessage, Tag("control")],
+    ],
+    Discriminator(
+        _message_type, custom_error_type="message_type",
+        custom_error_message="type must be one of prompt, debate, cancel, reset",
+    ),
+]
+
+# Built once at import: validators are compiled when the adapter is created
+INGRESS = TypeAdapter(IngressMessage)
+
+
+def describe_error(error: ValidationError) -> str:
+    """'config.temperature: Input should be less than or equal to 2' (union tag dropped)"""
+    problems = []
+    for e in error.errors(include_url=False):
+        loc = [str(part) for part in e["loc"]]
+        if loc and loc[0] in ("prompt", "debate", "control"):
+            loc = loc[1:]
+        problems.append(f"{'.'.join(loc)}: {e['msg']}" if loc else e["msg"])
+    return "; ".join(problems)
+
+
+class Frame(TypedDict, total=False):
+    """Server -> client frame; `type` plus whichever fields that frame type carries"""
+    __pydantic_config__ = ConfigDict(extra="allow")  # e.g. timing frames carry their own metrics
+
+    type: str
+    stream_id: str
+    agent: str
+    content: str
+    position: int           # queued
+    attempt: int            # retrying
+    delay_ms: int
+    model: str              # fallback, timing
+    to: str
+    reason: str
+    session_id: str         # session
+    resumed: bool
+    turns: int
+
+
+FRAME = TypeAdapter(Frame)
+
+
+def dump_frame(frame: dict) -> str:
+    return FRAME.dump_json(frame).decode("utf-8")
@@ -0,0 +1,159 @@
+"""
+Shared state for multi-worker deployments
+A small Redis command subset (get/set/delete/incrby/expire) over three interchangeable backends:
+per-process memory (the single-worker default), a SQLite file shared by every worker on one
+host, and Redis for several hosts. Response cache entries, cluster-wide rate-limit windows and
+session versions go through it.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+
+class LocalBackend:
+    """In-process dict with per-key expiry; every worker gets its own copy"""
+    cross_process = False
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._data = {}  # key -> (value, expires_at or None)
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] < time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key: str):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: str, ex: float = None):
+        self._data.pop(key, None)  # re-insert at the end
+        self._data[key] = (str(value), time.time() + ex if ex else None)
+        while len(self._data) > self.max_entries:
+            del self._data[next(iter(self._data))]  # dicts keep insertion order: oldest first
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        entry = self._live(key)
+        value = int(entry[0]) + amount if entry else amount
+        self._data[key] = (str(value), entry[1] if entry else None)
+        return value
+
+    async def expire(self, key: str, seconds: float):
+        entry = self._live(key)
+        if entry:
+            self._data[key] = (entry[0], time.time() + seconds)
+
+    def __len__(self):
+        return len(self._data)
+
+    async def close(self):
+        pass
+
+
+class SQLiteSharedBackend:
+    """Key/value table in a WAL-mode SQLite file; every worker process on the host opens the same file"""
+    cross_process = True
+
+    def __init__(self, path: str = "shared_state.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+
+    def _run(self, key: str, sql: str, params: tuple):
+        with self._lock, self._db:
+            # Expire lazily, like Redis does on access
+            self._db.execute("DELETE FROM kv WHERE key = ? AND expires_at < ?", (key, time.time()))
+            row = self._db.execute(sql, params).fetchone()
+            return row[0] if row else None
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._run, key, "SELECT value FROM kv WHERE key = ?", (key,))
+
+    async def set(self, key: str, value: str, ex: float = None):
+        await asyncio.to_thread(
+            self._run, key, "INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+            (key, str(value), time.time() + ex if ex else None)
+        )
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._run, key, "DELETE FROM kv WHERE key = ?", (key,))
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        # One statement, so concurrent workers can't lose an increment
+        value = await asyncio.to_thread(
+            self._run, key,
+            "INSERT INTO kv VALUES (?, ?, NULL) ON CONFLICT (key) "
+            "DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value RETURNING value",
+            (key, amount)
+        )
+        return int(value)
+
+    async def expire(self, key: str, seconds: float):
+        await asyncio.to_thread(
+            self._run, key, "UPDATE kv SET expires_at = ? WHERE key = ?", (time.time() + seconds, key)
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    async def close(self):
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+
+class RedisBackend:
+    """Redis (or anything speaking its protocol); `client` takes any redis.asyncio-compatible client"""
+    cross_process = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis  # optional: pip install redis
+            except ImportError:
+                raise RuntimeError("SHARED_STATE=redis://... requires the redis package (pip install redis)")
+            client = redis.from_url(url, decode_responses=True)
+        self.client = client
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ex: float = None):
+        await self.client.set(key, value, px=int(ex * 1000) if ex else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        return int(await self.client.incrby(key, amount))
+
+    async def expire(self, key: str, seconds: float):
+        await self.client.pexpire(key, int(seconds * 1000))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_shared_state():
+    """Backend from SHARED_STATE: "local" (default), "sqlite[:path]" or a redis:// / rediss:// URL"""
+    spec = os.getenv("SHARED_STATE", "local").strip()
+    if spec in ("", "local"):
+        return LocalBackend()
+    if spec == "sqlite" or spec.startswith("sqlite:"):
+        return SQLiteSharedBackend(spec.partition(":")[2] or "shared_state.db")
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    raise ValueError(f"Unknown SHARED_STATE backend: {spec!r} (use 'local', 'sqlite[:path]' or a redis:// URL)")
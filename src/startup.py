@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Cold start: import profile, model pre-warm and readiness
+pydantic-ai imports a provider's SDK (google-genai, openai, ...) only when the first agent for that
+provider is built, and the provider's HTTP client opens its connection on the first call, so a fresh
+worker pays for both on its first request. Readiness.warm() pays for them at startup instead, and
+/ready answers 503 until it is done.
+
+Usage:
+  python startup.py [--module hello_world] [--top 20]   # import-time cost per module and package
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Imported only when a model of that provider is first used; none of them should load at startup
+PROVIDER_SDKS = ("google.genai", "openai", "anthropic", "groq", "mistralai", "cohere", "boto3")
+STARTED = time.perf_counter()  # hello_world imports this module first
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def profile_imports(module: str = "hello_world") -> list:
+    """[(name, self_us, cumulative_us, depth)] from a fresh `python -X importtime -c 'import <module>'`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            rows.append((match[4], int(match[1]), int(match[2]), len(match[3]) // 2))
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed: {result.stderr.strip().splitlines()[-1]}")
+    return rows
+
+
+def by_package(rows: list) -> list:
+    """[(top-level package, self_us, modules)] slowest first"""
+    packages = {}
+    for name, self_us, _, _ in rows:
+        total, count = packages.get(name.split(".")[0], (0, 0))
+        packages[name.split(".")[0]] = (total + self_us, count + 1)
+    return sorted(((name, us, count) for name, (us, count) in packages.items()), key=lambda p: -p[1])
+
+
+class Readiness:
+    """Startup phases and per-model pre-warm results; `ready` once warm() has finished"""
+
+    def __init__(self, models=(), request: bool = True, timeout: float = 20.0):
+        self.models = list(models)
+        self.request = request
+        self.timeout = timeout
+        self.ready = False
+        self.phases = {}   # phase -> seconds
+        self.warmed = {}   # model -> {"agent_ms", "request_ms"} or {"error"}
+        self._last = STARTED
+
+    def mark(self, phase: str):
+        """Record how long the phase that just ended took (since the previous mark or import)"""
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last, 3)
+        self._last = now
+
+    async def warm(self, get_agent, deps=None, ping_agent=None):
+        """Build each configured model's agent, then make a tiny call per model so the provider
+        client holds an open TLS connection; failures are reported but never block readiness
+
+        ping_agent(agent) -> the agent that makes the call (default: the built agent itself)
+        """
+        try:
+            agents = {}
+            for model in self.models:
+                # Sequential on purpose: building the first agent of a provider imports its SDK
+                started = time.perf_counter()
+                try:
+                    agent = get_agent(model)
+                    agents[model] = ping_agent(agent) if ping_agent else agent
+                    self.warmed[model] = {"agent_ms": round((time.perf_counter() - started) * 1000, 1)}
+                except Exception as e:
+                    self.warmed[model] = {"error": f"{type(e).__name__}: {e}"}
+                await asyncio.sleep(0)
+            if self.request:
+                await asyncio.gather(*(self._ping(model, agent, deps) for model, agent in agents.items()))
+            self.mark("prewarm")
+        finally:
+            self.ready = True
+
+    async def _ping(self, model: str, agent, deps):
+        from pydantic_ai.exceptions import UnexpectedModelBehavior
+
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await agent.run("ping", deps=deps, model_settings={"max_tokens": 16, "temperature": 0})
+        except UnexpectedModelBehavior:
+            pass  # e.g. an empty answer: the round trip (and the connection) still happened
+        except Exception as e:
+            self.warmed[model]["error"] = f"{type(e).__name__}: {e}"
+            return
+        self.warmed[model]["request_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "phases": self.phases,
+            "models": self.warmed,
+            "provider_sdks": sorted(name for name in PROVIDER_SDKS if name in sys.modules),
+            "worker_pid": os.getpid(),
+        }
+
+
+def create_readiness() -> Readiness:
+    """Pre-warm settings from PREWARM_* env vars (no models: ready as soon as the app has started)"""
+    return Readiness(
+        models=[m.strip() for m in os.getenv("PREWARM_MODELS", "").split(",") if m.strip()],
+        request=os.getenv("PREWARM_REQUEST", "1") == "1",
+        timeout=float(os.getenv("PREWARM_TIMEOUT", "20")),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time profile of the app')
+    parser.add_argument('--module', default='hello_world', help='Module to import')
+    parser.add_argument('--top', type=int, default=20, help='Rows per table')
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total = next(cumulative for name, _, cumulative, depth in rows if name == args.module and depth == 0)
+    print(f"import {args.module}: {total / 1000:.1f} ms over {len(rows)} modules\n")
+
+    print(f"{'package':<32} {'self ms':>9} {'modules':>8}")
+    for name, self_us, count in by_package(rows)[:args.top]:
+        print(f"{name:<32} {self_us / 1000:>9.1f} {count:>8}")
+
+    print(f"\n{'module':<56} {'self ms':>9} {'cumul. ms':>10}")
+    for name, self_us, cumulative, _ in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{name:<56} {self_us / 1000:>9.1f} {cumulative / 1000:>10.1f}")
+
+    eager = sorted({sdk for sdk in PROVIDER_SDKS for name, *_ in rows if name == sdk or name.startswith(sdk + ".")})
+    print(f"\nProvider SDKs imported at startup: {', '.join(eager) if eager else 'none (loaded on first use)'}")
+
+
+if __name__ == '__main__':
+    main()
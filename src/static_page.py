@@ -0,0 +1,70 @@
+"""
+Precomputed static responses
+Body, strong ETags and gzip/brotli variants are built once; each GET just picks a variant
+"""
+
+import gzip
+import hashlib
+from fastapi import Request, Response
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header: str) -> dict:
+    """Accept-Encoding -> {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class PrecompressedPage:
+    """A fixed document served with ETag revalidation and content negotiation"""
+
+    def __init__(self, body: str, media_type: str = "text/html; charset=utf-8",
+                 cache_control: str = "no-cache"):
+        raw = body.encode("utf-8")
+        tag = hashlib.sha256(raw).hexdigest()[:20]
+        self.media_type = media_type
+        self.cache_control = cache_control  # no-cache = always revalidate, which is a cheap 304
+        # Strong ETags must differ per encoding since the bytes differ
+        self.variants = {"identity": (raw, f'"{tag}"')}
+        self.variants["gzip"] = (gzip.compress(raw, compresslevel=9, mtime=0), f'"{tag}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(raw, quality=11), f'"{tag}-br"')
+        self._etags = {etag for _, etag in self.variants.values()}
+
+    def choose(self, accept_encoding: str) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        for coding in ("br", "gzip"):
+            if coding in self.variants and accepted.get(coding, wildcard) > 0:
+                return coding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        encoding = self.choose(request.headers.get("accept-encoding", ""))
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or self._etags & {t.strip() for t in if_none_match.split(",")}:
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=self.media_type, headers=headers)
+
+    def stats(self) -> dict:
+        return {encoding: len(body) for encoding, (body, _) in self.variants.items()}
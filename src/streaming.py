@@ -4,11 +4,31 @@ Keeps main file under 200 LOC limit per Elon's efficiency algorithm
 """
 
 from fastapi import WebSocket, WebSocketDisconnect
-import json
+import asyncio
+import os
+import secrets
+import time
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.settings import ModelSettings
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import List
+from batching import FlushPolicy, TokenBatcher
+from orchestration import build_debate_plan, run_plan
+from memory import ConversationMemory, SUMMARY_SYSTEM_PROMPT, render_messages
+from response_cache import ResponseCache
+from metrics import FALLBACKS, HEDGE_WINS, HEDGES, TurnTiming
+from connection import Connection
+from scheduler import ProviderScheduler, Slot, estimate_turn_tokens
+from routing import AUTO_MODEL, ModelRouter, race_first_token
+from context_cache import ContextCache
+from conversation_store import ConversationStore
+from protocol import negotiate
+from schemas import INGRESS, ControlMessage, PromptMessage, describe_error
+from pydantic import ValidationError
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+REPLAY_CHUNK_CHARS = 64
 
 
 @dataclass
@@ -16,174 +36,464 @@ class Deps:
     system_prompt: str
 
 
-async def handle_websocket_stream(websocket: WebSocket, create_agent_func):
-    """Multi-model streaming handler - works with any Pydantic AI model"""
-    await websocket.accept()
+@dataclass
+class Hedge:
+    """Second run_stream launched if the first token hasn't arrived after `delay` seconds"""
+    delay: float
+    model: str
+    agent: Agent
+
+
+async def run_hedged(stream_from, candidate: Agent, model: str, slot: Slot, hedge: Hedge, timing: TurnTiming,
+                     ttft_samples: list, scheduler: ProviderScheduler = None, client: str = "default", cost: int = 1):
+    """Race stream_from(candidate) against hedge.agent, launched if no token has arrived after hedge.delay
+
+    The winner's model goes on `timing` and the race's TTFT samples into ttft_samples for the router.
+    cost: the turn's token estimate, reserved again for the hedge since it is a second full request.
+    """
+    launched = {"primary": time.monotonic()}  # role -> when its request went out
+    
+    def on_win(role: str):
+        slot.streaming = True  # the scheduler's slot must not be retried once either contestant streams
+        # The winner gets its own TTFT; a beaten primary was at least this slow.
+        # A beaten hedge is not sampled: its short wait says nothing about its speed.
+        now = time.monotonic()
+        ttft_samples[:] = [(hedge.model if role == "hedge" else model, now - launched[role])]
+        if role == "hedge":
+            ttft_samples.append((model, now - launched["primary"]))
+            timing.model = hedge.model
+            HEDGE_WINS.inc(model=model, hedge_model=hedge.model)
     
-    # Store conversation history per WebSocket connection
-    conversation_history = []
+    async def run_primary(claim):
+        await stream_from(candidate, model, slot, claim)
     
+    async def run_hedge(claim):
+        HEDGES.inc(model=model, hedge_model=hedge.model)
+        hedge_slot = await scheduler.acquire(hedge.model, client, cost) if scheduler else Slot(hedge.model, 0)
+        launched["hedge"] = time.monotonic()
+        try:
+            await stream_from(hedge.agent, hedge.model, hedge_slot, claim)
+        finally:
+            if scheduler:
+                scheduler.release(hedge_slot)
+    
+    await race_first_token(run_primary, run_hedge, hedge.delay, on_win)
+
+
+async def stream_agent(send, agent: Agent, agent_name: str, prompt: str,
+                       flush_policy: FlushPolicy = None, on_messages=None,
+                       cache: ResponseCache = None, cache_key: str = None,
+                       timing: TurnTiming = None, send_timing: bool = False,
+                       scheduler: ProviderScheduler = None, client: str = "default",
+                       router: ModelRouter = None, fallbacks=(), hedge: Hedge = None, **run_kwargs) -> str:
+    """Stream one agent turn as agent_start/token/agent_end frames via send(frame), returns the full text
+
+    fallbacks: (model, agent) pairs tried in order if the turn fails or times out before its first token
+    hedge: race a second request against a slow first model; the first token wins, the loser is cancelled
+    """
+    timing = timing or TurnTiming(model="unknown", agent=agent_name, received_at=time.monotonic())
+    timing.start()
+    await send({
+        "type": "agent_start", 
+        "agent": agent_name
+    })
+    
+    batcher = TokenBatcher(
+        lambda text: send({
+            "type": "token", 
+            "content": text,
+            "agent": agent_name
+        }),
+        flush_policy
+    )
     try:
-        while True:
-            # Receive message from client
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            message_type = message.get("type", "prompt")
-            content = message.get("content", "")
-            history = message.get("history", [])
-            config = message.get("config", {})
+        cached = await cache.get(cache_key) if cache and cache_key else None
+        if cached is not None:
+            # Replay through the same frames so the client can't tell a hit from a live stream
+            timing.source = "cache"
+            for start in range(0, len(cached), REPLAY_CHUNK_CHARS):
+                timing.token()
+                await batcher.add(cached[start:start + REPLAY_CHUNK_CHARS])
+            response = cached
+            timing.finish()
+            if on_messages:
+                on_messages([
+                    ModelRequest(parts=[UserPromptPart(prompt)]),
+                    ModelResponse(parts=[TextPart(cached)])
+                ])
+        else:
+            chunks = []
+            timeout = None  # first-token timeout of the current candidate, set in the loop below
+            ttft_samples = []  # (model, ttft) for the router when a hedged race decides it
             
-            if not content.strip():
-                await websocket.send_text(json.dumps({
-                    "type": "error", 
-                    "content": "Please provide content!"
-                }))
-                continue
+            async def stream_from(candidate: Agent, model: str, slot: Slot, claim=None):
+                try:
+                    async with asyncio.timeout(timeout) as deadline:
+                        async with candidate.run_stream(prompt, **run_kwargs) as result:
+                            async for chunk in result.stream_text(delta=True, debounce_by=None):
+                                if not slot.streaming:
+                                    if claim:
+                                        claim()
+                                    slot.streaming = True
+                                    deadline.reschedule(None)  # the timeout only guards the first token
+                                timing.token()
+                                chunks.append(chunk)
+                                await batcher.add(chunk)
+                            timing.finish(result.usage)
+                            slot.used_tokens = timing.input_tokens + timing.output_tokens
+                            if on_messages:
+                                on_messages(result.new_messages())
+                except TimeoutError:
+                    if deadline.expired():
+                        raise TimeoutError(f"No first token from {model} within {timeout:g}s") from None
+                    raise
             
-            # Extract config parameters with defaults
-            model = config.get("model", "gemini-2.5-flash")
-            temperature = config.get("temperature", 0.7)
-            top_p = config.get("top_p", 0.9)
-            top_k = config.get("top_k", 40)
-            max_tokens = config.get("max_tokens", 1024)
-            system_prompt = config.get("system_prompt", "").strip()
+            def attempt_with(candidate: Agent, model: str, hedged: bool = False):
+                async def attempt(slot: Slot):
+                    timing.start()  # queue wait ends once a provider slot is granted
+                    if hedged:
+                        await run_hedged(stream_from, candidate, model, slot, hedge, timing, ttft_samples,
+                                         scheduler, client, cost)
+                    else:
+                        await stream_from(candidate, model, slot)
+                return attempt
             
-            # Prepare system prompt for dynamic injection
-            if system_prompt:
-                base_prompt = "You are a helpful AI assistant."
-                effective_prompt = f"{base_prompt}\n\n{system_prompt}".strip()
+            cost = estimate_turn_tokens(prompt, run_kwargs.get("message_history"), run_kwargs.get("model_settings"))
+            candidates = [(timing.model, agent), *fallbacks]
+            for index, (model, candidate) in enumerate(candidates):
+                timing.model = model
+                # Give up on a silent model only when there is another one to fall back to
+                has_next = index < len(candidates) - 1
+                timeout = router.first_token_timeout if router and has_next else None
+                try:
+                    attempt = attempt_with(candidate, model, hedged=hedge is not None and index == 0)
+                    if scheduler:
+                        await scheduler.run(
+                            model, attempt, client=client,
+                            cost=cost,
+                            on_queued=lambda position: send({
+                                "type": "queued", 
+                                "agent": agent_name,
+                                "position": position
+                            }),
+                            on_retry=lambda retry, delay: send({
+                                "type": "retrying", 
+                                "agent": agent_name,
+                                "attempt": retry,
+                                "delay_ms": round(delay * 1000)
+                            })
+                        )
+                    else:
+                        await attempt(Slot(model, 0))
+                except Exception as e:
+                    if router:
+                        router.record(model, ok=False)
+                    # Once tokens reached the client, switching models would garble the answer
+                    if timing.chunks or index == len(candidates) - 1:
+                        raise
+                    FALLBACKS.inc(model=model, to=candidates[index + 1][0])
+                    await send({
+                        "type": "fallback", 
+                        "agent": agent_name,
+                        "model": model,
+                        "to": candidates[index + 1][0],
+                        "reason": "timeout" if isinstance(e, TimeoutError) else type(e).__name__
+                    })
+                    continue
+                if router:
+                    for sampled, ttft in ttft_samples or [(model, timing.ttft)]:
+                        router.record(sampled, ok=True, ttft=ttft)
+                break
+            response = "".join(chunks)
+            # The key names the requested model: answers from a fallback or hedge model don't belong under it
+            if cache and cache_key and timing.model == candidates[0][0]:
+                await cache.set(cache_key, response)
+        await batcher.close()
+    except asyncio.CancelledError:
+        # No token frame may follow the stream's `cancelled` frame
+        batcher.cancel()
+        timing.record("cancelled")
+        raise
+    except BaseException:
+        batcher.cancel()
+        timing.record("error")
+        raise
+    timing.record()
+    
+    if send_timing:
+        await send(timing.as_frame())
+    await send({
+        "type": "agent_end", 
+        "agent": agent_name
+    })
+    return response
+
+
+def make_summarizer(create_agent_func):
+    """async summarize(prompt) for ConversationMemory, run on the cheap SUMMARY_MODEL"""
+    async def summarize(prompt: str) -> str:
+        summarizer = create_agent_func(
+            model=os.getenv("SUMMARY_MODEL", "gemini-2.5-flash-lite"),
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            tools=False  # summarizing never needs the docs search
+        )
+        return (await summarizer.run(prompt)).output
+    return summarize
+
+
+async def run_request(message: PromptMessage, received_at: float, send, memory: ConversationMemory,
+                      create_agent_func, response_cache: ResponseCache = None, scheduler: ProviderScheduler = None,
+                      router: ModelRouter = None, context_cache: ContextCache = None, client: str = "default"):
+    """Stream the agent turns for a validated prompt/debate request as frames via send(frame)
+
+    Shared by the WebSocket handler and batch jobs (batch.py); `client` is the scheduler's fairness unit.
+    """
+    message_type = message.type
+    content = message.content
+    config = message.config
+    
+    if not content.strip():
+        await send({
+            "type": "error", 
+            "content": "Please provide content!"
+        })
+        return
+    
+    # Config parameters (defaults and bounds live in schemas.RequestConfig)
+    model = config.model
+    temperature = config.temperature
+    top_p = config.top_p
+    top_k = config.top_k
+    max_tokens = config.max_tokens
+    system_prompt = config.system_prompt.strip()
+    
+    # Prepare system prompt for dynamic injection
+    if system_prompt:
+        base_prompt = "You are a helpful AI assistant."
+        effective_prompt = f"{base_prompt}\n\n{system_prompt}".strip()
+    else:
+        effective_prompt = "You are a helpful AI assistant."
+    
+    # Create ModelSettings with user configuration (top_k not available in Pydantic AI)
+    model_settings = ModelSettings(
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=max_tokens
+    )
+    flush_policy = FlushPolicy.from_config(config)
+    send_timing = config.timing
+    
+    # The requested (or auto-picked) model first, then healthy fallbacks for pre-first-token failures
+    if router:
+        models = router.route(model, config.quality)
+    else:
+        models = ["gemini-2.5-flash" if model == AUTO_MODEL else model]
+    
+    def build_agent(**kwargs):
+        """Get an agent for this message's model, timing how long that takes"""
+        started = time.monotonic()
+        agent = create_agent_func(model=models[0], **kwargs)
+        return agent, time.monotonic() - started
+    
+    def fallback_agents(**kwargs):
+        return [(m, create_agent_func(model=m, **kwargs)) for m in models[1:]]
+    
+    def cached_prefix(agent_system_prompt, history, fallbacks):
+        """(model_settings, message_history, fallbacks) with big stable prefixes served from Gemini's cache"""
+        if context_cache is None:
+            return model_settings, history, fallbacks
+        extra, history = context_cache.prepare(models[0], agent_system_prompt, history)
+        if not extra:
+            return model_settings, history, fallbacks
+        # Cached content belongs to one model, so cached turns don't fall back to others
+        return {**model_settings, **extra}, history, []
+    
+    def turn_timing(agent_name, construct_s):
+        return TurnTiming(model=models[0], agent=agent_name, received_at=received_at, construct_s=construct_s)
+    
+    # Only deterministic turns are cacheable; the key covers everything that shapes the answer
+    def cache_key(prompt, agent_system_prompt, history=(), summary=""):
+        if response_cache is None or temperature != 0:
+            return None
+        return response_cache.key(
+            prompt, model=model, system_prompt=agent_system_prompt, top_p=top_p,
+            max_tokens=max_tokens, history=render_messages(history), summary=summary
+        )
+    
+    if message_type == "prompt":
+        # Single agent streaming with dynamic system prompt via deps
+        primary_agent, construct_s = build_agent()  # No hardcoded system_prompt
+        history = await memory.history(effective_prompt)
+        hedge = None
+        if config.hedge if config.hedge is not None else os.getenv("HEDGE_PROMPTS", "0") == "1":
+            # Fire at the model's recent TTFT percentile, optionally on a cheaper model
+            default_delay = float(os.getenv("HEDGE_DELAY_MS", "1500")) / 1000
+            delay = router.hedge_delay(models[0], float(os.getenv("HEDGE_PERCENTILE", "95")), default_delay) if router else default_delay
+            hedge_model = config.hedge_model or os.getenv("HEDGE_MODEL") or models[0]
+            hedge = Hedge(delay, hedge_model, create_agent_func(model=hedge_model))
+        settings, sent_history, fallbacks = cached_prefix(effective_prompt, history, fallback_agents())
+        if hedge and "google_cached_content" in settings and hedge.model != models[0]:
+            hedge = None
+        await stream_agent(
+            send, primary_agent, "primary", content, flush_policy,
+            on_messages=memory.add_turn,
+            cache=response_cache,
+            cache_key=cache_key(content, effective_prompt, history, memory.summary),
+            timing=turn_timing("primary", construct_s), send_timing=send_timing,
+            scheduler=scheduler, client=client,
+            router=router, fallbacks=fallbacks, hedge=hedge,
+            model_settings=settings,
+            deps=Deps(system_prompt=effective_prompt),
+            message_history=sent_history
+        )
+    
+    elif message_type == "debate":
+        # Multi-agent debate: independent turns stream concurrently, tagged by agent
+        plan = build_debate_plan(config)
+        agents = {
+            name: build_agent(system_prompt=prompt)
+            for name, prompt in plan.agents.items()
+        }
+        prefixes = {
+            name: cached_prefix(prompt, [], fallback_agents(system_prompt=prompt))
+            for name, prompt in plan.agents.items()
+        }
+        await run_plan(plan, content, lambda turn, prompt: stream_agent(
+            send, agents[turn.agent][0], turn.agent, prompt, flush_policy,
+            cache=response_cache, cache_key=cache_key(prompt, plan.agents[turn.agent]),
+            timing=turn_timing(turn.agent, agents[turn.agent][1]), send_timing=send_timing,
+            scheduler=scheduler, client=client,
+            router=router, fallbacks=prefixes[turn.agent][2],
+            model_settings=prefixes[turn.agent][0]
+        ))
+    
+    await send({
+        "type": "complete"
+    })
+
+
+async def handle_websocket_stream(websocket: WebSocket, create_agent_func, response_cache: ResponseCache = None,
+                                  scheduler: ProviderScheduler = None, router: ModelRouter = None,
+                                  context_cache: ContextCache = None, store: ConversationStore = None):
+    """Multi-model streaming handler - works with any Pydantic AI model"""
+    # Wire protocol from the offered subprotocols (protocol.py); no offer keeps plain JSON frames
+    subprotocol, codec = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    # Session ids are bearer secrets: minted here and sent only to the connection that created the session,
+    # which reconnects with ?session_id= to resume it; ids the store doesn't hold start a fresh session
+    requested = websocket.query_params.get("session_id")
+    session_id = None
+    
+    # Server-side multi-turn memory per WebSocket connection, compacted by a cheap model
+    summarize = make_summarizer(create_agent_func)
+    
+    history_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+    max_streams = int(os.getenv("MAX_STREAMS_PER_CONNECTION", "8"))
+    sessions = OrderedDict()  # stream_id -> ConversationMemory, least recently used first
+    
+    async def session_memory(stream_id: str) -> ConversationMemory:
+        if stream_id not in sessions:
+            if store:
+                sessions[stream_id] = await store.memory(session_id, stream_id, summarize, history_budget)
             else:
-                effective_prompt = "You are a helpful AI assistant."
-            
-            if message_type == "prompt":
-                # Single agent streaming with proper message history
-                primary_agent = create_agent_func(model=model)  # No hardcoded system_prompt
-                agent_name = "primary"
-                
-                # Create ModelSettings with user configuration (top_k not available in Pydantic AI)
-                model_settings = ModelSettings(
-                    temperature=temperature,
-                    top_p=top_p,
-                    max_tokens=max_tokens
-                )
-                
-                await websocket.send_text(json.dumps({
-                    "type": "agent_start", 
-                    "agent": agent_name
-                }))
-                
-                # Use dynamic system prompt via deps
-                deps = Deps(system_prompt=effective_prompt)
-                async with primary_agent.run_stream(
-                    content, 
-                    model_settings=model_settings,
-                    deps=deps,
-                    message_history=[]  # Start fresh for now
-                ) as result:
-                    agent_response = ""
-                    async for chunk in result.stream_text(delta=True, debounce_by=None):
-                        agent_response += chunk
-                        await websocket.send_text(json.dumps({
-                            "type": "token", 
-                            "content": chunk,
-                            "agent": agent_name
-                        }))
-                    
-                    # Store conversation history
-                    conversation_history.append({"role": "User", "content": content})
-                    conversation_history.append({"role": "Agent", "content": agent_response})
-                
-                await websocket.send_text(json.dumps({
-                    "type": "agent_end", 
-                    "agent": agent_name
-                }))
-            
-            elif message_type == "debate":
-                # Multi-agent streaming debate
-                first_agent = create_agent_func(
-                    model=model,
-                    system_prompt="You start discussions thoughtfully and present initial viewpoints."
-                )
-                second_agent = create_agent_func(
-                    model=model,
-                    system_prompt="You provide thoughtful counter-arguments and alternative perspectives."
-                )
-                
-                # Create ModelSettings with user configuration (top_k not available in Pydantic AI)
-                model_settings = ModelSettings(
-                    temperature=temperature,
-                    top_p=top_p,
-                    max_tokens=max_tokens
-                )
-                
-                responses = {}
-                
-                # First agent initiates
-                await websocket.send_text(json.dumps({
-                    "type": "agent_start", 
-                    "agent": "first"
-                }))
-                
-                async with first_agent.run_stream(f"Start a discussion about: {content}", model_settings=model_settings) as result:
-                    responses['first'] = ""
-                    async for chunk in result.stream_text(delta=True, debounce_by=None):
-                        responses['first'] += chunk
-                        await websocket.send_text(json.dumps({
-                            "type": "token", 
-                            "content": chunk,
-                            "agent": "first"
-                        }))
-                
-                await websocket.send_text(json.dumps({
-                    "type": "agent_end", 
-                    "agent": "first"
-                }))
-                
-                # Second agent responds
-                await websocket.send_text(json.dumps({
-                    "type": "agent_start", 
-                    "agent": "second"
-                }))
-                
-                async with second_agent.run_stream(f"Respond to: {responses['first']}", model_settings=model_settings) as result:
-                    responses['second'] = ""
-                    async for chunk in result.stream_text(delta=True, debounce_by=None):
-                        responses['second'] += chunk
-                        await websocket.send_text(json.dumps({
-                            "type": "token", 
-                            "content": chunk,
-                            "agent": "second"
-                        }))
-                
-                await websocket.send_text(json.dumps({
-                    "type": "agent_end", 
-                    "agent": "second"
-                }))
-                
-                # First agent final reply
-                await websocket.send_text(json.dumps({
-                    "type": "agent_start", 
-                    "agent": "first"
-                }))
-                
-                async with first_agent.run_stream(f"Final reply to: {responses['second']}", model_settings=model_settings) as result:
-                    async for chunk in result.stream_text(delta=True, debounce_by=None):
-                        await websocket.send_text(json.dumps({
-                            "type": "token", 
-                            "content": chunk,
-                            "agent": "first"
-                        }))
-                
-                await websocket.send_text(json.dumps({
-                    "type": "agent_end", 
-                    "agent": "first"
-                }))
-            
-            await websocket.send_text(json.dumps({
-                "type": "complete"
-            }))
-                
+                sessions[stream_id] = ConversationMemory(summarize, token_budget=history_budget)
+            # Bound idle sessions per connection; streaming ones are never evicted
+            idle = [sid for sid in sessions if sid not in active and sid != stream_id]
+            while len(sessions) > max(max_streams * 4, 1) and idle:
+                del sessions[idle.pop(0)]
+        sessions.move_to_end(stream_id)
+        return sessions[stream_id]
+    
+    connection = Connection(websocket, max_queue=int(os.getenv("WS_SEND_QUEUE", "256")), codec=codec)
+    active = {}  # stream_id -> task streaming that session's current request
+    client = f"ws-{id(connection):x}"  # fairness unit for the provider scheduler
+    
+    def stream_hint(data) -> dict:
+        """stream_id of a rejected message, if it can be read at all, so the error lands on the right stream"""
+        try:
+            stream_id = codec.decode(data).get("stream_id")
+        except Exception:
+            return {}
+        return {"stream_id": str(stream_id)} if isinstance(stream_id, (str, int)) else {}
+    
+    def stream_sender(stream_id: str):
+        """send(frame) that tags every frame with the stream it belongs to"""
+        return lambda frame: connection.send({**frame, "stream_id": stream_id})
+    
+    async def on_message(data):
+        """Reader side: control messages act immediately, requests run as tasks per stream"""
+        received_at = time.monotonic()
+        try:
+            # One pass from the raw frame to a typed message; bad configs never reach an agent
+            message = codec.parse(data, INGRESS)
+        except ValidationError as e:
+            await connection.send({
+                "type": "error", 
+                "content": f"Invalid message: {describe_error(e)}",
+                **stream_hint(data)
+            })
+            return
+        
+        if isinstance(message, ControlMessage):
+            # Without a stream_id, cancel/reset apply to every stream on the connection
+            targets = [message.stream_id] if message.stream_id is not None else list(active) + list(sessions)
+            for sid in targets:
+                if sid in active:
+                    active[sid].cancel()
+                if message.type == "reset":
+                    if store:
+                        (await session_memory(sid)).clear()  # recorded, so a resumed session starts fresh too
+                    else:
+                        sessions.pop(sid, None)
+            return
+        
+        stream_id = message.stream_id
+        send = stream_sender(stream_id)
+        if stream_id in active:
+            await send({
+                "type": "error", 
+                "content": "A response is already streaming - cancel it first."
+            })
+            return
+        if len(active) >= max_streams:
+            await send({
+                "type": "error", 
+                "content": f"Too many concurrent streams (limit {max_streams})."
+            })
+            return
+        memory = await session_memory(stream_id)
+        task = asyncio.create_task(process_message(message, received_at, stream_id, memory))
+        active[stream_id] = task
+        task.add_done_callback(lambda _: active.pop(stream_id, None) if active.get(stream_id) is task else None)
+    
+    async def process_message(message: PromptMessage, received_at: float, stream_id: str, memory: ConversationMemory):
+        """Stream one request; upstream generation stops as soon as this task is cancelled"""
+        send = stream_sender(stream_id)
+        try:
+            await run_request(
+                message, received_at, send, memory, create_agent_func,
+                response_cache, scheduler, router, context_cache, client
+            )
+        except asyncio.CancelledError:
+            connection.send_terminal({"type": "cancelled", "stream_id": stream_id})
+            raise
+        except Exception as e:
+            print(f"Stream error: {str(e)}")
+            await send({
+                "type": "error", 
+                "content": f"Error: {str(e) or type(e).__name__}"
+            })
+    
+    try:
+        turns = await store.turn_count(requested) if store and requested else 0
+        session_id = requested if turns else secrets.token_urlsafe(32)
+        await connection.send({
+            "type": "session", 
+            "session_id": session_id,
+            "resumed": turns > 0,
+            "turns": turns
+        })
+        await connection.run(on_message)
     except WebSocketDisconnect as e:
         # Log close codes to distinguish normal vs problematic disconnections
         # 1000/1001 = normal closures, 1006/1002/1011 = problematic
@@ -191,10 +501,14 @@ async def handle_websocket_stream(websocket: WebSocket, create_agent_func):
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
         try:
-            await websocket.send_text(json.dumps({
+            await connection.send_direct({
                 "type": "error", 
                 "content": f"Error: {str(e)}"
-            }))
+            })
         except:
             # Connection might be already closed
             pass
+    finally:
+        # Stop paying for upstream generation the moment the client is gone
+        for task in list(active.values()):
+            task.cancel()
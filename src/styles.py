@@ -48,9 +48,14 @@ def get_css():
         input[type="text"]:focus { outline: none; border-color: #2d7a2d; }
         .send-btn { background: #2d7a2d; color: white; }
         .send-btn:hover { background: #359935; }
+        .stop-btn { background: #7a2d2d; color: white; }
+        .stop-btn:hover { background: #993535; }
         .message { margin-bottom: 15px; }
         .status { color: #888; font-style: italic; margin-bottom: 10px; }
         .agent-response { background: #262626; padding: 15px; border-radius: 8px; margin: 10px 0; }
+        /* Plain-text output keeps its line breaks; off-screen entries skip layout and paint */
+        .message, .agent-response { white-space: pre-wrap; content-visibility: auto; contain-intrinsic-size: auto 80px; }
+        .earlier { color: #666; font-size: 12px; text-align: center; margin-bottom: 10px; }
         .typing { opacity: 0.7; }
         .config-panel {
             background: #1a1a1a; border-radius: 12px; padding: 20px;
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the FastAPI/WebSocket layer
+Boots hello_world.app with a deterministic fake streaming model (no Gemini quota)
+and drives concurrent WebSocket clients through the prompt and debate flows.
+
+Usage:
+  python benchmark.py [--clients 50] [--requests 4] [--flow prompt|debate|both]
+                      [--tokens 200] [--rate 500] [--protocol json|compact|msgpack]
+                      [--json] [--max-p95-ttft-ms 250]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+
+def fake_agent_factory(tokens: int, rate: float):
+    """create_agent replacement streaming `tokens` deltas at `rate` tokens/sec"""
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models.function import FunctionModel
+    from streaming import Deps
+
+    delay = 1 / rate if rate > 0 else 0
+
+    async def stream(messages, info):
+        for i in range(tokens):
+            if delay:
+                await asyncio.sleep(delay)
+            yield f"tok{i} "
+
+    def complete(messages, info):
+        return ModelResponse(parts=[TextPart("summary")])
+
+    def create_agent(model, system_prompt: str = None, tools: bool = True):
+        fake = FunctionModel(complete, stream_function=stream, model_name=model)
+        if system_prompt:
+            return Agent(fake, system_prompt=system_prompt)
+        agent = Agent(fake, deps_type=Deps)
+
+        @agent.system_prompt
+        def dynamic_system_prompt(ctx) -> str:
+            return ctx.deps.system_prompt
+
+        return agent
+
+    return create_agent
+
+
+def usage_snapshot() -> dict:
+    """CPU seconds and resident memory of this process"""
+    rss_mb = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        try:
+            import resource
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, KiB on Linux
+        except ImportError:
+            pass  # Windows: CPU only
+    return {"cpu_s": time.process_time(), "rss_mb": round(rss_mb, 1) if rss_mb else None}
+
+
+def serve(port: int, tokens: int, rate: float):
+    """Run hello_world.app with the fake model (server side of the benchmark)"""
+    import uvicorn
+    import hello_world
+
+    hello_world.agent_pool.factory = fake_agent_factory(tokens, rate)
+    hello_world.agent_pool.clear()
+
+    @hello_world.app.get("/bench/usage")
+    async def bench_usage():
+        return usage_snapshot()
+
+    uvicorn.run(hello_world.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_client(url: str, flow: str, requests: int, config: dict, stats: dict, protocol: str):
+    """One WebSocket client sending `requests` messages back to back"""
+    import websockets
+    from protocol import JSON, FrameDecoder
+
+    started = time.perf_counter()
+    async with websockets.connect(url, max_size=None, subprotocols=[protocol]) as ws:
+        stats["connect"].append(time.perf_counter() - started)
+        decoder = FrameDecoder(ws.subprotocol or JSON)  # no pick means the default protocol
+        for i in range(requests):
+            sent = time.perf_counter()
+            await ws.send(json.dumps({"type": flow, "content": f"benchmark {i}", "config": config}))
+            first_token = None
+            while True:
+                message = await ws.recv()
+                stats["bytes"] += len(message)  # payload size, before permessage-deflate
+                frame = decoder.decode(message)
+                if frame is None:
+                    continue  # compact protocol id definition
+                stats["frames"] += 1
+                if frame["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter()
+                    stats["ttft"].append(first_token - sent)
+                elif frame["type"] == "error":
+                    stats["errors"] += 1
+                    break
+                elif frame["type"] == "complete":
+                    stats["latency"].append(time.perf_counter() - sent)
+                    break
+
+
+async def drive(url: str, flow: str, clients: int, requests: int, config: dict, protocol: str) -> dict:
+    stats = {"connect": [], "ttft": [], "latency": [], "frames": 0, "bytes": 0, "errors": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(url, flow, requests, config, stats, protocol) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    connect_span = max(stats["connect"]) if stats["connect"] else 0
+    return {
+        "flow": flow,
+        "clients": clients,
+        "requests": clients * requests,
+        "errors": stats["errors"],
+        "elapsed_s": round(elapsed, 3),
+        "connections_per_sec": round(clients / connect_span, 1) if connect_span else 0.0,
+        "requests_per_sec": round(clients * requests / elapsed, 1),
+        "frames_per_sec": round(stats["frames"] / elapsed, 1),
+        "bytes_per_frame": round(stats["bytes"] / stats["frames"], 1) if stats["frames"] else 0.0,
+        "ttft_ms": {p: round(percentile(stats["ttft"], p) * 1000, 2) for p in (50, 95, 99)},
+        "latency_ms": {p: round(percentile(stats["latency"], p) * 1000, 2) for p in (50, 95, 99)},
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=2) as response:
+        return json.loads(response.read())
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            return get_json(f"{base_url}/bench/usage")
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline WebSocket load test with a fake streaming model')
+    parser.add_argument('--clients', '-c', type=int, default=50, help='Concurrent WebSocket clients')
+    parser.add_argument('--requests', '-n', type=int, default=4, help='Messages per client')
+    parser.add_argument('--flow', choices=['prompt', 'debate', 'both'], default='both')
+    parser.add_argument('--tokens', type=int, default=200, help='Deltas streamed per agent turn')
+    parser.add_argument('--rate', type=float, default=500, help='Fake model tokens/sec (0 = unthrottled)')
+    parser.add_argument('--flush-ms', type=float, default=0, help='Client flush_ms config (token batching)')
+    parser.add_argument('--protocol', choices=['json', 'compact', 'msgpack'], default='json',
+                        help='Wire protocol to negotiate (see protocol.py)')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    parser.add_argument('--max-p95-ttft-ms', type=float, help='Exit 1 if p95 TTFT exceeds this (regression gate)')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(SRC_DIR))
+    from protocol import COMPACT, COMPACT_MSGPACK, JSON
+    if args.serve:
+        serve(args.serve, args.tokens, args.rate)
+        return
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "PYDANTIC_AI_NO_BANNER": "1", "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "offline")}
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port), "--tokens", str(args.tokens), "--rate", str(args.rate)],
+        env=env, cwd=SRC_DIR, stdout=subprocess.DEVNULL  # keep --json output clean
+    )
+    try:
+        before = wait_until_ready(base_url, server)
+        flows = ['prompt', 'debate'] if args.flow == 'both' else [args.flow]
+        config = {"flush_ms": args.flush_ms} if args.flush_ms else {}
+        protocol = {"json": JSON, "compact": COMPACT, "msgpack": COMPACT_MSGPACK}[args.protocol]
+        results = []
+        for flow in flows:
+            result = asyncio.run(drive(
+                f"ws://127.0.0.1:{port}/ws", flow, args.clients, args.requests, config, protocol
+            ))
+            after = get_json(f"{base_url}/bench/usage")
+            result["server_cpu_s"] = round(after["cpu_s"] - before["cpu_s"], 3)
+            result["server_rss_mb"] = after["rss_mb"]
+            results.append(result)
+            before = after
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(f"\n[{r['flow']}] {r['clients']} clients x {args.requests} requests, {args.tokens} tokens/turn")
+            print(f"  requests/sec:    {r['requests_per_sec']}  ({r['errors']} errors, {r['elapsed_s']}s)")
+            print(f"  connections/sec: {r['connections_per_sec']}")
+            print(f"  frames/sec:      {r['frames_per_sec']}  ({r['bytes_per_frame']} bytes/frame)")
+            print(f"  TTFT ms:         p50={r['ttft_ms'][50]} p95={r['ttft_ms'][95]} p99={r['ttft_ms'][99]}")
+            print(f"  latency ms:      p50={r['latency_ms'][50]} p95={r['latency_ms'][95]} p99={r['latency_ms'][99]}")
+            print(f"  server:          cpu={r['server_cpu_s']}s rss={r['server_rss_mb']}MB")
+
+    failed = any(r["errors"] for r in results)
+    if args.max_p95_ttft_ms is not None:
+        failed = failed or any(r["ttft_ms"][95] > args.max_p95_ttft_ms for r in results)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Crawl helpers for the scrape pipeline (pipeline.py)
+Pooled HTTP fetching with per-host rate limits and retries, trafilatura extraction
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import trafilatura
+import urllib3
+from urllib3.util import Retry
+
+USER_AGENT = "MultiAgentFramework-docs-scraper"
+
+
+def extract_markdown(html) -> str:
+    """CPU-bound trafilatura step; module-level so the process pool can pickle it"""
+    return trafilatura.extract(html, output_format='markdown', include_links=True)
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least 1/rate seconds apart"""
+
+    def __init__(self, rate_per_host: float):
+        self.interval = 1 / rate_per_host if rate_per_host > 0 else 0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    body: bytes = None
+    headers: dict = field(default_factory=dict)  # case-insensitive HTTPHeaderDict from urllib3
+    error: str = None
+
+
+class Fetcher:
+    """Thread-safe pooled HTTP client shared by all crawl workers"""
+
+    def __init__(self, workers: int = 8, rate_per_host: float = 5, retries: int = 3, timeout: float = 30):
+        self.http = urllib3.PoolManager(
+            num_pools=16,
+            maxsize=workers,
+            block=True,
+            headers={"User-Agent": USER_AGENT},
+            retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                respect_retry_after_header=True,
+            ),
+            timeout=urllib3.Timeout(total=timeout),
+        )
+        self.limiter = HostRateLimiter(rate_per_host)
+
+    def fetch(self, url: str, headers: dict = None) -> FetchResult:
+        self.limiter.wait(url)
+        try:
+            response = self.http.request("GET", url, headers=headers)
+        except urllib3.exceptions.HTTPError as e:
+            return FetchResult(url, error=str(e))
+        return FetchResult(url, response.status, response.data, response.headers)
+
+
+@dataclass
+class CrawlStats:
+    pages: int = 0
+    saved: int = 0
+    failed: int = 0
+    empty: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    bytes_fetched: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        return (
+            f"{self.pages} pages in {elapsed:.1f}s ({self.pages / elapsed if elapsed else 0:.1f} pages/s, "
+            f"{self.bytes_fetched / 2**20 / elapsed if elapsed else 0:.2f} MiB/s): "
+            f"{self.saved} saved, {self.unchanged} unchanged, {self.skipped} skipped, "
+            f"{self.empty} empty, {self.failed} failed"
+        )
+
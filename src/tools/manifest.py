@@ -0,0 +1,107 @@
+"""
+Crawl manifest for incremental, resumable re-scrapes
+One SQLite row per URL: validators, sitemap lastmod and extracted-content hash
+"""
+
+import hashlib
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+def content_hash(markdown: str) -> str:
+    return hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+
+
+def sitemap_lastmods(sitemap_url, fetcher, depth: int = 2) -> dict:
+    """Best-effort url -> <lastmod> map, following one level of sitemap indexes"""
+    result = fetcher.fetch(sitemap_url)
+    if result.status != 200 or not result.body:
+        return {}
+    try:
+        root = ET.fromstring(result.body)
+    except ET.ParseError:
+        return {}
+
+    lastmods = {}
+    for entry in root:
+        loc = entry.findtext(f"{SITEMAP_NS}loc", "").strip()
+        lastmod = entry.findtext(f"{SITEMAP_NS}lastmod", "").strip()
+        if entry.tag == f"{SITEMAP_NS}sitemap" and depth > 1 and loc:
+            lastmods.update(sitemap_lastmods(loc, fetcher, depth - 1))
+        elif loc and lastmod:
+            lastmods[loc] = lastmod
+    return lastmods
+
+
+class CrawlManifest:
+    """Remembers what was fetched so re-runs only pay for what changed"""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # cheap per-page checkpoints
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, lastmod TEXT,
+                content_hash TEXT, checked_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY, sitemap TEXT, started_at REAL, finished_at REAL
+            );
+        """)
+
+    def begin_run(self, sitemap: str):
+        """Start a run; returns (run_id, resume_since) where resume_since marks an interrupted run"""
+        row = self._db.execute(
+            "SELECT id, started_at, finished_at FROM runs WHERE sitemap = ? ORDER BY id DESC LIMIT 1",
+            (sitemap,)
+        ).fetchone()
+        if row and row[2] is None:
+            return row[0], row[1]
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO runs (sitemap, started_at) VALUES (?, ?)", (sitemap, time.time())
+            )
+        return cursor.lastrowid, None
+
+    def finish_run(self, run_id: int):
+        with self._db:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+
+    def get(self, url: str):
+        row = self._db.execute(
+            "SELECT etag, last_modified, lastmod, content_hash, checked_at FROM pages WHERE url = ?",
+            (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified", "lastmod", "content_hash", "checked_at"), row))
+
+    @staticmethod
+    def conditional_headers(entry) -> dict:
+        """If-None-Match / If-Modified-Since from a stored entry"""
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url: str, etag=None, last_modified=None, lastmod=None, content_hash=None):
+        """Upsert a page checkpoint (None keeps the stored value)"""
+        with self._db:
+            self._db.execute("""
+                INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = COALESCE(excluded.etag, etag),
+                    last_modified = COALESCE(excluded.last_modified, last_modified),
+                    lastmod = COALESCE(excluded.lastmod, lastmod),
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    checked_at = excluded.checked_at
+            """, (url, etag, last_modified, lastmod, content_hash, time.time()))
+
+    def close(self):
+        self._db.close()
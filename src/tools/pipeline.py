@@ -0,0 +1,311 @@
+"""
+Streaming extraction pipeline: fetch -> extract -> normalize -> chunk -> sink
+Stages run concurrently and hand pages over through bounded queues, so memory stays
+flat however large the sitemap is and nothing touches disk between stages.
+
+Compose your own:
+    stages = [fetch_stage(fetcher), Stage("extract", extract_page, os.cpu_count(), "process"), ...]
+    async for page in run_stages(pages, stages):
+        ...
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from crawl import CrawlStats, Fetcher, extract_markdown
+from manifest import CrawlManifest, content_hash
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+DONE = object()  # end-of-stream marker passed down the queues
+
+
+@dataclass
+class Stage:
+    """One pipeline step: func(item) -> item, or None to drop it
+
+    executor: "inline" (on the event loop; cheap or async funcs), "thread" (blocking I/O)
+    or "process" (CPU-bound; func and items must be picklable)
+    """
+    name: str
+    func: callable
+    workers: int = 1
+    executor: str = "inline"
+
+
+async def run_stages(source, stages, queue_size: int = 16):
+    """Async iterator over the items that come out of the last stage (unordered)"""
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    pools, tasks = [], []
+
+    async def feed():
+        for item in source:
+            await queues[0].put(item)  # blocks while the first stage is saturated
+        await queues[0].put(DONE)
+
+    async def work(stage, inbox, outbox, pool, live):
+        while True:
+            item = await inbox.get()
+            if item is DONE:
+                await inbox.put(DONE)  # let sibling workers see it too
+                live[0] -= 1
+                if live[0] == 0:
+                    await outbox.put(DONE)
+                return
+            if pool is not None:
+                item = await loop.run_in_executor(pool, stage.func, item)
+            elif asyncio.iscoroutinefunction(stage.func):
+                item = await stage.func(item)
+            else:
+                item = stage.func(item)
+            if item is not None:
+                await outbox.put(item)
+
+    try:
+        tasks.append(asyncio.create_task(feed()))
+        for i, stage in enumerate(stages):
+            pool = None
+            if stage.executor == "thread":
+                pool = ThreadPoolExecutor(stage.workers, thread_name_prefix=stage.name)
+            elif stage.executor == "process":
+                pool = ProcessPoolExecutor(stage.workers)
+            if pool is not None:
+                pools.append(pool)
+            live = [stage.workers]
+            for _ in range(stage.workers):
+                tasks.append(asyncio.create_task(work(stage, queues[i], queues[i + 1], pool, live)))
+
+        while True:
+            # Watch the workers too, so a failing stage raises instead of stalling the stream
+            getter = asyncio.ensure_future(queues[-1].get())
+            done, _ = await asyncio.wait({getter, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+            for task in done - {getter}:
+                tasks.remove(task)
+                task.result()
+            if getter not in done:
+                getter.cancel()
+                continue
+            item = getter.result()
+            if item is DONE:
+                return
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+@dataclass
+class Page:
+    url: str
+    entry: dict = None      # manifest row from the previous run
+    lastmod: str = None     # sitemap <lastmod>
+    html: bytes = None
+    size: int = 0           # bytes fetched
+    etag: str = None
+    last_modified: str = None
+    markdown: str = None
+    digest: str = None
+    chunks: list = field(default_factory=list)
+    outcome: str = None     # set once a page stops early: unchanged / failed / empty
+    error: str = None
+
+
+def fetch_stage(fetcher: Fetcher, workers: int = 8) -> Stage:
+    def fetch(page: Page) -> Page:
+        result = fetcher.fetch(page.url, CrawlManifest.conditional_headers(page.entry))
+        if result.status == 304:
+            page.outcome = "unchanged"
+        elif result.error or result.status != 200 or not result.body:
+            page.outcome, page.error = "failed", result.error or str(result.status)
+        else:
+            page.html, page.size = result.body, len(result.body)
+            page.etag = result.headers.get("ETag")
+            page.last_modified = result.headers.get("Last-Modified")
+        return page
+    return Stage("fetch", fetch, workers, "thread")
+
+
+def extract_page(page: Page) -> Page:
+    """trafilatura extraction; module-level so the process pool can pickle it"""
+    if page.outcome is None:
+        try:
+            page.markdown = extract_markdown(page.html)
+        except Exception as e:
+            page.outcome, page.error = "failed", f"extract: {e}"
+        if page.outcome is None and not page.markdown:
+            page.outcome = "empty"
+    page.html = None  # don't ship the raw page any further
+    return page
+
+
+def normalize_page(page: Page) -> Page:
+    """Strip trailing whitespace and collapse blank-line runs so hashes ignore layout noise"""
+    if page.outcome is None:
+        text = "\n".join(line.rstrip() for line in page.markdown.splitlines())
+        page.markdown = re.sub(r"\n{3,}", "\n\n", text).strip() + "\n"
+        page.digest = content_hash(page.markdown)
+        if page.entry and page.entry["content_hash"] == page.digest:
+            page.outcome = "unchanged"
+    return page
+
+
+def chunk_stage(max_chars: int = None) -> Stage:
+    """Heading-aware chunks with term frequencies, in the docs index's record format"""
+    sys.path.insert(0, str(SRC_DIR))
+    from retrieval import CHUNK_CHARS, chunk_text, make_chunks
+
+    def chunk(page: Page) -> Page:
+        if page.outcome is None:
+            title = page.url.rstrip("/").rsplit("/", 1)[-1]
+            page.chunks = make_chunks(chunk_text(page.markdown, max_chars or CHUNK_CHARS), title)
+        return page
+    return Stage("chunk", chunk)
+
+
+def url_to_filename(url):
+    """Create a flat markdown filename from a URL"""
+    filename = url.replace('https://', '').replace('http://', '')
+    filename = filename.replace('/', '_').replace('?', '_').replace('&', '_')
+    return f"{filename[:100]}.md"  # Limit filename length
+
+
+class FileSink:
+    """One markdown file per page under output_dir"""
+
+    def __init__(self, output_dir="docs_scraped", filename: str = None):
+        self.output_dir = Path(output_dir)
+        self.filename = filename  # fixed name for single-page scrapes
+
+    def write(self, page: Page):
+        output_path = self.output_dir / (self.filename or url_to_filename(page.url))
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(page.markdown)
+        print(f"Saved to: {output_path}", file=sys.stderr)
+
+    def close(self):
+        pass
+
+
+class PrintSink:
+    """Raw markdown to a text stream (stdout by default)"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, page: Page):
+        print(page.markdown, file=self.stream)
+
+    def close(self):
+        self.stream.flush()
+
+
+class JsonlSink:
+    """One JSON line per chunk (or per page when not chunked); path '-' streams to stdout"""
+
+    def __init__(self, path="-"):
+        self.stream = sys.stdout if path == "-" else open(path, "a", encoding="utf-8")
+
+    def write(self, page: Page):
+        records = [
+            {"url": page.url, "title": c["title"], "text": c["text"]} for c in page.chunks
+        ] or [{"url": page.url, "markdown": page.markdown}]
+        for record in records:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+
+class IndexSink:
+    """Feeds chunks straight into the retrieval index; written once at close
+
+    Only the compact term-frequency records are held, never page text beyond its chunks.
+    """
+
+    def __init__(self, index_dir=None):
+        sys.path.insert(0, str(SRC_DIR))
+        import retrieval
+        self._retrieval = retrieval
+        self.index_dir = Path(index_dir) if index_dir else retrieval.INDEX_DIR
+        self._pages = {}
+
+    def write(self, page: Page):
+        self._pages[page.url] = (page.digest, page.chunks)
+
+    def close(self):
+        if self._pages:
+            stats = self._retrieval.add_streamed_pages(self._pages, self.index_dir)
+            print(f"Indexed {len(self._pages)} pages ({stats['chunks']} chunks total)", file=sys.stderr)
+        self._pages = {}
+
+
+def plan_pages(urls, stats: CrawlStats, manifest: CrawlManifest = None, lastmods: dict = None,
+               resume_since: float = None):
+    """Pages worth fetching, lazily; manifest hits skip the network entirely"""
+    lastmods = lastmods or {}
+    for url in urls:
+        entry = manifest.get(url) if manifest else None
+        if entry and resume_since and entry["checked_at"] >= resume_since:
+            stats.skipped += 1  # done before the interruption
+            continue
+        if entry and lastmods.get(url) and entry["lastmod"] == lastmods[url]:
+            stats.skipped += 1  # sitemap says unchanged
+            continue
+        yield Page(url, entry, lastmods.get(url))
+
+
+async def scrape(urls, sink, workers: int = 8, rate_per_host: float = 5, retries: int = 3,
+                 manifest: CrawlManifest = None, lastmods: dict = None, resume_since: float = None,
+                 chunk: bool = False, queue_size: int = None, extract_workers: int = None) -> CrawlStats:
+    """Run the full pipeline into sink, checkpointing each finished page in the manifest
+
+    extract_workers: trafilatura processes (default: one per CPU)
+    """
+    stats = CrawlStats()
+    total = len(urls)
+    stages = [
+        fetch_stage(Fetcher(workers, rate_per_host, retries), workers),
+        Stage("extract", extract_page, extract_workers or os.cpu_count() or 1, "process"),
+        Stage("normalize", normalize_page),
+    ]
+    if chunk:
+        stages.append(chunk_stage())
+
+    pages = plan_pages(urls, stats, manifest, lastmods, resume_since)
+    try:
+        async for page in run_stages(pages, stages, queue_size or max(16, workers * 2)):
+            stats.pages += 1
+            stats.bytes_fetched += page.size
+            if page.outcome is None:
+                sink.write(page)
+                stats.saved += 1
+            elif page.outcome == "unchanged":
+                stats.unchanged += 1
+            elif page.outcome == "empty":
+                stats.empty += 1
+                print(f"No content extracted from: {page.url}", file=sys.stderr)
+            else:
+                stats.failed += 1
+                print(f"Failed to download: {page.url} ({page.error})", file=sys.stderr)
+            if manifest and page.outcome != "failed":
+                manifest.record(
+                    page.url, etag=page.etag, last_modified=page.last_modified,
+                    lastmod=page.lastmod, content_hash=page.digest
+                )
+            if stats.pages % 25 == 0:
+                print(f"[{stats.pages + stats.skipped}/{total}] {stats.summary()}", file=sys.stderr)
+    finally:
+        sink.close()
+    return stats
@@ -3,78 +3,78 @@
 Simple documentation scraper using Trafilatura
 Usage: 
   python scrape_docs.py <url> [--output <filename>]
-  python scrape_docs.py --sitemap <sitemap_url> [--filter <path>]
+  python scrape_docs.py --sitemap <sitemap_url> [--filter <path>] [--workers N] [--extract-workers N] [--full]
+                        [--sink files|jsonl|index] [--jsonl <path>]
+
+Pages stream through pipeline.py (fetch -> extract -> normalize -> chunk -> sink) with no
+intermediate files. Sitemap runs keep a manifest under docs_scraped/ so re-runs only fetch
+and emit changed pages and an interrupted run resumes where it stopped.
 """
 
 import argparse
-import os
+import asyncio
 import sys
 from pathlib import Path
-import trafilatura
 from trafilatura.sitemaps import sitemap_search
-from trafilatura.settings import use_config
+from crawl import Fetcher
+from manifest import CrawlManifest, sitemap_lastmods
+from pipeline import FileSink, IndexSink, JsonlSink, PrintSink, scrape
 
-def scrape_single_page(url, output_file=None):
-    """Scrape a single page and save as markdown"""
-    print(f"Scraping: {url}")
-    
-    # Download the page
-    downloaded = trafilatura.fetch_url(url)
-    if not downloaded:
-        print(f"Failed to download: {url}")
-        return False
-    
-    # Extract content as markdown
-    result = trafilatura.extract(downloaded, output_format='markdown', include_links=True)
-    
-    if result:
-        if output_file:
-            output_path = Path("docs_scraped") / output_file
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(result)
-            print(f"Saved to: {output_path}")
-        else:
-            print(result)
-        return True
-    else:
-        print(f"No content extracted from: {url}")
-        return False
+OUTPUT_DIR = Path("docs_scraped")
+MANIFEST_FILE = ".manifest.sqlite"
+
+def make_sink(kind="files", jsonl_path="-", output_file=None):
+    """files: markdown under docs_scraped/, jsonl: chunk records, index: the local docs index"""
+    if kind == "jsonl":
+        return JsonlSink(jsonl_path)
+    if kind == "index":
+        return IndexSink()
+    return FileSink(OUTPUT_DIR, output_file)
 
-def scrape_from_sitemap(sitemap_url, filter_path=None):
-    """Scrape all pages from a sitemap"""
-    print(f"Fetching sitemap: {sitemap_url}")
+def scrape_single_page(url, output_file=None, sink="files", jsonl_path="-"):
+    """Scrape a single page and save as markdown (printed when no output file is given)"""
+    print(f"Scraping: {url}", file=sys.stderr)
+    target = PrintSink() if sink == "files" and not output_file else make_sink(sink, jsonl_path, output_file)
+    stats = asyncio.run(scrape([url], target, workers=1, extract_workers=1, chunk=sink != "files"))
+    return stats.saved == 1
+
+def scrape_from_sitemap(sitemap_url, filter_path=None, workers=1, rate_per_host=5.0, retries=3, full=False,
+                        sink="files", jsonl_path="-", extract_workers=None):
+    """Scrape changed pages from a sitemap (all pages when full=True)"""
+    print(f"Fetching sitemap: {sitemap_url}", file=sys.stderr)
     
     # Get URLs from sitemap
     urls = sitemap_search(sitemap_url)
     
     if not urls:
-        print("No URLs found in sitemap")
+        print("No URLs found in sitemap", file=sys.stderr)
         return
     
     # Filter URLs if path specified
     if filter_path:
         urls = [url for url in urls if filter_path in url]
-        print(f"Filtered to {len(urls)} URLs containing '{filter_path}'")
+        print(f"Filtered to {len(urls)} URLs containing '{filter_path}'", file=sys.stderr)
     else:
-        print(f"Found {len(urls)} URLs in sitemap")
-    
-    # Create output directory
-    output_dir = Path("docs_scraped")
-    output_dir.mkdir(exist_ok=True)
+        print(f"Found {len(urls)} URLs in sitemap", file=sys.stderr)
     
-    # Process each URL
-    for i, url in enumerate(urls, 1):
-        print(f"\n[{i}/{len(urls)}] Processing: {url}")
-        
-        # Create filename from URL
-        filename = url.replace('https://', '').replace('http://', '')
-        filename = filename.replace('/', '_').replace('?', '_').replace('&', '_')
-        filename = f"{filename[:100]}.md"  # Limit filename length
-        
-        scrape_single_page(url, filename)
+    # One manifest per sink kind, so switching sinks doesn't skip pages the other never saw
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    manifest_file = MANIFEST_FILE if sink == "files" else MANIFEST_FILE.replace(".sqlite", f"-{sink}.sqlite")
+    manifest = None if full else CrawlManifest(OUTPUT_DIR / manifest_file)
+    lastmods = sitemap_lastmods(sitemap_url, Fetcher(1, rate_per_host, retries)) if manifest else {}
+    run_id, resume_since = manifest.begin_run(sitemap_url) if manifest else (None, None)
+    if resume_since:
+        print("Resuming interrupted run", file=sys.stderr)
     
-    print(f"\nCompleted! Scraped {len(urls)} pages to docs_scraped/")
+    stats = asyncio.run(scrape(
+        urls, make_sink(sink, jsonl_path), workers=workers, rate_per_host=rate_per_host, retries=retries,
+        manifest=manifest, lastmods=lastmods, resume_since=resume_since, chunk=sink != "files",
+        extract_workers=extract_workers
+    ))
+    if manifest:
+        manifest.finish_run(run_id)
+        manifest.close()
+    print(f"\nCompleted! {stats.summary()}", file=sys.stderr)
 
 def main():
     parser = argparse.ArgumentParser(description='Scrape documentation using Trafilatura')
@@ -82,20 +82,30 @@ def main():
     parser.add_argument('--output', '-o', help='Output filename (for single page)')
     parser.add_argument('--sitemap', '-s', help='Scrape from sitemap URL')
     parser.add_argument('--filter', '-f', help='Filter sitemap URLs by path')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Parallel fetch workers for sitemaps')
+    parser.add_argument('--extract-workers', type=int, help='Extraction processes (default: one per CPU)')
+    parser.add_argument('--rate', type=float, default=5.0, help='Max requests/sec per host (0 = unlimited)')
+    parser.add_argument('--retries', type=int, default=3, help='Retries with backoff on errors/429s')
+    parser.add_argument('--full', action='store_true', help='Ignore the crawl manifest and re-scrape everything')
+    parser.add_argument('--sink', choices=['files', 'jsonl', 'index'], default='files',
+                        help='Where extracted pages go: markdown files, JSONL chunks or the docs index')
+    parser.add_argument('--jsonl', default='-', help="JSONL sink path ('-' for stdout)")
     
     args = parser.parse_args()
     
     if args.sitemap:
-        scrape_from_sitemap(args.sitemap, args.filter)
+        scrape_from_sitemap(args.sitemap, args.filter, args.workers, args.rate, args.retries, args.full,
+                            args.sink, args.jsonl, args.extract_workers)
     elif args.url:
-        scrape_single_page(args.url, args.output)
+        scrape_single_page(args.url, args.output, args.sink, args.jsonl)
     else:
         print("Usage:")
         print("  Single page:  python scrape_docs.py <url> [--output <filename>]")
-        print("  From sitemap: python scrape_docs.py --sitemap <sitemap_url> [--filter <path>]")
+        print("  From sitemap: python scrape_docs.py --sitemap <sitemap_url> [--filter <path>] [--workers N]")
         print("\nExamples:")
         print("  python scrape_docs.py https://docs.python.org/3/tutorial/")
         print("  python scrape_docs.py --sitemap https://docs.python.org/3/sitemap.xml --filter /tutorial/")
+        print("  python scrape_docs.py --sitemap https://docs.python.org/3/sitemap.xml --sink jsonl > docs.jsonl")
 
 if __name__ == '__main__':
     main()
@@ -3,7 +3,9 @@ UI Components for MultiAgent Framework
 Separated per Elon's algorithm to keep files under 200 LOC
 """
 
+import json
 from styles import get_css
+from protocol import COMPACT, FRAME_TYPES, JSON
 
 def get_html_interface():
     """Returns the complete HTML interface"""
@@ -34,6 +36,7 @@ def get_html_interface():
                 <div class="config-item">
                     <strong>Model:</strong>
                     <select id="modelSelector" onchange="updateModelDisplay()">
+                        <option value="auto">auto (fastest healthy)</option>
                         <option value="gemini-2.5-flash" selected>gemini-2.5-flash</option>
                         <option value="gemini-2.5-pro-max-thinking">gemini-2.5-pro-max-thinking</option>
                         <option value="gemini-2.5-pro">gemini-2.5-pro</option>
@@ -49,6 +52,13 @@ def get_html_interface():
                 <div class="config-item">
                     <strong>Mode:</strong> <span id="currentModeDisplay">Chat</span>
                 </div>
+                <div class="config-item">
+                    <strong>Debate Style:</strong>
+                    <select id="debateStyle">
+                        <option value="classic" selected>classic (serial)</option>
+                        <option value="panel">panel (concurrent)</option>
+                    </select>
+                </div>
             </div>
             
             <div class="params-grid">
@@ -86,23 +96,28 @@ def get_html_interface():
             <input type="text" id="messageInput" placeholder="Type your message..." 
                    onkeypress="if(event.key==='Enter') sendMessage()">
             <button class="send-btn" onclick="sendMessage()">Send</button>
+            <button class="stop-btn" onclick="stopStream()">Stop</button>
         </div>
     </div>
 
     <script>
         let currentMode = 'chat';
         let ws = null;
-        let conversationHistory = [];
         let isStreaming = false;
         
         // Initialize WebSocket connection on page load
         function initWebSocket() {
             if (ws && ws.readyState === WebSocket.OPEN) return;
             
-            ws = new WebSocket(`ws://localhost:8000/ws`);
+            // Offer the compact protocol first; ws.protocol tells which one the server picked
+            const sessionId = localStorage.getItem('sessionId');
+            const query = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : '';
+            ws = new WebSocket(`ws://localhost:8000/ws${query}`, [PROTOCOL_COMPACT, PROTOCOL_JSON]);
+            streamNames = {};
+            agentNames = {};
             
             ws.onopen = () => {
-                console.log('WebSocket connected');
+                console.log('WebSocket connected (' + (ws.protocol || 'json') + ')');
             };
             
             ws.onclose = () => {
@@ -117,42 +132,88 @@ def get_html_interface():
             ws.onmessage = handleWebSocketMessage;
         }
         
+        // Compact frames (see protocol.py): [type, stream, agent, body] with ids defined once per connection
+        const PROTOCOL_COMPACT = """ + json.dumps(COMPACT) + """;
+        const PROTOCOL_JSON = """ + json.dumps(JSON) + """;
+        const FRAME_TYPES = """ + json.dumps(FRAME_TYPES) + """;
+        let streamNames = {};
+        let agentNames = {};
+        
+        function decodeFrame(raw) {
+            if (!Array.isArray(raw)) return raw;
+            const [code, s, a, body] = raw;
+            const type = typeof code === 'number' ? FRAME_TYPES[code] : code;
+            if (type === 'stream') {
+                streamNames[s] = body;
+                return null;
+            }
+            if (type === 'agent') {
+                (agentNames[s] = agentNames[s] || {})[a] = body;
+                return null;
+            }
+            const frame = {type: type};
+            if (s !== undefined && s !== null) frame.stream_id = streamNames[s];
+            if (a !== undefined && a !== null) frame.agent = agentNames[s][a];
+            if (typeof body === 'string') frame.content = body;
+            else if (body) Object.assign(frame, body);
+            return frame;
+        }
+        
         function handleWebSocketMessage(event) {
-            const data = JSON.parse(event.data);
+            const data = decodeFrame(JSON.parse(event.data));
+            if (!data) return;
             const container = document.getElementById('chatContainer');
             
-            if (data.type === 'agent_start') {
-                currentAgent = data.agent;
-                streamContent = '';
-                
-                // Create unique ID with timestamp to avoid conflicts
-                const uniqueId = 'streaming-' + currentAgent + '-' + Date.now();
-                currentAgentDiv = document.createElement('div');
-                currentAgentDiv.id = uniqueId;
-                currentAgentDiv.className = 'agent-response typing';
-                currentAgentDiv.innerHTML = `<strong>${currentAgent.charAt(0).toUpperCase() + currentAgent.slice(1)}:</strong> `;
-                container.appendChild(currentAgentDiv);
+            if (data.type === 'session') {
+                // The server issues the id; keep it (it is the only key to this conversation)
+                localStorage.setItem('sessionId', data.session_id);
+                if (data.resumed) {
+                    addMessage('System', `Resumed session (${data.turns} earlier turns remembered).`, '#888');
+                }
+            } else if (data.type === 'agent_start') {
+                // Concurrent turns interleave frames, so track one stream per agent
+                activeStreams[streamKey(data)] = startAgentEntry(data.agent);
                 
             } else if (data.type === 'token') {
-                streamContent += data.content;
-                if (currentAgentDiv) {
-                    currentAgentDiv.innerHTML = `<strong>${currentAgent.charAt(0).toUpperCase() + currentAgent.slice(1)}:</strong> ${streamContent}`;
+                const stream = activeStreams[streamKey(data)];
+                if (stream) {
+                    if (!stream.content) stream.note.textContent = '';
+                    stream.content += data.content;
+                    stream.pending += data.content;  // written to the DOM on the next animation frame
+                    dirtyStreams.add(stream);
+                    scheduleRender();
+                }
+            } else if (data.type === 'queued' || data.type === 'retrying' || data.type === 'fallback') {
+                const stream = activeStreams[streamKey(data)];
+                if (stream && !stream.content) {
+                    stream.note.textContent = data.type === 'queued' ? `queued (#${data.position})`
+                        : data.type === 'retrying' ? `rate limited, retrying (${data.attempt})`
+                        : `${data.model} ${data.reason}, falling back to ${data.to}`;
                 }
             } else if (data.type === 'agent_end') {
-                if (currentAgentDiv) {
-                    currentAgentDiv.classList.remove('typing');
-                    conversationHistory.push({role: currentAgent.charAt(0).toUpperCase() + currentAgent.slice(1), content: streamContent});
+                const stream = activeStreams[streamKey(data)];
+                if (stream) {
+                    stream.div.classList.remove('typing');
+                    delete activeStreams[streamKey(data)];
                 }
             } else if (data.type === 'complete') {
                 isStreaming = false;
-                const statusDivs = container.querySelectorAll('.status');
-                statusDivs.forEach(div => div.remove());
+                removeStatus(container);
+            } else if (data.type === 'cancelled') {
+                isStreaming = false;
+                Object.values(activeStreams).forEach(stream => stream.div.classList.remove('typing'));
+                activeStreams = {};
+                removeStatus(container);
+                addMessage('System', 'Stopped.', '#888');
             } else if (data.type === 'error') {
                 isStreaming = false;
                 addMessage('System', 'Error: ' + data.content, '#ff6b6b');
             }
-            
-            container.scrollTop = container.scrollHeight;
+        }
+        
+        function removeStatus(container) {
+            container.querySelectorAll('.status').forEach(div => div.remove());
+            detached = detached.filter(el => !el.classList.contains('status'));
         }
         
         function setMode(mode) {
@@ -166,7 +227,11 @@ def get_html_interface():
         function clearChat() {
             document.getElementById('chatContainer').innerHTML = 
                 '<div class="status">Chat cleared. Ready for new conversation.</div>';
-            conversationHistory = [];
+            detached = [];
+            stickToBottom = true;
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                ws.send(JSON.stringify({type: 'reset', stream_id: STREAM_ID}));  // Drop server-side memory too
+            }
         }
         
         function updateModelDisplay() {
@@ -185,7 +250,11 @@ def get_html_interface():
                 top_p: parseFloat(document.getElementById('topP').value),
                 top_k: parseInt(document.getElementById('topK').value),
                 max_tokens: parseInt(document.getElementById('maxTokens').value),
-                system_prompt: document.getElementById('systemPrompt').value.trim()
+                system_prompt: document.getElementById('systemPrompt').value.trim(),
+                debate_style: document.getElementById('debateStyle').value,
+                // Coalesce tokens server-side into fewer, larger frames
+                flush_ms: 30,
+                flush_bytes: 1024
             };
         }
         
@@ -196,22 +265,108 @@ def get_html_interface():
             const message = input.value.trim();
             if (!message) return;
             
-            // Add user message
+            // Add user message (and jump back to the latest output)
+            stickToBottom = true;
             addMessage('You', message, '#4a9eff');
-            conversationHistory.push({role: 'User', content: message});
             input.value = '';
             
             // Start streaming
             startStream(currentMode === 'chat' ? 'prompt' : 'debate', message);
         }
         
+        function stopStream() {
+            // Server aborts the in-flight run immediately and replies with 'cancelled'
+            if (isStreaming && ws && ws.readyState === WebSocket.OPEN) {
+                ws.send(JSON.stringify({type: 'cancel', stream_id: STREAM_ID}));
+            }
+        }
+        
         function addMessage(role, content, color = '#e0e0e0') {
-            const container = document.getElementById('chatContainer');
             const div = document.createElement('div');
             div.className = 'message';
-            div.innerHTML = `<strong style="color: ${color};">${role}:</strong> ${content}`;
-            container.appendChild(div);
-            container.scrollTop = container.scrollHeight;
+            const label = document.createElement('strong');
+            label.style.color = color;
+            label.textContent = role + ':';
+            div.append(label, document.createTextNode(' ' + content));
+            appendEntry(div);
+        }
+        
+        function startAgentEntry(agent) {
+            // Label, transient status note, then one text node that tokens are appended to
+            const div = document.createElement('div');
+            div.className = 'agent-response typing';
+            const label = document.createElement('strong');
+            label.textContent = agentLabel(agent) + ': ';
+            const note = document.createElement('em');
+            const text = document.createTextNode('');
+            div.append(label, note, text);
+            appendEntry(div);
+            return {div: div, note: note, text: text, content: '', pending: ''};
+        }
+        
+        // Rendering: streamed text is appended (never re-parsed) once per animation frame, and only the
+        // newest RENDER_WINDOW entries stay in the DOM; older ones come back when the reader scrolls up
+        const RENDER_WINDOW = 200;
+        const RESTORE_BATCH = 50;
+        const earlier = document.createElement('div');
+        earlier.className = 'earlier';
+        let detached = [];            // entries taken out of the DOM, oldest first
+        let dirtyStreams = new Set();
+        let frameRequested = false;
+        let stickToBottom = true;     // follow new output unless the reader scrolled up
+        
+        function appendEntry(div) {
+            document.getElementById('chatContainer').appendChild(div);
+            scheduleRender();
+        }
+        
+        function scheduleRender() {
+            if (!frameRequested) {
+                frameRequested = true;
+                requestAnimationFrame(render);
+            }
+        }
+        
+        function render() {
+            frameRequested = false;
+            dirtyStreams.forEach(stream => {
+                stream.text.appendData(stream.pending);
+                stream.pending = '';
+            });
+            dirtyStreams.clear();
+            const container = document.getElementById('chatContainer');
+            if (stickToBottom) {
+                trimWindow(container);
+                container.scrollTop = container.scrollHeight;  // one layout per frame, not per token
+            }
+        }
+        
+        function trimWindow(container) {
+            // Only while following the tail, so nothing shifts under someone reading older output
+            let excess = container.childElementCount - (earlier.isConnected ? 1 : 0) - RENDER_WINDOW;
+            if (excess <= 0) return;
+            while (excess-- > 0) {
+                const oldest = earlier.isConnected ? earlier.nextElementSibling : container.firstElementChild;
+                oldest.remove();
+                detached.push(oldest);
+            }
+            if (!earlier.isConnected) container.prepend(earlier);
+            earlier.textContent = `${detached.length} earlier messages (scroll up to show)`;
+        }
+        
+        function onTranscriptScroll() {
+            const container = document.getElementById('chatContainer');
+            stickToBottom = container.scrollHeight - container.scrollTop - container.clientHeight < 40;
+            if (container.scrollTop < 40 && detached.length) {
+                const before = container.scrollHeight;
+                earlier.after(...detached.splice(-RESTORE_BATCH));
+                if (detached.length) {
+                    earlier.textContent = `${detached.length} earlier messages (scroll up to show)`;
+                } else {
+                    earlier.remove();
+                }
+                container.scrollTop += container.scrollHeight - before;  // keep the reader's place
+            }
         }
         
         function startStream(type, content) {
@@ -223,27 +378,39 @@ def get_html_interface():
             
             isStreaming = true;
             
-            const container = document.getElementById('chatContainer');
             const statusDiv = document.createElement('div');
             statusDiv.className = 'status';
             statusDiv.textContent = 'Streaming...';
-            container.appendChild(statusDiv);
+            appendEntry(statusDiv);
             
             ws.send(JSON.stringify({
                 type: type,
+                stream_id: STREAM_ID,
                 content: content,
-                history: conversationHistory,
                 config: getModelConfig()
             }));
         }
         
         // Initialize WebSocket when page loads
-        window.onload = initWebSocket;
+        window.onload = () => {
+            document.getElementById('chatContainer').addEventListener('scroll', onTranscriptScroll, {passive: true});
+            initWebSocket();
+        };
         
-        // Global variables for streaming
-        let currentAgent = '';
-        let streamContent = '';
-        let currentAgentDiv = null;
+        // This page runs one chat session; the protocol allows many per connection
+        const STREAM_ID = 'main';
+        
+        // In-flight agent streams keyed by stream id and agent name
+        let activeStreams = {};
+        
+        function streamKey(data) {
+            return (data.stream_id || '') + ':' + data.agent;
+        }
+        
+        function agentLabel(agent) {
+            const name = agent.replace(/_/g, ' ');
+            return name.charAt(0).toUpperCase() + name.slice(1);
+        }
     </script>
 </body>
 </html>
@@ -0,0 +1,12 @@
+"""
+Shared test setup: the app modules live in src/ (and the scraper in src/tools/) and import each other by
+module name, the same way `python hello_world.py` runs them
+"""
+
+import os
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path[:0] = [str(SRC), str(SRC / "tools")]
+os.environ.setdefault("PYDANTIC_AI_NO_BANNER", "1")
@@ -0,0 +1,68 @@
+"""
+FunctionModel-backed stand-ins for hello_world.create_agent: no provider, no network, scripted replies
+"""
+
+import asyncio
+import re
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.models.function import FunctionModel
+
+from streaming import Deps
+
+
+def last_prompt(messages) -> str:
+    for message in reversed(messages):
+        if isinstance(message, ModelRequest):
+            for part in reversed(message.parts):
+                if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                    return part.content
+    return ""
+
+
+def agent_factory(reply=lambda model, prompt: f"{model} answers", ttft=None, calls=None):
+    """create_agent(model, system_prompt=None, tools=True) whose agents stream reply(model, prompt) word by word
+
+    reply may return an exception to raise instead; ttft: model -> seconds before the first token;
+    calls: list that receives (model, prompt, messages) for every model request
+    """
+    ttft = ttft or {}
+
+    def create_agent(model, system_prompt: str = None, tools: bool = True):
+        name = model if isinstance(model, str) else model.model_name
+
+        def received(messages) -> str:
+            prompt = last_prompt(messages)
+            if calls is not None:
+                calls.append((name, prompt, messages))
+            return prompt
+
+        def answer(prompt: str) -> str:
+            text = reply(name, prompt)
+            if isinstance(text, BaseException):
+                raise text
+            return text
+
+        async def stream(messages, info):
+            prompt = received(messages)
+            if ttft.get(name):
+                await asyncio.sleep(ttft[name])
+            for word in re.findall(r"\S+\s*", answer(prompt)):
+                yield word
+
+        def complete(messages, info):
+            return ModelResponse(parts=[TextPart(answer(received(messages)))])
+
+        fake = FunctionModel(complete, stream_function=stream, model_name=name)
+        if system_prompt:
+            return Agent(fake, system_prompt=system_prompt)
+        agent = Agent(fake, deps_type=Deps)
+
+        @agent.system_prompt
+        def dynamic_system_prompt(ctx) -> str:
+            return ctx.deps.system_prompt
+
+        return agent
+
+    return create_agent
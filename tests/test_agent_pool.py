@@ -0,0 +1,47 @@
+"""
+Agent pool: agents are reused per (model, system prompt, tools) and evicted least recently used first
+"""
+
+import asyncio
+
+from fakes import agent_factory
+
+from agent_pool import AgentPool
+from memory import ConversationMemory
+from schemas import PromptMessage
+from streaming import run_request
+
+
+def test_reuses_agents_per_key_and_evicts_lru():
+    built = []
+
+    def factory(model, system_prompt=None, tools=True):
+        built.append((model, system_prompt, tools))
+        return object()
+
+    pool = AgentPool(factory, max_size=2)
+    a = pool.get("m1")
+    assert pool.get("m1") is a
+    assert pool.get("m1", tools=False) is not a  # internal runs get a tool-less agent of their own
+    pool.get("m1")                    # m1 is now the most recently used
+    pool.get("m2", system_prompt="x")  # evicts (m1, None, False)
+    assert pool.get("m1") is a
+    assert built == [("m1", None, True), ("m1", None, False), ("m2", "x", True)]
+    assert pool.stats() == {"size": 2, "max_size": 2, "hits": 3, "misses": 3, "evictions": 1}
+
+
+def test_turns_share_one_pooled_agent():
+    pool = AgentPool(agent_factory(), max_size=8)
+
+    async def main():
+        memory = ConversationMemory(None)
+
+        async def send(frame):
+            pass
+
+        for content in ("one", "two", "three"):
+            message = PromptMessage(content=content, config={"model": "m"})
+            await run_request(message, 0.0, send, memory, pool.get)
+
+    asyncio.run(main())
+    assert pool.stats()["misses"] == 1 and pool.stats()["hits"] == 2
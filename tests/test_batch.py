@@ -0,0 +1,105 @@
+"""
+Batch jobs: debate turns in order, checkpoint/resume, and the HTTP job registry
+"""
+
+import asyncio
+import json
+
+from fakes import agent_factory
+
+from batch import BatchJobs, run_batch
+
+
+def head(model, prompt):
+    """Reply with the prompt's lead-in, which names the debate turn ("Respond to", "Final reply to", ...)"""
+    return prompt.split(":")[0]
+
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_classic_debate_keeps_each_turn_of_a_repeat_speaker(tmp_path):
+    output = tmp_path / "results.jsonl"
+    lines = [json.dumps({"id": "d1", "type": "debate", "content": "tabs or spaces"})]
+    stats = asyncio.run(run_batch(lines, output, agent_factory(head)))
+
+    [record] = read_results(output)
+    assert stats.completed == 1 and record["status"] == "ok"
+    assert record["output"] == [
+        {"agent": "first", "text": "Start a discussion about"},
+        {"agent": "second", "text": "Respond to"},
+        {"agent": "first", "text": "Final reply to"},
+    ]
+
+
+def test_panel_debate_separates_interleaved_turns(tmp_path):
+    output = tmp_path / "results.jsonl"
+    config = {"debate_style": "panel", "debate_agents": 2, "debate_rounds": 2}
+    lines = [json.dumps({"id": "p", "type": "debate", "content": "x", "config": config})]
+    asyncio.run(run_batch(lines, output, agent_factory(lambda model, prompt: prompt.split()[0] + " " + prompt[-8:])))
+
+    turns = read_results(output)[0]["output"]
+    assert sorted(turn["agent"] for turn in turns) == ["panelist_1", "panelist_1", "panelist_2", "panelist_2"]
+    assert all(turn["text"].startswith("Give") for turn in turns[:2])
+    assert all(turn["text"].startswith("Topic") for turn in turns[2:])
+
+
+def test_rerun_skips_successes_and_retries_errors(tmp_path):
+    output = tmp_path / "results.jsonl"
+    lines = [
+        json.dumps({"id": "ok", "content": "hello"}),
+        json.dumps({"id": "flaky", "content": "boom"}),
+        "not json",
+    ]
+    calls = []
+    failing = agent_factory(lambda m, p: RuntimeError("provider down") if p == "boom" else "hi there", calls=calls)
+    stats = asyncio.run(run_batch(lines, output, failing))
+    assert (stats.completed, stats.failed) == (1, 2)
+    first = {r["id"]: r for r in read_results(output)}
+    assert first["ok"]["output"] == "hi there"
+    assert "provider down" in first["flaky"]["error"]
+    assert first["3"]["error"].startswith("Invalid JSON")
+
+    calls.clear()
+    stats = asyncio.run(run_batch(lines, output, agent_factory(lambda m, p: "recovered", calls=calls)))
+    assert stats.skipped == 1 and stats.completed == 1
+    assert [prompt for _, prompt, _ in calls] == ["boom"]
+    latest = {r["id"]: r for r in read_results(output)}  # later lines win, as on resume
+    assert latest["flaky"]["status"] == "ok" and latest["flaky"]["output"] == "recovered"
+
+
+def test_jobs_start_count_and_resume(tmp_path):
+    async def main():
+        jobs = BatchJobs(agent_factory(), directory=str(tmp_path))
+        body = b'{"id": "a", "content": "one"}\n\n{"id": "b", "content": "two"}\n'
+        status = await jobs.start(body, concurrency=2)
+        job_id = status["job_id"]
+        assert status["total"] == 2 and status["state"] == "running"
+        await jobs._jobs[job_id]["task"]
+        assert jobs.status(job_id)["state"] == "done" and jobs.status(job_id)["completed"] == 2
+
+        again = await jobs.resume(job_id)
+        await jobs._jobs[job_id]["task"]
+        assert again["total"] == 2
+        assert jobs.status(job_id)["skipped"] == 2
+        assert len(read_results(jobs.results_path(job_id))) == 2
+    asyncio.run(main())
+
+
+def test_batch_http_api(tmp_path):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routes import create_batch_router
+
+    app = FastAPI()
+    app.include_router(create_batch_router(BatchJobs(agent_factory(), directory=str(tmp_path))))
+    with TestClient(app) as client:
+        started = client.post("/batch?concurrency=2", content=b'{"id": "a", "content": "one"}\n')
+        assert started.status_code == 202 and started.json()["total"] == 1
+        job_id = started.json()["job_id"]
+        assert [job["job_id"] for job in client.get("/batch").json()] == [job_id]
+        assert client.get("/batch/ffff").status_code == 404
+        assert client.get("/batch/../etc").status_code == 404
+        assert client.post(f"/batch/{job_id}/resume").status_code == 202
+        assert client.delete(f"/batch/{job_id}").json()["job_id"] == job_id
@@ -0,0 +1,82 @@
+"""
+Token coalescing: byte and latency flush limits, the stream tail, and cancellation
+"""
+
+import asyncio
+
+from fakes import agent_factory
+
+from batching import FlushPolicy, TokenBatcher
+from streaming import stream_agent
+
+
+def collector():
+    frames = []
+
+    async def send(text):
+        frames.append(text)
+    return frames, send
+
+
+def test_immediate_policy_sends_every_delta():
+    async def main():
+        frames, send = collector()
+        batcher = TokenBatcher(send)
+        for chunk in ("a", "", "b"):
+            await batcher.add(chunk)
+        await batcher.close()
+        return frames
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_byte_limit_coalesces_deltas():
+    async def main():
+        frames, send = collector()
+        batcher = TokenBatcher(send, FlushPolicy(max_bytes=4))
+        for chunk in ("ab", "c", "de", "f"):
+            await batcher.add(chunk)
+        assert frames == ["abcde"]
+        await batcher.close()  # the tail goes out on close
+        return frames, batcher.frames
+    assert asyncio.run(main()) == (["abcde", "f"], 2)
+
+
+def test_latency_limit_flushes_a_quiet_stream():
+    async def main():
+        frames, send = collector()
+        batcher = TokenBatcher(send, FlushPolicy(max_latency_ms=30))
+        await batcher.add("a")
+        await batcher.add("b")
+        assert frames == []
+        await asyncio.sleep(0.08)
+        assert frames == ["ab"]  # the timer flushed without another delta arriving
+        await batcher.close()
+        return frames
+    assert asyncio.run(main()) == ["ab"]
+
+
+def test_cancel_drops_the_buffer_and_pending_timer():
+    async def main():
+        frames, send = collector()
+        batcher = TokenBatcher(send, FlushPolicy(max_latency_ms=20))
+        await batcher.add("never sent")
+        batcher.cancel()
+        await asyncio.sleep(0.05)
+        return frames
+    assert asyncio.run(main()) == []
+
+
+def test_stream_agent_frames_follow_the_policy():
+    async def main():
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        agent = agent_factory(lambda model, prompt: "one two three four five")("m", system_prompt="sys")
+        text = await stream_agent(send, agent, "primary", "q", FlushPolicy(max_bytes=8))
+        return text, [f["content"] for f in frames if f["type"] == "token"], frames
+    text, tokens, frames = asyncio.run(main())
+    assert text == "".join(tokens) == "one two three four five"
+    assert tokens == ["one two ", "three four ", "five"]
+    assert frames[0]["type"] == "agent_start" and frames[-1]["type"] == "agent_end"
@@ -0,0 +1,26 @@
+"""
+Offline load-test harness: boots the app on the fake model and drives both flows without errors
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARK = Path(__file__).resolve().parent.parent / "src" / "tools" / "benchmark.py"
+
+
+@pytest.mark.parametrize("protocol", ["json", "compact"])
+def test_benchmark_runs_both_flows_offline(protocol):
+    result = subprocess.run(
+        [sys.executable, str(BENCHMARK), "-c", "3", "-n", "2", "--flow", "both", "--tokens", "20",
+         "--rate", "0", "--protocol", protocol, "--json"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    results = json.loads(result.stdout)
+    assert [r["flow"] for r in results] == ["prompt", "debate"]
+    assert all(r["errors"] == 0 and r["clients"] == 3 for r in results)
+    assert all(r["ttft_ms"]["95"] >= r["ttft_ms"]["50"] > 0 for r in results)
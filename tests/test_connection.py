@@ -0,0 +1,85 @@
+"""
+WebSocket transport: bounded outbound queue, terminal frames that skip it, and cancelling a stream mid-turn
+"""
+
+import asyncio
+
+from fakes import agent_factory
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from connection import Connection
+from streaming import handle_websocket_stream
+
+
+class SlowSocket:
+    """Records text frames; each send waits until the test lets it through"""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+
+    async def send_text(self, message):
+        await self.gate.wait()
+        self.sent.append(message)
+
+
+def test_full_queue_blocks_producers_but_not_terminal_frames():
+    async def main():
+        socket = SlowSocket()
+        connection = Connection(socket, max_queue=2)
+        writer = asyncio.create_task(connection._write_loop())
+        await connection.send({"type": "token", "content": "a"})
+        await connection.send({"type": "token", "content": "b"})
+
+        blocked = asyncio.create_task(connection.send({"type": "token", "content": "c"}))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()  # the producer waits for the slow client
+        connection.send_terminal({"type": "cancelled"})  # never waits, even on a full queue
+
+        socket.gate.set()
+        await asyncio.wait_for(blocked, 1)
+        await asyncio.sleep(0.05)
+        writer.cancel()
+        return socket.sent
+
+    sent = asyncio.run(main())
+    assert sent == [
+        '{"type":"token","content":"a"}', '{"type":"token","content":"b"}',
+        '{"type":"cancelled"}', '{"type":"token","content":"c"}',
+    ]
+
+
+def make_app(create_agent):
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await handle_websocket_stream(websocket, create_agent)
+
+    return app
+
+
+def until(ws, frame_type):
+    frames = []
+    while not frames or frames[-1]["type"] != frame_type:
+        frames.append(ws.receive_json())
+    return frames
+
+
+def test_cancel_ends_the_stream_with_no_tokens_after_it():
+    create_agent = agent_factory(lambda model, prompt: f"slow answer to {prompt}", ttft={"m": 0.3})
+    with TestClient(make_app(create_agent)) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.receive_json()  # session
+            ws.send_json({"type": "prompt", "content": "first", "config": {"model": "m"}})
+            assert until(ws, "agent_start")[-1]["stream_id"] == "default"
+            ws.send_json({"type": "cancel"})
+            frames = until(ws, "cancelled")
+            assert [f["type"] for f in frames] == ["cancelled"]
+
+            # The next turn on the same stream streams cleanly: nothing of the cancelled one leaks in
+            ws.send_json({"type": "prompt", "content": "second", "config": {"model": "m"}})
+            frames = until(ws, "complete")
+    text = "".join(f["content"] for f in frames if f["type"] == "token")
+    assert text == "slow answer to second"
@@ -0,0 +1,128 @@
+"""
+Gemini context cache: what goes into the cached system instruction, prefix matching against live
+handles, single-flight creation and cleanup
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from pydantic_ai.messages import (
+    ModelRequest, ModelResponse, SystemPromptPart, TextPart, ToolCallPart, ToolReturnPart, UserPromptPart
+)
+
+from context_cache import CacheHandle, ContextCache, _prefix_hashes, system_instruction, to_contents
+
+MODEL = "gemini-2.5-flash"
+
+
+def turn(question, answer, system=None):
+    parts = ([SystemPromptPart(system)] if system else []) + [UserPromptPart(question)]
+    return [ModelRequest(parts=parts), ModelResponse(parts=[TextPart(answer)])]
+
+
+class FakeCaches:
+    """The client.aio.caches calls ContextCache makes"""
+
+    def __init__(self):
+        self.created, self.deleted = [], []
+
+    async def create(self, model, config):
+        self.created.append((model, config))
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}",
+                               usage_metadata=SimpleNamespace(total_token_count=4096))
+
+    async def delete(self, name):
+        self.deleted.append(name)
+
+
+def fake_client():
+    return SimpleNamespace(aio=SimpleNamespace(caches=FakeCaches()))
+
+
+def test_system_instruction_includes_the_summary():
+    fresh = system_instruction("agent prompt", [])
+    assert fresh == "agent prompt"
+    history = turn("q", "a", system="agent prompt") + [
+        ModelRequest(parts=[SystemPromptPart("Summary of earlier turns")])
+    ]
+    assert system_instruction("agent prompt", history) == "agent prompt\n\nSummary of earlier turns"
+
+
+def test_messages_map_to_gemini_contents():
+    messages = [
+        ModelRequest(parts=[SystemPromptPart("sys"), UserPromptPart("find docs")]),
+        ModelResponse(parts=[ToolCallPart("search_docs", {"query": "cache"})]),
+        ModelRequest(parts=[ToolReturnPart("search_docs", "excerpt")]),
+    ]
+    assert to_contents(messages) == [
+        {"role": "user", "parts": [{"text": "find docs"}]},
+        {"role": "model", "parts": [{"function_call": {"name": "search_docs", "args": {"query": "cache"}}}]},
+        {"role": "user", "parts": [{"function_response": {
+            "name": "search_docs", "response": {"return_value": "excerpt"}
+        }}]},
+    ]
+
+
+def test_prefix_hashes_depend_on_system_prompt_and_every_message():
+    history = turn("q0", "a0") + turn("q1", "a1")
+    hashes = _prefix_hashes("sys", history)
+    assert len(hashes) == 5 and len(set(hashes)) == 5
+    assert _prefix_hashes("sys", history[:2]) == hashes[:3]
+    assert _prefix_hashes("other", history)[2] != hashes[2]
+
+
+def test_longest_live_prefix_is_reused():
+    async def main():
+        cache = ContextCache(client=fake_client())
+        history = turn("q0", "a0") + turn("q1", "a1") + [ModelRequest(parts=[UserPromptPart("q2")])]
+        hashes = _prefix_hashes("sys", history)
+        future = time.monotonic() + 300
+        cache._handles[(MODEL, hashes[2])] = CacheHandle("cachedContents/short", MODEL, 2000, future, 2)
+        cache._handles[(MODEL, hashes[4])] = CacheHandle("cachedContents/long", MODEL, 3000, future, 4)
+
+        settings, sent = cache.prepare(MODEL, "sys", history)
+        assert settings == {"google_cached_content": "cachedContents/long"} and sent == history[4:]
+        assert cache.prepare("gpt-4o", "sys", history) == ({}, history)  # only Gemini models cache
+
+        cache._handles[(MODEL, hashes[4])].expires_at = time.monotonic() - 1
+        settings, sent = cache.prepare(MODEL, "sys", history)
+        assert settings == {"google_cached_content": "cachedContents/short"} and sent == history[2:]
+        return cache.stats()
+
+    stats = asyncio.run(main())
+    assert stats["hits"] == 2 and stats["misses"] == 0 and stats["live"] == 1
+
+
+def test_small_prefixes_are_not_worth_caching():
+    async def main():
+        cache = ContextCache(client=fake_client())
+        history = turn("q", "a")
+        assert cache.prepare(MODEL, "short prompt", history) == ({}, history)
+        return cache
+
+    cache = asyncio.run(main())
+    assert not cache._creating and cache.stats()["misses"] == 1
+
+
+def test_creation_is_single_flight_and_close_deletes_what_was_created():
+    pytest.importorskip("google.genai")
+
+    async def main():
+        client = fake_client()
+        cache = ContextCache(client=client)
+        big = "Follow these rules. " * 1000
+        cache.prepare(MODEL, big, [])
+        cache.prepare(MODEL, big, [])
+        await asyncio.gather(*cache._creating.values())
+        assert len(client.aio.caches.created) == 1
+        model, config = client.aio.caches.created[0]
+        assert model == MODEL and config.system_instruction == big
+
+        settings, _ = cache.prepare(MODEL, big, [])
+        assert settings == {"google_cached_content": "cachedContents/1"}
+        await cache.close()
+        return client.aio.caches.deleted
+
+    assert asyncio.run(main()) == ["cachedContents/1"]
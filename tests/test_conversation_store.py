@@ -0,0 +1,104 @@
+"""
+Conversation store: write-behind persistence and rehydration, server-minted session ids that only
+their holder can resume, and the bearer-authenticated transcript route
+"""
+
+import asyncio
+
+from fakes import agent_factory
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+from conversation_store import ConversationStore, create_conversation_store
+from routes import create_session_router
+from streaming import handle_websocket_stream
+
+
+async def never_summarize(prompt):
+    raise AssertionError("under budget, nothing to summarize")
+
+
+def turn(i):
+    return [ModelRequest(parts=[UserPromptPart(f"q{i}")]), ModelResponse(parts=[TextPart(f"a{i}")])]
+
+
+def test_persistence_is_opt_in(monkeypatch):
+    monkeypatch.delenv("CONVERSATION_STORE", raising=False)
+    assert create_conversation_store() is None
+    monkeypatch.setenv("CONVERSATION_STORE", "memory")
+    assert create_conversation_store().stats()["persistent"] is False
+
+
+def test_turns_are_written_behind_and_rehydrated(tmp_path):
+    path = str(tmp_path / "c.db")
+
+    async def write():
+        store = ConversationStore(path, flush_ms=10_000)
+        memory = await store.memory("s1", "main", never_summarize, 6000)
+        memory.add_turn(turn(0))
+        memory.add_turn(turn(1))
+        assert store.stats()["pending_writes"] == 2 and store.writes == 0  # nothing on disk yet
+        await store.close()
+        assert store.writes == 2
+
+    async def read():
+        store = ConversationStore(path)
+        memory = await store.memory("s1", "main", never_summarize, 6000)
+        history = await memory.history("sys")
+        assert memory.turn_count == 2 and len(history) == 4
+        assert [t["text"] for t in await store.transcript("s1")] == ["User: q0\nAssistant: a0", "User: q1\nAssistant: a1"]
+        assert await store.transcript("other") == []
+        await store.close()
+
+    asyncio.run(write())
+    asyncio.run(read())
+
+
+def make_app(store):
+    app = FastAPI()
+    create_agent = agent_factory(lambda model, prompt: f"echo {prompt}")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await handle_websocket_stream(websocket, create_agent, store=store)
+
+    app.include_router(create_session_router(store))
+    return app
+
+
+def chat(client, query, content):
+    with client.websocket_connect("/ws" + query) as ws:
+        session = ws.receive_json()
+        if content:
+            ws.send_json({"type": "prompt", "content": content, "stream_id": "main"})
+            while ws.receive_json()["type"] != "complete":
+                pass
+    return session
+
+
+def test_only_server_issued_ids_resume(tmp_path):
+    store = ConversationStore(str(tmp_path / "c.db"))
+    with TestClient(make_app(store)) as client:
+        guessed = chat(client, "?session_id=guessed", "hello")
+        assert guessed["session_id"] != "guessed" and not guessed["resumed"]
+        assert len(guessed["session_id"]) >= 40
+
+        resumed = chat(client, f"?session_id={guessed['session_id']}", None)
+        assert resumed["session_id"] == guessed["session_id"] and resumed["resumed"] and resumed["turns"] == 1
+
+        fresh = chat(client, "", None)
+        assert fresh["session_id"] != guessed["session_id"] and not fresh["resumed"]
+
+
+def test_transcript_requires_the_bearer_session_id(tmp_path):
+    store = ConversationStore(str(tmp_path / "c.db"))
+    with TestClient(make_app(store)) as client:
+        session_id = chat(client, "", "hello")["session_id"]
+
+        assert client.get("/session/transcript").status_code == 401
+        assert client.get("/session/transcript", headers={"Authorization": "Bearer nope"}).status_code == 404
+        response = client.get("/session/transcript", headers={"Authorization": f"Bearer {session_id}"})
+        assert response.status_code == 200
+        assert [t["text"] for t in response.json()] == ["User: hello\nAssistant: echo hello"]
+        assert client.get("/sessions").status_code == 404  # no listing to enumerate ids from
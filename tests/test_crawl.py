@@ -0,0 +1,199 @@
+"""
+Crawler against a local fixture HTTP server: concurrent workers, retries on 429/5xx,
+304/unchanged pages on re-runs through the crawl manifest, resumed runs and pages streamed
+straight into the retrieval index
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "tools"))
+
+from manifest import CrawlManifest  # noqa: E402
+from pipeline import scrape  # noqa: E402
+
+SENTENCE = "The crawler fixture page explains one topic in enough words for extraction to keep it. "
+
+
+def page_html(name: str) -> bytes:
+    paragraphs = "".join(f"<p>{name}: {SENTENCE * 3}</p>" for _ in range(4))
+    return (
+        f"<html><head><title>{name}</title></head><body><article><h1>{name}</h1>"
+        f"{paragraphs}</article></body></html>"
+    ).encode("utf-8")
+
+
+class FixtureSite:
+    """Threaded HTTP server with scripted failures, ETags and an in-flight request gauge"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.failures = {}      # path -> list of statuses to answer before succeeding
+        self.etags = True
+        self.hits = {}          # path -> requests seen
+        self.not_modified = 0   # 304s answered
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def handle(self, request):
+        path = request.path
+        with self._lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            scripted = self.failures.get(path)
+            status = scripted.pop(0) if scripted else 200
+        try:
+            time.sleep(self.delay)
+            if status != 200:
+                request.send_response(status)
+                request.send_header("Retry-After", "0")
+                request.send_header("Content-Length", "0")
+                request.end_headers()
+                return
+            etag = f'"{path}-v1"'
+            if self.etags and request.headers.get("If-None-Match") == etag:
+                with self._lock:
+                    self.not_modified += 1
+                request.send_response(304)
+                request.end_headers()
+                return
+            body = page_html(path.strip("/"))
+            request.send_response(200)
+            request.send_header("Content-Type", "text/html; charset=utf-8")
+            request.send_header("Content-Length", str(len(body)))
+            if self.etags:
+                request.send_header("ETag", etag)
+            request.end_headers()
+            request.wfile.write(body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class ListSink:
+    def __init__(self):
+        self.pages = []
+
+    def write(self, page):
+        self.pages.append(page)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = FixtureSite()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def run_scrape(urls, **kwargs):
+    sink = ListSink()
+    stats = asyncio.run(scrape(urls, sink, rate_per_host=0, **kwargs))
+    return stats, sink
+
+
+def test_workers_fetch_concurrently(site):
+    site.delay = 0.2
+    urls = [site.url(f"/page{i}") for i in range(8)]
+    started = time.monotonic()
+    stats, sink = run_scrape(urls, workers=4)
+    elapsed = time.monotonic() - started
+
+    assert stats.saved == 8 and stats.failed == 0
+    assert sorted(page.url for page in sink.pages) == sorted(urls)
+    assert 1 < site.max_in_flight <= 4
+    assert elapsed < 8 * site.delay  # sequential fetching would take at least this long
+
+
+def test_retries_on_429_and_5xx(site):
+    site.failures = {"/limited": [429], "/flaky": [503, 502], "/down": [500] * 10}
+    stats, sink = run_scrape([site.url("/limited"), site.url("/flaky"), site.url("/down")], workers=3, retries=2)
+
+    assert {page.url for page in sink.pages} == {site.url("/limited"), site.url("/flaky")}
+    assert site.hits["/limited"] == 2
+    assert site.hits["/flaky"] == 3
+    assert site.hits["/down"] == 3  # first try plus two retries, then reported as failed
+    assert stats.saved == 2 and stats.failed == 1
+
+
+def test_rerun_with_manifest_sends_validators_and_skips_unchanged(site, tmp_path):
+    urls = [site.url(f"/doc{i}") for i in range(3)]
+    manifest = CrawlManifest(tmp_path / "manifest.sqlite")
+    stats, sink = run_scrape(urls, workers=2, manifest=manifest)
+    assert stats.saved == 3
+
+    # Second run: the server answers If-None-Match with 304, nothing is re-emitted
+    stats, sink = run_scrape(urls, workers=2, manifest=manifest)
+    assert site.not_modified == 3
+    assert stats.unchanged == 3 and stats.saved == 0 and sink.pages == []
+
+    # Without validators the page is refetched, but an identical content hash still counts as unchanged
+    site.etags = False
+    stats, sink = run_scrape(urls, workers=2, manifest=manifest)
+    assert site.not_modified == 3
+    assert stats.unchanged == 3 and stats.saved == 0
+    manifest.close()
+
+
+def test_interrupted_run_resumes_and_sitemap_lastmod_skips_fetches(site, tmp_path):
+    urls = [site.url(f"/doc{i}") for i in range(4)]
+    manifest = CrawlManifest(tmp_path / "manifest.sqlite")
+    run_id, resume_since = manifest.begin_run("sitemap.xml")
+    assert resume_since is None
+    run_scrape(urls[:2], workers=2, manifest=manifest)  # interrupted after two pages
+
+    run_id_again, resume_since = manifest.begin_run("sitemap.xml")
+    assert run_id_again == run_id and resume_since is not None
+    stats, sink = run_scrape(urls, workers=2, manifest=manifest, resume_since=resume_since)
+    assert stats.skipped == 2 and stats.saved == 2
+    assert {page.url for page in sink.pages} == set(urls[2:])
+    assert site.hits == {f"/doc{i}": 1 for i in range(4)}
+    manifest.finish_run(run_id)
+    assert manifest.begin_run("sitemap.xml")[1] is None
+
+    lastmods = {url: "2026-01-01" for url in urls}
+    run_scrape(urls, workers=2, manifest=manifest, lastmods=lastmods)
+    stats, sink = run_scrape(urls, workers=2, manifest=manifest, lastmods=lastmods)
+    assert stats.skipped == 4 and stats.pages == 0  # unchanged <lastmod>: not even a conditional request
+    manifest.close()
+
+
+def test_pages_are_indexed_without_intermediate_files(site, tmp_path):
+    from pipeline import IndexSink
+    from retrieval import DocsIndex
+
+    index_dir = tmp_path / "index"
+    stats = asyncio.run(scrape(
+        [site.url("/alpha"), site.url("/beta")], IndexSink(index_dir), workers=2, rate_per_host=0, chunk=True
+    ))
+    assert stats.saved == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index"]  # nothing but the index itself
+    results = DocsIndex(index_dir).search("beta crawler fixture", k=1)
+    assert results[0]["file"] == "stream:" + site.url("/beta")
@@ -0,0 +1,111 @@
+"""
+Hedged requests: the first token decides the race, the loser is cancelled, and the router is credited
+with the model that actually answered
+"""
+
+import asyncio
+
+import pytest
+from fakes import agent_factory
+
+from metrics import TurnTiming
+from routing import ModelRouter, race_first_token
+from scheduler import ProviderScheduler
+from streaming import Hedge, stream_agent
+
+
+def run_hedged(ttft, hedge_delay=0.05, router=None, scheduler=None, reply=None, calls=None):
+    """Stream one turn on model "primary", hedged with model "backup"; (frames, timing, text)"""
+    calls = [] if calls is None else calls
+    create_agent = agent_factory(reply or (lambda model, prompt: f"from {model}"), ttft=ttft, calls=calls)
+    frames = []
+
+    async def send(frame):
+        frames.append(frame)
+
+    async def main():
+        timing = TurnTiming(model="primary", agent="primary", received_at=0)
+        text = await stream_agent(
+            send, create_agent("primary", system_prompt="sys"), "primary", "q", timing=timing,
+            router=router, scheduler=scheduler,
+            hedge=Hedge(hedge_delay, "backup", create_agent("backup", system_prompt="sys")),
+        )
+        return timing, text
+
+    timing, text = asyncio.run(main())
+    return frames, timing, text
+
+
+def tokens(frames):
+    return "".join(frame["content"] for frame in frames if frame["type"] == "token")
+
+
+def test_fast_primary_never_launches_the_hedge():
+    calls = []
+    frames, timing, text = run_hedged({"primary": 0.0, "backup": 0.0}, hedge_delay=0.5, calls=calls)
+    assert text == tokens(frames) == "from primary"
+    assert [model for model, _, _ in calls] == ["primary"]
+    assert timing.model == "primary"
+
+
+def test_hedge_wins_against_a_slow_primary_and_is_credited():
+    router = ModelRouter(["primary", "backup"])
+    frames, timing, text = run_hedged({"primary": 1.0, "backup": 0.0}, hedge_delay=0.05, router=router)
+    assert text == tokens(frames) == "from backup"
+    assert timing.model == "backup"
+    backup, primary = router.health["backup"], router.health["primary"]
+    assert list(backup.outcomes) == [True] and backup.ttfts[0] < 0.5
+    # The beaten primary is sampled with a lower bound of its TTFT, never the hedge's
+    assert list(primary.outcomes) == [True] and primary.ttfts[0] >= 0.05
+
+
+def test_primary_winning_after_the_hedge_started_cancels_the_hedge():
+    router = ModelRouter(["primary", "backup"])
+    calls = []
+    frames, timing, text = run_hedged({"primary": 0.15, "backup": 1.0}, hedge_delay=0.05,
+                                      router=router, calls=calls)
+    assert text == tokens(frames) == "from primary"
+    assert sorted(model for model, _, _ in calls) == ["backup", "primary"]
+    assert "backup" not in router.health  # a beaten hedge says nothing about its speed
+
+
+def test_failed_hedge_leaves_the_primary_running():
+    reply = lambda model, prompt: RuntimeError("backup down") if model == "backup" else f"from {model}"
+    frames, timing, text = run_hedged({"primary": 0.15}, hedge_delay=0.05, reply=reply)
+    assert text == "from primary" and timing.model == "primary"
+
+
+def test_hedge_holds_a_scheduler_slot_of_its_own():
+    scheduler = ProviderScheduler(concurrency={"*": 1})
+    frames, timing, text = run_hedged({"primary": 1.0}, hedge_delay=0.05, scheduler=scheduler)
+    assert text == "from backup"
+    stats = scheduler.stats()
+    assert stats["primary"]["active"] == 0 and stats["backup"]["active"] == 0
+
+
+def test_race_raises_the_last_error_when_every_contestant_fails():
+    async def fail(message, after):
+        await asyncio.sleep(after)
+        raise RuntimeError(message)
+
+    async def main():
+        return await race_first_token(lambda claim: fail("primary", 0.1), lambda claim: fail("hedge", 0.0), 0.01)
+
+    with pytest.raises(RuntimeError, match="primary"):
+        asyncio.run(main())
+
+
+def test_hedge_reserves_the_same_token_estimate_as_the_primary():
+    scheduler = ProviderScheduler(tpm={"*": 100_000})
+    reserved = []
+    acquire = scheduler.acquire
+
+    async def recording_acquire(model, client="default", cost=1, *args, **kwargs):
+        reserved.append((model, cost))
+        return await acquire(model, client, cost, *args, **kwargs)
+
+    scheduler.acquire = recording_acquire
+    frames, timing, text = run_hedged({"primary": 1.0}, hedge_delay=0.05, scheduler=scheduler)
+    assert text == "from backup"
+    (_, primary_cost), (hedge_model, hedge_cost) = reserved
+    assert hedge_model == "backup" and hedge_cost == primary_cost > 1
@@ -0,0 +1,122 @@
+"""
+Token-budgeted conversation memory: compaction into a rolling summary, and resets racing a summary
+"""
+
+import asyncio
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from pydantic_ai.models.function import FunctionModel
+
+from memory import ConversationMemory
+
+
+def turn(i: int, words: int = 40):
+    return [ModelRequest(parts=[UserPromptPart(f"question {i} " + "word " * words)]),
+            ModelResponse(parts=[TextPart(f"answer {i}")])]
+
+
+def summarizer(release: asyncio.Event = None, prompts: list = None):
+    """summarize(prompt) backed by a FunctionModel agent; waits for `release` before answering"""
+    async def reply(messages, info):
+        if release is not None:
+            await release.wait()
+        prompt = messages[-1].parts[-1].content
+        if prompts is not None:
+            prompts.append(prompt)
+        return ModelResponse(parts=[TextPart(f"summary #{len(prompts or [])}")])
+
+    agent = Agent(FunctionModel(reply))
+
+    async def summarize(prompt: str) -> str:
+        return (await agent.run(prompt)).output
+    return summarize
+
+
+def system_parts(messages):
+    return [p.content for p in messages[0].parts if isinstance(p, SystemPromptPart)]
+
+
+def test_under_budget_keeps_every_turn():
+    async def main():
+        memory = ConversationMemory(summarizer(), token_budget=10_000)
+        memory.add_turn(turn(0))
+        memory.add_turn(turn(1))
+        history = await memory.history("be brief")
+        assert len(history) == 4
+        assert system_parts(history) == ["be brief"]
+        assert memory.summary == "" and memory.compacted == 0
+    asyncio.run(main())
+
+
+def test_compaction_folds_oldest_turns_into_summary():
+    async def main():
+        prompts, saved = [], []
+        memory = ConversationMemory(summarizer(prompts=prompts), token_budget=100,
+                                    on_summary=lambda summary, compacted: saved.append((summary, compacted)))
+        for i in range(4):
+            memory.add_turn(turn(i))
+        history = await memory.history("be brief")
+
+        assert memory.compacted > 0 and memory.tokens <= 100
+        assert "question 0" in prompts[0]  # the oldest turn went to the summarizer
+        assert system_parts(history) == ["be brief", "Summary of the earlier conversation:\nsummary #1"]
+        assert saved == [("summary #1", memory.compacted)]
+        assert len(history) == 2 * (4 - memory.compacted)
+    asyncio.run(main())
+
+
+def test_reset_discards_summary_in_flight():
+    async def main():
+        release = asyncio.Event()
+        saved = []
+        memory = ConversationMemory(summarizer(release, prompts=[]), token_budget=100,
+                                    on_summary=lambda summary, compacted: saved.append(summary))
+        for i in range(4):
+            memory.add_turn(turn(i))
+        compaction = memory._compaction
+        await asyncio.sleep(0)  # the summarizer is now waiting on `release`
+
+        memory.clear()
+        release.set()
+        await asyncio.wait([compaction], timeout=5)
+        assert compaction.cancelled()
+
+        memory.add_turn(turn(9, words=1))
+        history = await memory.history("be brief")
+        assert memory.summary == ""
+        assert system_parts(history) == ["be brief"]
+        assert saved == [""]  # only the reset itself was recorded
+    asyncio.run(main())
+
+
+def test_summary_finishing_after_reset_is_dropped():
+    async def main():
+        release = asyncio.Event()
+        saved = []
+        memory = ConversationMemory(summarizer(release, prompts=[]), token_budget=10_000,
+                                    on_summary=lambda summary, compacted: saved.append(summary))
+        for i in range(4):
+            memory.add_turn(turn(i))
+        # A compaction clear() doesn't know about still must not write its summary back
+        memory.token_budget = 100
+        compaction = asyncio.create_task(memory.compact())
+        await asyncio.sleep(0)
+        memory.clear()
+        release.set()
+        await asyncio.wait_for(compaction, 5)
+        assert memory.summary == "" and saved == [""]
+    asyncio.run(main())
+
+
+def test_history_survives_reset_while_waiting_for_compaction():
+    async def main():
+        release = asyncio.Event()
+        memory = ConversationMemory(summarizer(release, prompts=[]), token_budget=100)
+        for i in range(4):
+            memory.add_turn(turn(i))
+        waiting = asyncio.create_task(memory.history("be brief"))
+        await asyncio.sleep(0)
+        memory.clear()
+        assert await asyncio.wait_for(waiting, 5) == []
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Turn latency instrumentation: the Prometheus exposition and the per-turn timing frame
+"""
+
+import asyncio
+import time
+
+from fakes import agent_factory
+
+from memory import ConversationMemory
+from metrics import REGISTRY, Registry
+from schemas import PromptMessage
+from streaming import run_request
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    turns = registry.counter("turns_total", "Turns")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    turns.inc(model="m")
+    turns.inc(2, model="m")
+    latency.observe(0.05, model="m")
+    latency.observe(0.5, model="m")
+    latency.observe(5, model="m")
+    assert registry.render().splitlines() == [
+        "# HELP turns_total Turns",
+        "# TYPE turns_total counter",
+        'turns_total{model="m"} 3',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{model="m",le="0.1"} 1',
+        'latency_seconds_bucket{model="m",le="1"} 2',
+        'latency_seconds_bucket{model="m",le="+Inf"} 3',
+        'latency_seconds_sum{model="m"} 5.55',
+        'latency_seconds_count{model="m"} 3',
+    ]
+
+
+def run_turn(config):
+    frames = []
+    create_agent = agent_factory(lambda model, prompt: "one two three four", ttft={"timed": 0.1})
+
+    async def main():
+        async def send(frame):
+            frames.append(frame)
+
+        message = PromptMessage(content="hello", config=config)
+        await run_request(message, time.monotonic(), send, ConversationMemory(None), create_agent)
+
+    asyncio.run(main())
+    return frames
+
+
+def test_timing_frame_follows_the_turn():
+    frames = run_turn({"model": "timed", "timing": True})
+    types = [frame["type"] for frame in frames]
+    assert types[-3:] == ["timing", "agent_end", "complete"]
+    timing = frames[-3]
+    assert timing["agent"] == "primary" and timing["model"] == "timed" and timing["source"] == "live"
+    assert 90 <= timing["ttft_ms"] <= timing["stream_ms"]
+    assert timing["queue_wait_ms"] < timing["ttft_ms"] and timing["tokens_out"] == 4
+
+    assert "timing" not in [frame["type"] for frame in run_turn({"model": "timed"})]  # opt-in
+
+
+def test_turns_are_published_to_the_registry():
+    run_turn({"model": "timed"})
+    text = REGISTRY.render()
+    assert 'agent_turns_total{agent="primary",model="timed",outcome="ok",source="live"}' in text
+    assert 'agent_ttft_seconds_count{agent="primary",model="timed"}' in text
@@ -0,0 +1,88 @@
+"""
+Stream multiplexing: concurrent streams on one connection, the per-connection limit and per-stream resets
+"""
+
+import time
+
+from fakes import agent_factory
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from streaming import handle_websocket_stream
+
+
+def make_app(create_agent):
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await handle_websocket_stream(websocket, create_agent)
+
+    return app
+
+
+def prompt(ws, stream_id, content):
+    ws.send_json({"type": "prompt", "content": content, "stream_id": stream_id, "config": {"model": "m"}})
+
+
+def collect(ws, streams):
+    """Frames per stream until every one of `streams` has completed"""
+    frames = {sid: [] for sid in streams}
+    pending = set(streams)
+    while pending:
+        frame = ws.receive_json()
+        frames.setdefault(frame.get("stream_id"), []).append(frame)
+        if frame["type"] == "complete":
+            pending.discard(frame["stream_id"])
+    return frames
+
+
+def text(frames):
+    return "".join(f["content"] for f in frames if f["type"] == "token")
+
+
+def test_streams_run_concurrently_and_stay_separate():
+    create_agent = agent_factory(lambda model, prompt: f"answer to {prompt}", ttft={"m": 0.3})
+    with TestClient(make_app(create_agent)) as client, client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        started = time.perf_counter()
+        for sid in ("a", "b", "c"):
+            prompt(ws, sid, f"question {sid}")
+        frames = collect(ws, ["a", "b", "c"])
+        assert time.perf_counter() - started < 0.8  # ~0.3s side by side, ~0.9s one after another
+    assert {sid: text(frames[sid]) for sid in "abc"} == {sid: f"answer to question {sid}" for sid in "abc"}
+
+
+def test_stream_limit_and_busy_stream_are_rejected(monkeypatch):
+    monkeypatch.setenv("MAX_STREAMS_PER_CONNECTION", "2")
+    create_agent = agent_factory(ttft={"m": 0.3})
+    with TestClient(make_app(create_agent)) as client, client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        prompt(ws, "a", "one")
+        prompt(ws, "a", "again")
+        prompt(ws, "b", "two")
+        prompt(ws, "c", "three")
+        frames = collect(ws, ["a", "b"])
+    errors = [f for sid in frames for f in frames[sid] if f["type"] == "error"]
+    assert [(f["stream_id"], f["content"]) for f in errors] == [
+        ("a", "A response is already streaming - cancel it first."),
+        ("c", "Too many concurrent streams (limit 2)."),
+    ]
+
+
+def test_reset_targets_one_stream():
+    calls = []
+    create_agent = agent_factory(calls=calls)
+    with TestClient(make_app(create_agent)) as client, client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        for sid in ("a", "b"):
+            prompt(ws, sid, "first")
+            collect(ws, [sid])
+        ws.send_json({"type": "reset", "stream_id": "a"})
+        for sid in ("a", "b"):
+            prompt(ws, sid, "second")
+            collect(ws, [sid])
+    # history sent with the second turn: a starts over, b still carries its first exchange
+    second_a, second_b = calls[2][2], calls[3][2]
+    assert len(second_a) < len(second_b)
+    assert "first" not in str(second_a) and "first" in str(second_b)
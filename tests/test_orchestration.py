@@ -0,0 +1,67 @@
+"""
+Debate plans: validation, dependency order, concurrent independent turns and error propagation
+"""
+
+import asyncio
+import time
+
+import pytest
+from fakes import agent_factory
+
+from orchestration import Plan, Turn, build_debate_plan, classic_debate, panel_debate, run_plan
+from schemas import RequestConfig
+
+
+def turn_runner(create_agent):
+    """run_turn over fake agents, one per plan agent (the model name is the agent name)"""
+    async def run_turn(turn, prompt):
+        result = await create_agent(turn.agent, system_prompt="sys").run(prompt)
+        return result.output
+    return run_turn
+
+
+@pytest.mark.parametrize("turns, message", [
+    ([Turn("a", "x", "{content}"), Turn("a", "x", "{content}")], "unique"),
+    ([Turn("content", "x", "{content}")], "unique"),
+    ([Turn("a", "ghost", "{content}")], "unknown agent"),
+    ([Turn("a", "x", "{b}", ["b"])], "unknown turns"),
+    ([Turn("a", "x", "{b}", ["b"]), Turn("b", "x", "{a}", ["a"])], "Cyclic"),
+])
+def test_validate_rejects_broken_plans(turns, message):
+    with pytest.raises(ValueError, match=message):
+        Plan(agents={"x": "sys"}, turns=turns).validate()
+
+
+def test_classic_debate_feeds_each_turn_the_previous_one():
+    create_agent = agent_factory(lambda model, prompt: f"<{model}: {prompt}>")
+    outputs = asyncio.run(run_plan(classic_debate(), "tabs", turn_runner(create_agent)))
+    assert outputs["opening"] == "<first: Start a discussion about: tabs>"
+    assert outputs["rebuttal"] == f"<second: Respond to: {outputs['opening']}>"
+    assert outputs["final"] == f"<first: Final reply to: {outputs['rebuttal']}>"
+
+
+def test_panel_openers_run_concurrently():
+    plan = panel_debate(num_agents=3, rounds=2)
+    create_agent = agent_factory(ttft={agent: 0.2 for agent in plan.agents})
+    started = time.perf_counter()
+    outputs = asyncio.run(run_plan(plan, "tabs", turn_runner(create_agent)))
+    # Two rounds of three 0.2s turns: ~0.4s when each round runs side by side, ~1.2s serially
+    assert time.perf_counter() - started < 0.8
+    assert len(outputs) == 6 and outputs["panelist_2_r2"] == "panelist_2 answers"
+
+
+def test_failed_turn_surfaces_its_error_and_stops_dependents():
+    calls = []
+
+    def reply(model, prompt):
+        return RuntimeError("provider down") if model == "second" else "fine"
+
+    with pytest.raises(RuntimeError, match="provider down"):
+        asyncio.run(run_plan(classic_debate(), "tabs", turn_runner(agent_factory(reply, calls=calls))))
+    assert [call[0] for call in calls] == ["first", "second"]  # "final" never ran
+
+
+def test_build_debate_plan_clamps_the_panel():
+    assert len(build_debate_plan(RequestConfig()).turns) == 3
+    plan = build_debate_plan(RequestConfig(debate_style="panel", debate_agents=10, debate_rounds=9))
+    assert len(plan.agents) == 6 and len(plan.turns) == 6 * 4
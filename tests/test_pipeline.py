@@ -0,0 +1,62 @@
+"""
+Staged scrape pipeline: bounded queues between stages, dropped items and failing stages
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from pipeline import Stage, run_stages
+
+
+def collect(source, stages, queue_size=16):
+    async def main():
+        return [item async for item in run_stages(source, stages, queue_size)]
+    return asyncio.run(asyncio.wait_for(main(), 10))
+
+
+async def slow_double(n):
+    await asyncio.sleep(0.05)
+    return n * 2
+
+
+def test_items_flow_through_every_stage():
+    stages = [
+        Stage("double", slow_double, workers=4),
+        Stage("filter", lambda n: n if n % 4 else None),  # None drops the item
+        Stage("blocking", lambda n: time.sleep(0.01) or n + 1, workers=2, executor="thread"),
+    ]
+    started = time.monotonic()
+    assert sorted(collect(range(8), stages)) == [3, 7, 11, 15]
+    assert time.monotonic() - started < 8 * 0.05  # the async stage's workers overlap
+
+
+def test_source_is_read_lazily_behind_a_full_queue():
+    pulled = []
+
+    def source():
+        for n in range(50):
+            pulled.append(n)
+            yield n
+
+    async def main():
+        stream = run_stages(source(), [Stage("slow", slow_double)], queue_size=2)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.1)
+        seen = len(pulled)
+        await stream.aclose()
+        return first, seen
+
+    first, seen = asyncio.run(main())
+    assert first == 0 and seen < 10  # only a couple of queues' worth, not the whole source
+
+
+def test_failing_stage_raises_instead_of_stalling():
+    def explode(n):
+        if n == 3:
+            raise ValueError("bad page")
+        return n
+
+    with pytest.raises(ValueError, match="bad page"):
+        collect(range(10), [Stage("explode", explode, workers=2)])
@@ -0,0 +1,95 @@
+"""
+Wire protocols: subprotocol negotiation and compact frames that decode back to the JSON frames
+"""
+
+import pytest
+from fakes import agent_factory
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+import protocol
+from protocol import COMPACT, COMPACT_MSGPACK, FRAME_TYPES, JSON, FrameDecoder, negotiate
+from schemas import INGRESS, ControlMessage, PromptMessage
+from streaming import handle_websocket_stream
+
+FRAMES = [
+    {"type": "session", "session_id": "s", "resumed": False, "turns": 0},
+    {"type": "agent_start", "agent": "primary", "stream_id": "a"},
+    {"type": "token", "content": "Hello ", "agent": "primary", "stream_id": "a"},
+    {"type": "agent_start", "agent": "first", "stream_id": "b"},
+    {"type": "token", "content": "world", "agent": "primary", "stream_id": "a"},
+    {"type": "token", "content": "Hi", "agent": "first", "stream_id": "b"},
+    {"type": "queued", "agent": "first", "position": 2, "stream_id": "b"},
+    {"type": "error", "content": "Too many concurrent streams (limit 8).", "stream_id": "c"},
+    {"type": "agent_end", "agent": "primary", "stream_id": "a"},
+    {"type": "complete", "stream_id": "a"},
+    {"type": "brand_new", "stream_id": "a", "detail": 1},
+]
+
+
+def test_frame_type_codes_never_move():
+    assert FRAME_TYPES[:6] == ("token", "agent_start", "agent_end", "complete", "error", "cancelled")
+
+
+def test_negotiation_picks_the_first_supported_offer(monkeypatch):
+    subprotocol, codec = negotiate([])
+    assert subprotocol is None and codec.name == JSON  # clients that offer nothing keep plain JSON
+    assert negotiate(["v2.example", COMPACT, JSON])[0] == COMPACT
+    monkeypatch.setattr(protocol, "msgpack", None)
+    assert negotiate([COMPACT_MSGPACK, JSON])[0] == JSON  # msgpack offered but not installed
+
+
+@pytest.mark.parametrize("name", [JSON, COMPACT, COMPACT_MSGPACK])
+def test_frames_round_trip(name):
+    if name == COMPACT_MSGPACK:
+        pytest.importorskip("msgpack")
+    _, codec = negotiate([name])
+    decoder = FrameDecoder(name)
+    decoded = []
+    for frame in FRAMES:
+        for message in codec.encode(frame):
+            frame_out = decoder.decode(message)
+            if frame_out is not None:
+                decoded.append(frame_out)
+    assert decoded == FRAMES
+
+
+def test_compact_tokens_are_small():
+    _, codec = negotiate([COMPACT])
+    codec.encode({"type": "agent_start", "agent": "primary", "stream_id": "conversation-1"})
+    assert codec.encode({"type": "token", "content": "Hi", "agent": "primary", "stream_id": "conversation-1"}) == [
+        '[0,0,0,"Hi"]'
+    ]
+
+
+def test_client_messages_parse_the_same_under_every_codec():
+    for name in (JSON, COMPACT):
+        _, codec = negotiate([name])
+        message = codec.parse('{"type": "prompt", "content": "hi", "stream_id": "a"}', INGRESS)
+        assert isinstance(message, PromptMessage) and message.stream_id == "a"
+        assert isinstance(codec.parse('{"type": "cancel"}', INGRESS), ControlMessage)
+
+
+def test_compact_connection_streams_the_same_turn():
+    app = FastAPI()
+    create_agent = agent_factory(lambda model, prompt: "one two three")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await handle_websocket_stream(websocket, create_agent)
+
+    def run(subprotocols):
+        frames = []
+        with TestClient(app) as client, client.websocket_connect("/ws", subprotocols=subprotocols) as ws:
+            assert ws.accepted_subprotocol == (subprotocols[0] if subprotocols else None)
+            decoder = FrameDecoder(subprotocols[0] if subprotocols else JSON)
+            ws.send_json({"type": "prompt", "content": "q", "stream_id": "a", "config": {"model": "m"}})
+            while not frames or frames[-1]["type"] != "complete":
+                frame = decoder.decode(ws.receive_text())
+                if frame is not None and frame["type"] != "session":
+                    frames.append(frame)
+        return frames
+
+    frames = run([COMPACT])
+    assert frames == run([])
+    assert "".join(f["content"] for f in frames if f["type"] == "token") == "one two three"
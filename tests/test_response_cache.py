@@ -0,0 +1,83 @@
+"""
+Response cache: key modes, TTL and LRU on both local backends, and deterministic turns answered from cache
+"""
+
+import asyncio
+import time
+
+import pytest
+from fakes import agent_factory
+
+from memory import ConversationMemory
+from response_cache import MemoryBackend, ResponseCache, SQLiteBackend, normalize_prompt
+from schemas import PromptMessage
+from streaming import run_request
+
+
+def test_key_modes():
+    assert normalize_prompt("  What   is\n2+2? ") == "What is 2+2?"
+    assert normalize_prompt("What is 2+2?", "semantic") == normalize_prompt("what IS 2 + 2", "semantic")
+
+    exact, semantic = ResponseCache(MemoryBackend()), ResponseCache(MemoryBackend(), key_mode="semantic")
+    assert exact.key("Hi  there", model="m") == exact.key("Hi there", model="m")
+    assert exact.key("Hi there", model="m") != exact.key("hi there!", model="m")
+    assert semantic.key("Hi there", model="m") == semantic.key("hi there!", model="m")
+    assert exact.key("Hi", model="m", max_tokens=10) != exact.key("Hi", model="m", max_tokens=20)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_entries=2)
+    return SQLiteBackend(str(tmp_path / "cache.db"), max_entries=2)
+
+
+def test_backend_expiry_and_lru_eviction(backend):
+    async def main():
+        cache = ResponseCache(backend, ttl=60)
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        time.sleep(0.01)  # SQLite orders by access time
+        assert await cache.get("a") == "1"  # b is now the least recently used
+        await cache.set("c", "3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "1" and await cache.get("c") == "3"
+
+        cache.ttl = 0.05
+        await cache.set("short", "x")
+        await asyncio.sleep(0.1)
+        assert await cache.get("short") is None
+        return cache.stats()
+
+    stats = asyncio.run(main())
+    assert stats["hits"] == 3 and stats["misses"] == 2 and stats["bytes_saved"] == 3
+
+
+def test_deterministic_repeat_is_served_without_a_model_call():
+    calls = []
+    create_agent = agent_factory(lambda model, prompt: "Four, as always.", calls=calls)
+    cache = ResponseCache(MemoryBackend())
+
+    async def turn(content, temperature):
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        message = PromptMessage(content=content, config={"model": "m", "temperature": temperature, "timing": True})
+        await run_request(message, 0.0, send, ConversationMemory(None), create_agent, cache)
+        text = "".join(f["content"] for f in frames if f["type"] == "token")
+        timing = next(f for f in frames if f["type"] == "timing")
+        return text, timing
+
+    async def main():
+        first = await turn("What is 2+2?", 0)
+        repeat = await turn("What  is 2+2?", 0)
+        warm = await turn("What is 2+2?", 0.7)  # sampled turns never read or fill the cache
+        return first, repeat, warm
+
+    first, repeat, warm = asyncio.run(main())
+    assert first[0] == repeat[0] == warm[0] == "Four, as always."
+    assert first[1]["source"] != "cache" and repeat[1]["source"] == "cache"
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
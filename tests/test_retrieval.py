@@ -0,0 +1,90 @@
+"""
+Docs retrieval: chunking, the incremental BM25 index and the search_docs tool an agent calls
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import FunctionModel
+
+import retrieval
+from retrieval import DocsIndex, HashingEmbedder, build_index, chunk_text, index_is_stale, search_docs
+
+DOCS = {
+    "caching.md": "# Context caching\n\nCached content stores a long system instruction once and bills "
+                  "cached tokens at a discount.\n\n## Expiry\n\nEvery cache has a ttl after which it expires.",
+    "websockets.md": "# WebSockets\n\nA websocket endpoint accepts the connection and streams frames.",
+    "models.txt": "Pydantic models validate data with type hints.",
+}
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A small corpus under a temporary root; returns (corpus dir, index dir)"""
+    monkeypatch.setattr(retrieval, "ROOT_DIR", tmp_path)
+    monkeypatch.setattr(retrieval, "SITEMAP_DIR", tmp_path / "sitemaps")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name, text in DOCS.items():
+        (docs / name).write_text(text, encoding="utf-8")
+    return docs, tmp_path / "index"
+
+
+def test_chunks_track_the_nearest_heading():
+    chunks = chunk_text(DOCS["caching.md"])
+    assert [heading for heading, _ in chunks] == ["Context caching", "Expiry"]
+    assert chunks[1][1].startswith("## Expiry\n\nEvery cache")
+    assert len(chunk_text("word " * 100 + "\n\n" + "word " * 100, max_chars=600)) == 2
+
+
+def test_index_is_rebuilt_incrementally(corpus):
+    docs, index_dir = corpus
+    assert index_is_stale(index_dir, [docs])
+    built = build_index(index_dir, [docs])
+    assert (built["files"], built["rebuilt"], built["chunks"]) == (3, 3, 4)
+    assert not index_is_stale(index_dir, [docs])
+
+    path = docs / "models.txt"
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))  # touched, same content
+    assert index_is_stale(index_dir, [docs])
+    assert build_index(index_dir, [docs])["rebuilt"] == 0
+    path.write_text("Pydantic models validate data with type hints and serialize it.", encoding="utf-8")
+    assert build_index(index_dir, [docs])["rebuilt"] == 1
+
+
+def test_search_ranks_the_matching_chunk_first(corpus):
+    docs, index_dir = corpus
+    build_index(index_dir, [docs])
+    results = DocsIndex(index_dir).search("when does a cache expire ttl", k=2)
+    assert results[0]["title"] == "Expiry" and results[0]["file"] == "docs/caching.md"
+    assert DocsIndex(index_dir).search("zebra") == []
+
+
+def test_vector_scores_blend_into_the_ranking(corpus):
+    pytest.importorskip("numpy")
+    docs, index_dir = corpus
+    build_index(index_dir, [docs], embedder=HashingEmbedder())
+    index = DocsIndex(index_dir, embedder=HashingEmbedder())
+    assert index.vectors is not None and len(index.vectors) == 4
+    assert index.search("websocket frames", k=1)[0]["title"] == "WebSockets"
+
+
+def test_agent_grounds_its_answer_with_search_docs(corpus, monkeypatch):
+    docs, index_dir = corpus
+    build_index(index_dir, [docs])
+    monkeypatch.setattr(retrieval, "_index", DocsIndex(index_dir))
+    monkeypatch.setattr(retrieval, "_checked_at", time.monotonic())
+
+    def model(messages, info):
+        returns = [part for message in messages for part in message.parts if isinstance(part, ToolReturnPart)]
+        if not returns:
+            return ModelResponse(parts=[ToolCallPart("search_docs", {"query": "websocket endpoint"})])
+        return ModelResponse(parts=[TextPart(returns[0].content.splitlines()[0])])
+
+    agent = Agent(FunctionModel(model), tools=[search_docs])
+    result = asyncio.run(agent.run("How do I serve a websocket?"))
+    assert result.output == "[WebSockets] (docs/websockets.md)"
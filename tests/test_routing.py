@@ -0,0 +1,114 @@
+"""
+Model routing: route order, the auto pick, skipping unhealthy models and pre-first-token fallbacks
+"""
+
+import asyncio
+import time
+
+from fakes import agent_factory
+
+from memory import ConversationMemory
+from response_cache import MemoryBackend, ResponseCache
+from routing import ModelRouter, create_router
+from schemas import PromptMessage
+from streaming import run_request
+
+CHAIN = ["big", "mid", "small"]
+
+
+def test_route_order_and_auto_pick():
+    router = ModelRouter(CHAIN)
+    assert router.route("big") == ["big", "mid", "small"]
+    assert router.route("mid") == ["mid", "small"]
+    assert router.route("elsewhere") == ["elsewhere"]  # unrouted models get no fallbacks
+
+    for _ in range(3):
+        router.record("big", ok=True, ttft=0.9)
+        router.record("mid", ok=True, ttft=0.3)
+        router.record("small", ok=True, ttft=0.1)
+    assert router.route("auto") == ["mid", "big", "small"]  # fastest of tier >= standard, then the rest
+    assert router.route("auto", "fast")[0] == "small"
+    assert router.route("auto", "high") == ["big", "mid", "small"]
+
+
+def test_unhealthy_models_are_skipped_until_the_cooldown_passes():
+    router = ModelRouter(CHAIN, cooldown=0.1)
+    for _ in range(3):
+        router.record("big", ok=False)
+    assert router.route("big") == ["mid", "small", "big"]  # kept as a last resort
+    assert router.stats()["big"]["healthy"] is False
+    time.sleep(0.15)
+    assert router.route("big")[0] == "big"  # half-open: tried again
+
+
+def test_hedge_delay_uses_measured_ttft_once_sampled():
+    router = ModelRouter(CHAIN)
+    assert router.hedge_delay("big", 95, 1.5) == 1.5
+    for ttft in (0.1, 0.2, 0.3, 0.4, 0.5):
+        router.record("big", ok=True, ttft=ttft)
+    assert router.hedge_delay("big", 95, 1.5) == 0.5
+
+
+def test_router_is_configured_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MODEL_FALLBACKS", "a, b")
+    monkeypatch.setenv("FIRST_TOKEN_TIMEOUT", "0")
+    router = create_router()
+    assert router.chain == ["a", "b"] and router.first_token_timeout is None
+    monkeypatch.setenv("MODEL_ROUTING", "0")
+    assert create_router() is None
+
+
+def turn(router, model="big", reply=None, ttft=None, cache=None, calls=None):
+    frames = []
+    create_agent = agent_factory(reply or (lambda model, prompt: f"{model} answers"), ttft, calls)
+
+    async def main():
+        async def send(frame):
+            frames.append(frame)
+
+        message = PromptMessage(content="q", config={"model": model, "temperature": 0})
+        await run_request(message, 0.0, send, ConversationMemory(None), create_agent, cache, router=router)
+
+    asyncio.run(main())
+    text = "".join(f["content"] for f in frames if f["type"] == "token")
+    return text, [f for f in frames if f["type"] == "fallback"]
+
+
+def test_failed_model_falls_back_before_the_first_token():
+    router = ModelRouter(CHAIN)
+
+    def reply(model, prompt):
+        return RuntimeError("overloaded") if model == "big" else f"{model} answers"
+
+    text, fallbacks = turn(router, reply=reply)
+    assert text == "mid answers"
+    assert [(f["model"], f["to"], f["reason"]) for f in fallbacks] == [("big", "mid", "RuntimeError")]
+    assert router.stats()["big"]["error_rate"] == 1.0 and router.stats()["mid"]["error_rate"] == 0.0
+
+
+def test_silent_model_times_out_only_while_a_fallback_remains():
+    router = ModelRouter(CHAIN, first_token_timeout=0.2)
+    text, fallbacks = turn(router, ttft={"big": 2, "mid": 2})
+    assert text == "small answers"
+    assert [(f["model"], f["reason"]) for f in fallbacks] == [("big", "timeout"), ("mid", "timeout")]
+
+    # The last model in the chain has nothing to fall back to, so it gets all the time it needs
+    text, fallbacks = turn(router, model="small", ttft={"small": 0.4})
+    assert text == "small answers" and fallbacks == []
+
+
+def test_fallback_answers_are_not_cached_under_the_requested_model():
+    router = ModelRouter(CHAIN)
+    cache = ResponseCache(MemoryBackend())
+    calls = []
+    failing = {"big"}
+
+    def reply(model, prompt):
+        return RuntimeError("overloaded") if model in failing else f"{model} answers"
+
+    assert turn(router, reply=reply, cache=cache, calls=calls)[0] == "mid answers"
+    assert len(cache.backend) == 0
+    failing.clear()
+    assert turn(router, reply=reply, cache=cache, calls=calls)[0] == "big answers"
+    assert turn(router, reply=reply, cache=cache, calls=calls)[0] == "big answers"
+    assert [call[0] for call in calls] == ["big", "mid", "big"]  # the last answer came from the cache
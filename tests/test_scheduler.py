@@ -0,0 +1,129 @@
+"""
+Provider scheduler: concurrency limits, weighted-fair order across clients, token budgets and 429 retries
+"""
+
+import asyncio
+import time
+
+import pytest
+from fakes import agent_factory
+from pydantic_ai.exceptions import ModelHTTPError
+
+from scheduler import ProviderScheduler, estimate_turn_tokens, is_rate_limited, parse_limits
+from streaming import stream_agent
+
+
+def test_limit_specs_and_rate_limit_errors():
+    assert parse_limits("8,gemini-2.5-pro=2", 4) == {"*": 8, "gemini-2.5-pro": 2}
+    assert parse_limits("", 4) == {"*": 4}
+    assert is_rate_limited(ModelHTTPError(429, "m")) and not is_rate_limited(ModelHTTPError(500, "m"))
+    assert is_rate_limited(RuntimeError("429 RESOURCE_EXHAUSTED"))
+    assert estimate_turn_tokens("x" * 40, None, {"max_tokens": 100}) > 100
+
+
+def test_flooding_client_only_delays_itself():
+    async def main():
+        scheduler = ProviderScheduler(concurrency={"*": 1})
+        held = await scheduler.acquire("m", client="holder")
+        granted = []
+
+        async def request(client, n):
+            slot = await scheduler.acquire("m", client=client)
+            granted.append((client, n))
+            await asyncio.sleep(0)
+            scheduler.release(slot)
+
+        tasks = [asyncio.create_task(request("flood", n)) for n in range(5)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(request("polite", 0)))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["m"] == {"active": 1, "limit": 1, "queued": 6, "tpm": 0, "tokens_available": None}
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+        return granted
+
+    granted = asyncio.run(asyncio.wait_for(main(), 5))
+    assert granted.index(("polite", 0)) <= 1  # not behind the whole flood
+
+
+def test_queued_waiters_hear_their_position():
+    async def main():
+        scheduler = ProviderScheduler(concurrency={"*": 1})
+        held = await scheduler.acquire("m")
+        positions = []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        waiting = asyncio.create_task(scheduler.acquire("m", client="b", on_queued=on_queued))
+        await asyncio.sleep(0.01)
+        scheduler.release(held)
+        scheduler.release(await waiting)
+        return positions
+
+    assert asyncio.run(main()) == [1]
+
+
+def test_token_budget_holds_requests_until_it_refills():
+    async def main():
+        # 3000 tokens a minute refill at 50/s: the second 1505-token turn is 10 tokens (0.2s) short
+        scheduler = ProviderScheduler(tpm={"*": 3000})
+        first = await scheduler.acquire("m", cost=1505)
+        started = time.monotonic()
+        second = await scheduler.acquire("m", cost=1505)
+        waited = time.monotonic() - started
+        scheduler.release(first)
+        scheduler.release(second)
+
+        # A turn that used less than it reserved gives the difference back to whoever waits
+        scheduler = ProviderScheduler(tpm={"*": 3000})
+        third = await scheduler.acquire("m", cost=2990)
+        fourth = asyncio.create_task(scheduler.acquire("m", cost=2990))
+        await asyncio.sleep(0.05)
+        assert not fourth.done()
+        third.used_tokens = 10
+        started = time.monotonic()
+        scheduler.release(third)
+        scheduler.release(await fourth)
+        return waited, time.monotonic() - started
+
+    waited, settled = asyncio.run(asyncio.wait_for(main(), 5))
+    assert 0.15 <= waited < 1 and settled < 0.1
+
+
+def run_turn(reply, scheduler):
+    frames = []
+
+    async def main():
+        async def send(frame):
+            frames.append(frame)
+
+        agent = agent_factory(reply)("m", system_prompt="sys")
+        return await stream_agent(send, agent, "primary", "q", scheduler=scheduler)
+
+    return asyncio.run(main()), frames
+
+
+def test_rate_limited_turn_is_retried_before_its_first_token():
+    attempts = []
+
+    def reply(model, prompt):
+        attempts.append(prompt)
+        return ModelHTTPError(429, model) if len(attempts) == 1 else "second time lucky"
+
+    text, frames = run_turn(reply, ProviderScheduler(backoff_base=0.01))
+    assert text == "second time lucky" and len(attempts) == 2
+    retrying = [f for f in frames if f["type"] == "retrying"]
+    assert len(retrying) == 1 and retrying[0]["attempt"] == 1
+
+
+def test_retries_give_up_after_max_retries():
+    attempts = []
+
+    def reply(model, prompt):
+        attempts.append(prompt)
+        return ModelHTTPError(429, model)
+
+    with pytest.raises(ModelHTTPError):
+        run_turn(reply, ProviderScheduler(max_retries=2, backoff_base=0.01))
+    assert len(attempts) == 3
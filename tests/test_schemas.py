@@ -0,0 +1,65 @@
+"""
+Typed messages: one adapter dispatches and validates every client message, and invalid ones are
+answered with an error frame before any model call
+"""
+
+import pytest
+from fakes import agent_factory
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from schemas import INGRESS, ControlMessage, DebateMessage, PromptMessage, describe_error, dump_frame
+from streaming import handle_websocket_stream
+
+
+def test_messages_dispatch_on_type():
+    prompt = INGRESS.validate_json('{"content": "hi", "stream_id": 7, "config": {"temperature": 0, "ui_only": 1}}')
+    assert isinstance(prompt, PromptMessage) and prompt.stream_id == "7"  # numeric ids become strings
+    assert prompt.config.temperature == 0 and prompt.config.model == "gemini-2.5-flash"
+    assert isinstance(INGRESS.validate_json('{"type": "debate", "content": "x"}'), DebateMessage)
+    reset = INGRESS.validate_json('{"type": "reset"}')
+    assert isinstance(reset, ControlMessage) and reset.stream_id is None
+
+
+@pytest.mark.parametrize("raw, problem", [
+    ('{"type": "shout"}', "type must be one of prompt, debate, cancel, reset"),
+    ('{"content": "x", "config": {"temperature": 3}}', "config.temperature: Input should be less than or equal to 2"),
+    ('{"content": "x", "config": {"quality": "best"}}', "config.quality: Input should be 'high', 'standard' or 'fast'"),
+    ('{"content": "x", "config": {"max_tokens": 0}}', "config.max_tokens: Input should be greater than or equal to 1"),
+    ('{"type": "cancel", "stream_id": ["a"]}', "stream_id: Input should be a valid string"),
+])
+def test_invalid_messages_are_described(raw, problem):
+    with pytest.raises(ValidationError) as error:
+        INGRESS.validate_json(raw)
+    assert describe_error(error.value) == problem
+
+
+def test_frames_serialize_with_extra_fields():
+    assert dump_frame({"type": "token", "content": "héllo", "agent": "primary"}) == (
+        '{"type":"token","content":"héllo","agent":"primary"}'
+    )
+    assert dump_frame({"type": "timing", "ttft_ms": 12.5}) == '{"type":"timing","ttft_ms":12.5}'
+
+
+def test_invalid_config_never_reaches_a_model():
+    calls = []
+    app = FastAPI()
+    create_agent = agent_factory(calls=calls)
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await handle_websocket_stream(websocket, create_agent)
+
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "prompt", "content": "x", "stream_id": "a", "config": {"temperature": 5}})
+        error = ws.receive_json()
+        ws.send_text("not json")
+        garbled = ws.receive_json()
+    assert error == {
+        "type": "error", "stream_id": "a",
+        "content": "Invalid message: config.temperature: Input should be less than or equal to 2",
+    }
+    assert garbled["type"] == "error" and "stream_id" not in garbled
+    assert calls == []
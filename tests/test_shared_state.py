@@ -0,0 +1,233 @@
+"""
+Shared state backends (local, SQLite file, Redis through an injected client) and what runs on them
+across workers: the scheduler's TPM window and 429 backoff, the response cache and session versions
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+from conversation_store import ConversationStore
+from response_cache import ResponseCache, SharedBackend
+from scheduler import ProviderScheduler
+from shared_state import LocalBackend, RedisBackend, SQLiteSharedBackend
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+class FakeRedis:
+    """The redis.asyncio calls RedisBackend makes (decode_responses=True), over one dict per "server" """
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, px=None):
+        self.data[key] = (str(value), time.time() + px / 1000 if px else None)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def incrby(self, key, amount):
+        entry = self._live(key)
+        value = int(entry[0]) + amount if entry else amount
+        self.data[key] = (str(value), entry[1] if entry else None)
+        return value
+
+    async def pexpire(self, key, ms):
+        entry = self._live(key)
+        if entry:
+            self.data[key] = (entry[0], time.time() + ms / 1000)
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture(params=["local", "sqlite", "redis"])
+def workers(request, tmp_path):
+    """Two handles on one shared state, as two workers would open them (local: one process, one dict)"""
+    if request.param == "local":
+        backend = LocalBackend()
+        return backend, backend
+    if request.param == "sqlite":
+        path = str(tmp_path / "shared.db")
+        return SQLiteSharedBackend(path), SQLiteSharedBackend(path)
+    server = FakeRedis()
+    return RedisBackend(client=server), RedisBackend(client=server)
+
+
+def wait_for_fresh_minute():
+    """TPM windows are calendar minutes; don't start a window test in the last seconds of one"""
+    if time.time() % 60 > 55:
+        time.sleep(60 - time.time() % 60 + 0.1)
+
+
+def test_backend_commands(workers):
+    a, b = workers
+
+    async def main():
+        await a.set("k", "v")
+        assert await b.get("k") == "v"
+        await b.delete("k")
+        assert await a.get("k") is None
+
+        assert await a.incrby("n", 5) == 5
+        assert await b.incrby("n", -2) == 3
+        await a.expire("n", 0.05)
+        await a.set("short", "x", ex=0.05)
+        await asyncio.sleep(0.1)
+        assert await b.get("n") is None and await b.get("short") is None
+        assert await b.incrby("n", 1) == 1  # an expired counter starts over
+    asyncio.run(main())
+
+
+def test_tpm_window_is_shared_between_workers(workers):
+    wait_for_fresh_minute()
+    a, b = workers
+
+    async def main():
+        first = ProviderScheduler(tpm={"*": 1000}, shared=a)
+        second = ProviderScheduler(tpm={"*": 1000}, shared=b)
+        slot = await first.acquire("m", cost=600)
+        window = slot.window
+        assert int(await b.get(window)) == 600
+
+        # 600 + 600 doesn't fit this minute's shared window, even though `second` has its own budget left
+        blocked = asyncio.create_task(second.acquire("m", cost=600))
+        await asyncio.sleep(0.3)
+        assert not blocked.done()
+        assert int(await a.get(window)) == 600  # the loser gave its reservation back
+
+        slot.used_tokens = 100
+        first.release(slot)
+        await asyncio.sleep(0.05)
+        assert int(await b.get(window)) == 100  # settled to what the turn really used
+        blocked.cancel()
+        await asyncio.gather(blocked, return_exceptions=True)
+    asyncio.run(main())
+
+
+def test_rate_limit_backoff_holds_every_worker(workers):
+    a, b = workers
+
+    async def main():
+        first = ProviderScheduler(max_retries=1, backoff_base=0.2, shared=a)
+        second = ProviderScheduler(shared=b)
+        calls = []
+
+        async def limited(slot):
+            calls.append(time.time())
+            if len(calls) == 1:
+                raise ModelHTTPError(429, "m")
+            return "ok"
+
+        retrying = asyncio.create_task(first.run("m", limited))
+        await asyncio.sleep(0.01)
+        until = await b.get("scheduler:backoff:m")
+        assert until is not None
+        slot = await second.acquire("m")
+        assert time.time() >= float(until) - 0.01  # the other worker waited out the backoff too
+        second.release(slot)
+        assert await retrying == "ok" and len(calls) == 2
+    asyncio.run(main())
+
+
+def test_response_cache_entries_are_seen_by_other_workers(workers):
+    a, b = workers
+
+    async def main():
+        writer, reader = ResponseCache(SharedBackend(a), ttl=60), ResponseCache(SharedBackend(b), ttl=60)
+        key = writer.key("What is 2+2?", model="m", temperature=0)
+        assert key == reader.key("What is 2+2?", model="m", temperature=0)
+        assert await reader.get(key) is None
+        await writer.set(key, "4")
+        assert await reader.get(key) == "4"
+        assert reader.stats()["hits"] == 1 and reader.stats()["misses"] == 1
+    asyncio.run(main())
+
+
+def test_session_continued_on_another_worker_is_reloaded(workers, tmp_path):
+    a, b = workers
+    path = str(tmp_path / "conversations.db")
+
+    async def summarize(prompt):
+        return "summary"
+
+    def turn(i):
+        return [ModelRequest(parts=[UserPromptPart(f"q{i}")]), ModelResponse(parts=[TextPart(f"a{i}")])]
+
+    async def main():
+        one, two = ConversationStore(path, shared=a), ConversationStore(path, shared=b)
+        memory = await one.memory("s", "main", summarize, 6000)
+        memory.add_turn(turn(0))
+        await one.flush()
+
+        stale = await two.memory("s", "main", summarize, 6000)
+        assert stale.turn_count == 1
+        memory.add_turn(turn(1))
+        await one.flush()
+
+        fresh = await two.memory("s", "main", summarize, 6000)
+        assert fresh is not stale and fresh.turn_count == 2 and two.reloads == 1
+        assert len(await fresh.history("sys")) == 4
+        await one.close()
+        await two.close()
+    asyncio.run(main())
+
+
+WORKER = """
+import asyncio, sys
+from scheduler import ProviderScheduler
+from shared_state import SQLiteSharedBackend
+
+async def main(path, name):
+    shared = SQLiteSharedBackend(path)
+    for _ in range(200):
+        await shared.incrby("hits", 1)
+    await shared.set("worker:" + name, "up")
+    scheduler = ProviderScheduler(tpm={"*": 1000}, shared=shared)
+    try:
+        await asyncio.wait_for(scheduler.acquire("m", cost=600), 1.5)
+        print("granted")
+    except TimeoutError:
+        print("waiting")
+
+asyncio.run(main(sys.argv[1], sys.argv[2]))
+"""
+
+
+def test_sqlite_shared_state_across_processes(tmp_path):
+    wait_for_fresh_minute()
+    path = str(tmp_path / "shared.db")
+    SQLiteSharedBackend(path)  # create the file before both workers race to
+    env = {**os.environ, "PYTHONPATH": str(SRC)}
+    procs = [
+        subprocess.Popen([sys.executable, "-c", WORKER, path, name], env=env, stdout=subprocess.PIPE, text=True)
+        for name in ("a", "b")
+    ]
+    outcomes = sorted(proc.communicate(timeout=60)[0].strip() for proc in procs)
+    assert all(proc.returncode == 0 for proc in procs)
+
+    async def check():
+        shared = SQLiteSharedBackend(path)
+        assert await shared.get("hits") == "400"  # no increment lost between processes
+        assert await shared.get("worker:a") == "up" and await shared.get("worker:b") == "up"
+    asyncio.run(check())
+    assert outcomes == ["granted", "waiting"]  # one minute window, one budget, two processes
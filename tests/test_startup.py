@@ -0,0 +1,58 @@
+"""
+Cold start: model pre-warm behind readiness, and no provider SDK imported before its first use
+"""
+
+import asyncio
+
+from fakes import agent_factory
+
+from startup import PROVIDER_SDKS, Readiness, by_package, profile_imports
+from streaming import Deps
+
+
+def test_warm_builds_and_pings_every_model():
+    calls = []
+    create_agent = agent_factory(
+        lambda model, prompt: RuntimeError("quota") if model == "flaky" else "pong", calls=calls
+    )
+
+    def get_agent(model):
+        if model == "missing":
+            raise ValueError("Unknown model: missing")
+        return create_agent(model)
+
+    readiness = Readiness(models=["fast", "flaky", "missing"])
+    assert readiness.status()["ready"] is False
+    asyncio.run(readiness.warm(get_agent, Deps(system_prompt="")))
+
+    status = readiness.status()
+    assert status["ready"] is True and "prewarm" in status["phases"]
+    assert set(status["models"]["fast"]) == {"agent_ms", "request_ms"}
+    assert status["models"]["flaky"]["error"] == "RuntimeError: quota"
+    assert status["models"]["missing"] == {"error": "ValueError: Unknown model: missing"}
+    assert sorted((model, prompt) for model, prompt, _ in calls) == [("fast", "ping"), ("flaky", "ping")]
+
+
+def test_pings_go_through_the_ping_agent():
+    calls = []
+    create_agent = agent_factory(calls=calls)
+    readiness = Readiness(models=["m"])
+    asyncio.run(readiness.warm(
+        create_agent, Deps(system_prompt=""), ping_agent=lambda agent: create_agent("m-ping", tools=False)
+    ))
+    assert [call[0] for call in calls] == ["m-ping"] and "request_ms" in readiness.warmed["m"]
+
+
+def test_agent_only_warm_skips_the_request():
+    calls = []
+    readiness = Readiness(models=["m"], request=False)
+    asyncio.run(readiness.warm(agent_factory(calls=calls)))
+    assert calls == [] and set(readiness.warmed["m"]) == {"agent_ms"}
+
+
+def test_app_import_loads_no_provider_sdk():
+    rows = profile_imports("hello_world")
+    names = {name for name, *_ in rows}
+    assert "hello_world" in names
+    assert not [name for name in names for sdk in PROVIDER_SDKS if name == sdk or name.startswith(sdk + ".")]
+    assert by_package([("a.x", 5, 5, 1), ("a.y", 7, 7, 1), ("b", 20, 20, 0)]) == [("b", 20, 1), ("a", 12, 2)]
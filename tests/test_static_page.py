@@ -0,0 +1,55 @@
+"""
+Precompressed interface page: content negotiation, per-encoding ETags and 304 revalidation
+"""
+
+import gzip
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from static_page import PrecompressedPage, accepted_encodings, brotli
+
+BODY = "<html><body>" + "<p>streaming agents</p>" * 200 + "</body></html>"
+
+
+def make_client(page):
+    app = FastAPI()
+
+    @app.get("/")
+    async def root(request: Request):
+        return page.response(request)
+
+    return TestClient(app)
+
+
+def test_accept_encoding_parsing_and_choice():
+    assert accepted_encodings("gzip, br;q=0, *;q=0.5") == {"gzip": 1.0, "br": 0.0, "*": 0.5}
+    page = PrecompressedPage(BODY)
+    assert page.choose("") == "identity"
+    assert page.choose("gzip, br;q=0") == "gzip"
+    assert page.choose("gzip;q=0, identity") == "identity"
+    assert page.choose("*") == ("br" if brotli else "gzip")
+
+
+def test_gzip_variant_is_served_and_smaller():
+    page = PrecompressedPage(BODY)
+    response = make_client(page).get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.headers["vary"] == "Accept-Encoding"
+    assert response.text == BODY  # decoded by the client
+    assert gzip.decompress(page.variants["gzip"][0]).decode() == BODY
+    assert page.stats()["gzip"] < page.stats()["identity"] / 5
+
+
+def test_matching_etag_revalidates_with_304():
+    client = make_client(PrecompressedPage(BODY))
+    first = client.get("/", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and "content-encoding" not in first.headers
+
+    again = client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    stale = client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": '"old"'})
+    assert stale.status_code == 200
+    assert make_client(PrecompressedPage(BODY + " ")).get(
+        "/", headers={"If-None-Match": etag}
+    ).status_code == 200  # a changed page gets a new tag